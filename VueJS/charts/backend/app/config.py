@@ -0,0 +1,55 @@
+import os
+from dataclasses import dataclass
+
+from dotenv import load_dotenv
+
+
+# app/.env fills in anything not already set in the environment
+load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
+
+
+@dataclass(frozen=True)
+class Settings:
+    s3_endpoint_url: str
+    s3_access_key: str
+    s3_secret_key: str
+    s3_region: str
+    s3_bucket: str
+    s3_max_connections: int
+    cache_dir: str
+    cache_bytes: int
+    cache_ttl: float
+    hot_dir: str
+    data_workers: int
+    query_memory: int
+    request_memory: int
+    response_cache_bytes: int
+    response_cache_ttl: float
+    live_feed: str
+    live_buffer: int
+    live_symbols: tuple[str, ...]
+    live_idle: float
+
+
+def load_settings() -> Settings:
+    return Settings(
+        s3_endpoint_url=os.getenv("S3_ENDPOINT_URL", "http://localhost:9100"),
+        s3_access_key=os.getenv("S3_ACCESS_KEY", "minioadmin"),
+        s3_secret_key=os.getenv("S3_SECRET_KEY", "minioadmin"),
+        s3_region=os.getenv("S3_REGION", "us-east-1"),
+        s3_bucket=os.getenv("S3_BUCKET", "market-data"),
+        s3_max_connections=int(os.getenv("S3_MAX_CONNECTIONS", 50)),
+        cache_dir=os.getenv("PARTITION_CACHE_DIR", ".cache/partitions"),
+        cache_bytes=int(os.getenv("PARTITION_CACHE_BYTES", 2 * 1024**3)),
+        cache_ttl=float(os.getenv("PARTITION_CACHE_TTL", 30)),
+        hot_dir=os.getenv("HOT_STORE_DIR", ".cache/hot"),
+        data_workers=int(os.getenv("DATA_WORKERS", 8)),
+        query_memory=int(os.getenv("QUERY_MEMORY", 2 * 1024**3)),
+        request_memory=int(os.getenv("REQUEST_MEMORY", 256 * 1024**2)),
+        response_cache_bytes=int(os.getenv("RESPONSE_CACHE_BYTES", 256 * 1024**2)),
+        response_cache_ttl=float(os.getenv("RESPONSE_CACHE_TTL", 30)),
+        live_feed=os.getenv("LIVE_FEED", "synthetic"),
+        live_buffer=int(os.getenv("LIVE_BUFFER", 1 << 20)),
+        live_symbols=tuple(s.strip().upper() for s in os.getenv("LIVE_SYMBOLS", "SPY,QQQ,IWM").split(",") if s.strip()),
+        live_idle=float(os.getenv("LIVE_IDLE", 60)),
+    )
@@ -0,0 +1,58 @@
+"""
+Async access to the (blocking) data layer.
+
+Loads run in one bounded thread pool, so a burst of chart sessions queues
+up instead of starving the event loop or spawning a thread each. Polars and
+pyarrow release the GIL while decoding, so threads are enough here. When
+the awaiting task is cancelled (client went away) the load's cancel Event
+is set and the planner stops at the next partition.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import load_settings
+
+
+class Cancelled(Exception):
+    pass
+
+
+def check(cancel: threading.Event | None):
+    if cancel is not None and cancel.is_set():
+        raise Cancelled()
+
+
+_pool: ThreadPoolExecutor | None = None
+_lock = threading.Lock()
+
+
+def get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=load_settings().data_workers,
+                thread_name_prefix="data",
+            )
+        return _pool
+
+
+def shutdown():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def run(fn, *args, **kwargs):
+    """Run `fn(*args, cancel=event, **kwargs)` in the data pool."""
+    cancel = threading.Event()
+    call = functools.partial(fn, *args, cancel=cancel, **kwargs)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_pool(), call)
+    except asyncio.CancelledError:
+        cancel.set()
+        raise
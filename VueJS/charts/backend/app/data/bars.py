@@ -0,0 +1,182 @@
+"""
+Bar sizes, and building bars out of finer rows.
+
+A bar size is a time frame or a threshold for information-driven bars:
+
+    500ms, 10s              fixed windows (trade bars only; minutes are the finest stored bars)
+    2m, 3m, 30m, 4h         fixed windows on the UTC epoch, any multiple of a minute or an hour
+    1d, 2w, 3mo             exchange sessions, grouped by week / month
+    volume:50000            a bar every 50,000 shares
+    dollar:2e7              a bar every $20M traded (vwap * volume, or price * size)
+    tick:1000               a bar every 1,000 trades (trade_count of minute bars)
+
+Information bars are numbered by the running total of their measure
+before each row, bar k holding the rows where it is in [k * threshold,
+(k + 1) * threshold). That is one cumulative sum, no per-row loop; a row
+that crosses a threshold closes its bar and the overshoot counts towards
+the next one. Bars are labelled with the time of their first row, and
+the numbering starts at the beginning of the queried window.
+"""
+import functools
+import math
+import re
+from dataclasses import dataclass
+
+import numpy as np
+import polars as pl
+
+
+UNIT_NS = {"ms": 10**6, "s": 10**9, "m": 60 * 10**9, "h": 3600 * 10**9, "d": 86_400 * 10**9}
+
+# lower bound on a bar's length, for sizing reads (app.data.budget, lookbacks)
+CALENDAR_NS = {"w": 7 * 86_400 * 10**9, "mo": 28 * 86_400 * 10**9}
+
+INFORMATION = ("volume", "dollar", "tick")
+
+
+@dataclass(frozen=True)
+class BarSize:
+    kind: str                   # time | volume | dollar | tick
+    n: int = 0                  # time bars: n units
+    unit: str = ""              # ms | s | m | h | d | w | mo
+    threshold: float = 0.0      # information bars
+
+    @property
+    def every(self) -> str:
+        # polars duration of a time bar
+        return f"{self.n}{self.unit}"
+
+    @property
+    def daily(self) -> bool:
+        return self.kind == "time" and self.unit in ("d", "w", "mo")
+
+    @property
+    def step_ns(self) -> int:
+        """Length of a time bar (weeks/months: shortest); information bars: one minute row."""
+        if self.kind != "time":
+            return UNIT_NS["m"]
+        return self.n * (UNIT_NS[self.unit] if self.unit in UNIT_NS else CALENDAR_NS[self.unit])
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_bar_size(bar_size: str) -> BarSize:
+    """BarSize of "30m", "2w", "volume:50000", ...; ValueError if it isn't one."""
+    kind, sep, value = bar_size.partition(":")
+    if sep:
+        try:
+            threshold = float(value)
+        except ValueError:
+            threshold = math.nan
+        if kind not in INFORMATION or not (0 < threshold < math.inf):
+            raise ValueError(f"Invalid bar size: {bar_size}")
+        return BarSize(kind, threshold=threshold)
+
+    m = re.fullmatch(r"(\d+)(ms|s|mo|m|h|d|w)", bar_size)
+    if not m or int(m.group(1)) == 0:
+        raise ValueError(f"Invalid bar size: {bar_size}")
+    return BarSize("time", int(m.group(1)), m.group(2))
+
+
+def check_bar_size(bar_size: str, mode: str = "bars") -> BarSize:
+    """
+    parse_bar_size, also rejecting sizes `mode` can't build: days are
+    sessions, so no multi-day "Nd" (use weeks), and bars mode resamples
+    minute rows, so nothing finer than a minute. ValueError if it isn't valid.
+    """
+    spec = parse_bar_size(bar_size)
+    if spec.kind == "time" and ((spec.unit == "d" and spec.n > 1) or (mode == "bars" and spec.unit in ("ms", "s"))):
+        raise ValueError(f"Invalid bar size for {mode} mode: {bar_size}")
+    return spec
+
+
+def ohlcv_aggs() -> list[pl.Expr]:
+    # one bar out of a group of finer rows (open/close need the rows in time order)
+    return [
+        pl.col("open").first().alias("open"),
+        pl.col("high").max().alias("high"),
+        pl.col("low").min().alias("low"),
+        pl.col("close").last().alias("close"),
+        pl.col("volume").sum().alias("volume"),
+        pl.col("trade_count").sum().alias("trade_count"),
+        (
+            (pl.col("vwap") * pl.col("volume")).sum()
+            / pl.col("volume").sum()
+        ).alias("vwap"),
+    ]
+
+
+def aggregate_runs(df: pl.DataFrame, by: list[str] = (), run: str = "bar") -> pl.DataFrame:
+    """
+    One bar per run of equal (*by, run) in a frame sorted by them: open and
+    close from the first and last row, the rest with numpy reduceat. `bar`
+    is taken from the first row of the run.
+    """
+    keys = [*by, run]
+    out = [*by, "bar", "open", "high", "low", "close", "volume", "trade_count", "vwap"]
+    if df.is_empty():
+        return df.select(out)
+
+    new = pl.any_horizontal([pl.col(k).ne_missing(pl.col(k).shift(1)) for k in keys])
+    starts = df.select(new.arg_true()).to_series().to_numpy()
+    ends = np.append(starts[1:], df.height)
+
+    def col(name):
+        return df[name].to_numpy()
+
+    volume = col("volume")
+    reduced = {
+        "high": np.maximum.reduceat(col("high"), starts),
+        "low": np.minimum.reduceat(col("low"), starts),
+        "volume": np.add.reduceat(volume, starts),
+        "trade_count": np.add.reduceat(col("trade_count"), starts),
+        "pv": np.add.reduceat(col("vwap") * volume, starts),
+    }
+    first = df.select(*by, "bar", "open")[starts]
+    last = df["close"].gather(ends - 1)
+    return first.with_columns(
+        pl.Series("high", reduced["high"]),
+        pl.Series("low", reduced["low"]),
+        last.alias("close"),
+        pl.Series("volume", reduced["volume"]),
+        pl.Series("trade_count", reduced["trade_count"], dtype=df.schema["trade_count"]),
+        (pl.Series(reduced["pv"]) / pl.Series(reduced["volume"])).alias("vwap"),
+    )
+
+
+def measure(kind: str) -> pl.Expr:
+    # what an information bar counts, per minute row
+    if kind == "volume":
+        return pl.col("volume")
+    if kind == "dollar":
+        return pl.col("vwap") * pl.col("volume")
+    if kind == "tick":
+        return pl.col("trade_count")
+    raise ValueError(f"Invalid bar kind: {kind}")
+
+
+def information_bars(
+    bars: pl.DataFrame | pl.LazyFrame,
+    spec: BarSize,
+    by: list[str] = (),
+) -> pl.DataFrame | pl.LazyFrame:
+    """
+    Volume / dollar / tick bars of `spec` from bars sorted by (*by, timestamp);
+    the running total restarts for every `by` group.
+    """
+    by = list(by)
+    m = measure(spec.kind).fill_null(0)
+    total = m.cum_sum().over(by) if by else m.cum_sum()
+    df = bars.with_columns(
+        ((total - m) / spec.threshold).floor().cast(pl.Int64).alias("_bucket"),
+        pl.col("timestamp").alias("bar"),
+    )
+
+    if isinstance(df, pl.DataFrame):
+        return aggregate_runs(df, by, run="_bucket")
+
+    out = (
+        df.group_by_dynamic("_bucket", every="1i", group_by=by or None)
+        .agg(pl.col("bar").first(), *ohlcv_aggs())
+        .drop("_bucket")
+    )
+    return out.sort([*by, "bar"]) if by else out
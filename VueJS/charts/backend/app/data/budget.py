@@ -0,0 +1,100 @@
+"""
+Memory admission for queries.
+
+Every load reserves an estimate of the memory it will hold from one
+process-wide budget before it reads anything. Loads that don't fit wait
+(in arrival order) until running ones release theirs, so a burst of
+long-range requests queues up instead of taking the worker down. A load
+bigger than the whole budget is admitted once it can run alone.
+
+Estimates come from the query window, not from the data: rows the window
+can hold at the resolution read, times a per-row size.
+"""
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import timedelta
+
+from app.config import load_settings
+from app.data.aio import Cancelled, check
+from app.data.bars import parse_bar_size
+
+
+# one OHLCV row in Polars (9 columns) plus the read/concat/sort copies around it
+ROW_BYTES = 3 * 9 * 8
+
+
+def window_rows(start_ts, end_ts, step: str, limit: int | None = None) -> int:
+    """Upper bound on the rows of `step` resolution in the window."""
+    span = (end_ts - start_ts) // timedelta(microseconds=1) * 1000
+    rows = max(span, 0) // parse_bar_size(step).step_ns + 1
+    return rows if limit is None else min(rows, limit)
+
+
+class MemoryBudget:
+    """
+    `max_bytes` for all loads together. A single load estimated above
+    `request_bytes` runs on Polars' streaming engine instead of reading the
+    whole window into memory, so it is charged about its output only.
+    """
+
+    def __init__(self, max_bytes: int, request_bytes: int):
+        self.max_bytes = max_bytes
+        self.request_bytes = request_bytes
+        self.used = 0
+        self._cond = threading.Condition()
+        self._queue: deque[object] = deque()
+        self.waited = 0
+
+    def streams(self, rows: int) -> bool:
+        return rows * ROW_BYTES > self.request_bytes
+
+    def footprint(self, read_rows: int, out_rows: int) -> int:
+        # peak bytes of a load reading `read_rows` and returning `out_rows`
+        return min(read_rows * ROW_BYTES, self.request_bytes) + out_rows * ROW_BYTES
+
+    @contextmanager
+    def reserve(self, nbytes: int, cancel=None, poll: float = 0.1):
+        """Hold `nbytes` of the budget for the block; waits for room, raises Cancelled if `cancel` is set meanwhile."""
+        ticket = object()
+        with self._cond:
+            self._queue.append(ticket)
+            if not self._admits(ticket, nbytes):
+                self.waited += 1
+            try:
+                while not self._admits(ticket, nbytes):
+                    if cancel is not None and cancel.is_set():
+                        raise Cancelled()
+                    self._cond.wait(poll)
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+            self.used += nbytes
+        try:
+            check(cancel)
+            yield
+        finally:
+            with self._cond:
+                self.used -= nbytes
+                self._cond.notify_all()
+
+    def _admits(self, ticket, nbytes: int) -> bool:
+        # first in line, and either fits or nothing else is running
+        return self._queue[0] is ticket and (self.used + nbytes <= self.max_bytes or self.used == 0)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"used": self.used, "max_bytes": self.max_bytes, "queued": len(self._queue), "waited": self.waited}
+
+
+_budget: MemoryBudget | None = None
+_lock = threading.Lock()
+
+
+def get_budget() -> MemoryBudget:
+    global _budget
+    with _lock:
+        if _budget is None:
+            settings = load_settings()
+            _budget = MemoryBudget(settings.query_memory, settings.request_memory)
+        return _budget
@@ -0,0 +1,205 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+
+# downloads of keys hashing to the same stripe are serialized; a fixed set, however many keys pass through
+KEY_LOCKS = 256
+
+
+@dataclass
+class CacheEntry:
+    path: str
+    etag: str
+    size: int
+    checked_at: float
+    leases: int = 0
+    dropped: bool = False   # out of the cache while leased: the last release deletes the file
+
+
+class PartitionCache:
+    """
+    Read-through local copy of the parquet partitions in the bucket.
+
+    Local files are named after the object key and its ETag, so a month that
+    gets rewritten upstream is downloaded again instead of served stale.
+    Files are evicted least-recently-used first once `max_bytes` is exceeded.
+    """
+
+    def __init__(self, store, root: str, max_bytes: int, ttl: float = 30.0):
+        self.store = store      # app.data.store.ObjectStore
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl          # seconds before a cached file is re-checked against the bucket
+
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = [threading.Lock() for _ in range(KEY_LOCKS)]
+
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    # ------------------------------------------------------------------ public
+
+    @contextmanager
+    def fetch(self, keys: list[str]):
+        """
+        Yield local paths for the objects that exist under `keys`.
+        The files can't be evicted until the block exits.
+        """
+        with self.fetch_many(keys) as paths:
+            yield list(paths.values())
+
+    @contextmanager
+    def fetch_many(self, keys: list[str], workers: int = 1):
+        """
+        Like fetch, but yields {key: local path} and checks/downloads up to
+        `workers` objects at a time.
+        """
+        keys = list(dict.fromkeys(keys))
+        entries: dict[str, CacheEntry] = {}
+        try:
+            if workers > 1 and len(keys) > 1:
+                with ThreadPoolExecutor(min(workers, len(keys))) as pool:
+                    futures = {key: pool.submit(self._get, key) for key in keys}
+                    error = None
+                    for key, fut in futures.items():
+                        try:
+                            entry = fut.result()
+                        except Exception as e:
+                            error = error or e
+                            continue
+                        if entry is not None:
+                            entries[key] = entry
+                    if error is not None:
+                        raise error
+            else:
+                for key in keys:
+                    entry = self._get(key)
+                    if entry is not None:
+                        entries[key] = entry
+            yield {key: e.path for key, e in entries.items()}
+        finally:
+            with self._lock:
+                for e in entries.values():
+                    self._release(e)
+                self._evict()
+
+    def has(self, key: str) -> bool:
+        """Whether there is a local copy of `key` (it may still be re-checked on fetch)."""
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        with self._lock:
+            return digest in self._entries
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"files": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+    # ---------------------------------------------------------------- internal
+
+    def _get(self, key: str) -> CacheEntry | None:
+        digest = hashlib.sha1(key.encode()).hexdigest()
+
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and time.monotonic() - entry.checked_at < self.ttl:
+                self._entries.move_to_end(digest)
+                entry.leases += 1
+                return entry
+            key_lock = self._key_locks[int(digest[:8], 16) % KEY_LOCKS]
+
+        # one download per key, other readers of the same month wait for it
+        with key_lock:
+            head = self.store.head(key)
+
+            with self._lock:
+                entry = self._entries.get(digest)
+                if head is None:
+                    if entry is not None:
+                        self._drop(digest)
+                    return None
+
+                etag, size = head
+                if entry is not None and entry.etag == etag and entry.size == size:
+                    entry.checked_at = time.monotonic()
+                    self._entries.move_to_end(digest)
+                    entry.leases += 1
+                    return entry
+
+            path = os.path.join(self.root, f"{digest}.{etag}.parquet")
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            try:
+                self.store.download(key, tmp)
+                os.replace(tmp, path)
+            except BaseException:
+                _remove(tmp)
+                raise
+
+            with self._lock:
+                if digest in self._entries:
+                    self._drop(digest)
+                entry = CacheEntry(path, etag, os.path.getsize(path), time.monotonic(), leases=1)
+                self._entries[digest] = entry
+                self._bytes += entry.size
+                self._evict()
+                return entry
+
+    def _drop(self, digest: str):
+        # caller holds self._lock
+        entry = self._entries.pop(digest)
+        self._bytes -= entry.size
+        if entry.leases == 0:
+            _remove(entry.path)
+        else:
+            entry.dropped = True
+
+    def _release(self, entry: CacheEntry):
+        # caller holds self._lock
+        entry.leases -= 1
+        if entry.dropped and entry.leases == 0:
+            # unless the key was downloaded again under the same etag since
+            live = self._entries.get(os.path.basename(entry.path).split(".")[0])
+            if live is None or live.path != entry.path:
+                _remove(entry.path)
+
+    def _evict(self):
+        # caller holds self._lock
+        for digest in list(self._entries):
+            if self._bytes <= self.max_bytes:
+                break
+            if self._entries[digest].leases == 0:
+                self._drop(digest)
+
+    def _load(self):
+        # pick up files left by a previous run, oldest access first
+        found = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.endswith(".tmp"):
+                _remove(path)
+                continue
+            parts = name.split(".")
+            if len(parts) != 3 or parts[2] != "parquet":
+                continue
+            st = os.stat(path)
+            found.append((st.st_atime, parts[0], CacheEntry(path, parts[1], st.st_size, 0.0)))
+
+        for _, digest, entry in sorted(found, key=lambda f: f[0]):
+            if digest in self._entries:     # older etag of the same key
+                self._drop(digest)
+            self._entries[digest] = entry
+            self._bytes += entry.size
+        self._evict()
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
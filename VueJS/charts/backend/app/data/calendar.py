@@ -0,0 +1,167 @@
+"""
+US equity exchange calendar (NYSE/Nasdaq), America/New_York.
+
+    pre-market   04:00 - 09:30
+    regular      09:30 - 16:00   (13:00 on half days)
+    post-market  16:00 - 20:00   (17:00 on half days)
+
+Holidays and half days follow the NYSE rules (weekend holidays observed on
+the nearest weekday, Juneteenth from 2022), plus the one-off closures in
+SPECIAL_CLOSURES. `sessions()` turns that into a table with the session
+bounds in UTC, which the resampler joins bars against.
+"""
+import functools
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import polars as pl
+
+
+TZ = "America/New_York"
+
+PRE_OPEN = (4, 0)
+OPEN = (9, 30)
+CLOSE = (16, 0)
+POST_CLOSE = (20, 0)
+EARLY_CLOSE = (13, 0)
+EARLY_POST_CLOSE = (17, 0)
+
+SESSIONS = ("rth", "extended")
+
+# years covered by the session table
+FIRST_YEAR, LAST_YEAR = 1990, 2050
+
+SPECIAL_CLOSURES = {
+    date(2012, 10, 29), date(2012, 10, 30),     # Hurricane Sandy
+    date(2018, 12, 5),                          # George H. W. Bush
+    date(2025, 1, 9),                           # Jimmy Carter
+}
+
+
+def _easter(year: int) -> date:
+    # anonymous Gregorian algorithm
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    # n-th (1-based, -1 = last) `weekday` of the month
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _observed(d: date) -> date:
+    # Saturday holidays move to Friday, Sunday ones to Monday
+    return d - timedelta(days=1) if d.weekday() == 5 else d + timedelta(days=1) if d.weekday() == 6 else d
+
+
+@functools.lru_cache(maxsize=None)
+def holidays(year: int) -> frozenset[date]:
+    days = {
+        _nth_weekday(year, 1, 0, 3),            # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),            # Washington's Birthday
+        _easter(year) - timedelta(days=2),      # Good Friday
+        _nth_weekday(year, 5, 0, -1),           # Memorial Day
+        _observed(date(year, 7, 4)),
+        _nth_weekday(year, 9, 0, 1),            # Labor Day
+        _nth_weekday(year, 11, 3, 4),           # Thanksgiving
+        _observed(date(year, 12, 25)),
+    }
+    # New Year's Day on a Saturday is not observed on the Friday before
+    new_year = _observed(date(year, 1, 1))
+    if new_year.year == year:
+        days.add(new_year)
+    if year >= 2022:
+        days.add(_observed(date(year, 6, 19)))
+    return frozenset(days | {d for d in SPECIAL_CLOSURES if d.year == year})
+
+
+@functools.lru_cache(maxsize=None)
+def half_days(year: int) -> frozenset[date]:
+    days = {_nth_weekday(year, 11, 3, 4) + timedelta(days=1)}     # day after Thanksgiving
+    for d in (date(year, 7, 3), date(year, 12, 24)):
+        if d.weekday() < 4:                                      # Mon-Thu; a Friday one is the observed holiday
+            days.add(d)
+    return frozenset(days - holidays(year))
+
+
+def is_trading_day(d: date) -> bool:
+    return d.weekday() < 5 and d not in holidays(d.year)
+
+
+def _year(year: int) -> pl.DataFrame:
+    days = [d for d in (date(year, 1, 1) + timedelta(days=i) for i in range(366)) if d.year == year and is_trading_day(d)]
+    half = half_days(year)
+
+    def at(hm, early=None):
+        return pl.Series([
+            datetime(d.year, d.month, d.day, *(early if early and d in half else hm)) for d in days
+        ]).dt.cast_time_unit("ns").dt.replace_time_zone(TZ).dt.convert_time_zone("UTC")
+
+    return pl.DataFrame({
+        "day": pl.Series(days, dtype=pl.Date),
+        "pre_open": at(PRE_OPEN),
+        "rth_open": at(OPEN),
+        "rth_close": at(CLOSE, EARLY_CLOSE),
+        "post_close": at(POST_CLOSE, EARLY_POST_CLOSE),
+    })
+
+
+@functools.lru_cache(maxsize=None)
+def sessions(first_year: int = FIRST_YEAR, last_year: int = LAST_YEAR) -> pl.DataFrame:
+    """Trading days of the years with their session bounds (Datetime ns, UTC), ascending."""
+    return pl.concat([_year(y) for y in range(first_year, last_year + 1)])
+
+
+def session_bounds(session: str) -> tuple[str, str]:
+    # calendar columns that open and close `session`
+    if session == "rth":
+        return "rth_open", "rth_close"
+    if session == "extended":
+        return "pre_open", "post_close"
+    raise ValueError(f"Invalid session: {session}")
+
+
+def local_day(ts: pl.Expr) -> pl.Expr:
+    """Exchange-local date of UTC timestamps."""
+    return ts.dt.convert_time_zone(TZ).dt.date()
+
+
+@functools.lru_cache(maxsize=64)
+def session_spans(session: str, every: str = "1d") -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (open, close, bucket) epoch ns per trading day, for placing trades:
+    the bounds of `session` and the start of the day's `every` bucket
+    ("1d", "1w", "3mo"; midnight UTC of its first date, as daily bars are stamped).
+    """
+    lo, hi = session_bounds(session)
+    df = sessions().select(
+        pl.col(lo).dt.epoch("ns"),
+        pl.col(hi).dt.epoch("ns"),
+        pl.col("day").dt.truncate(every).cast(pl.Datetime("ns")).dt.epoch("ns"),
+    )
+    return tuple(s.to_numpy() for s in df.get_columns())
+
+
+def session_open(day: date, session: str | None) -> datetime:
+    """
+    Open of `session` (regular hours if None) on the first trading day on
+    or after `day`: where a daily, weekly or monthly bar labelled `day` starts.
+    """
+    opens, _, days = session_spans(session or "rth")
+    midnight = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    i = int(np.searchsorted(days, int(midnight.timestamp()) * 10**9))
+    if i == len(days):                  # past the calendar
+        return midnight
+    return datetime.fromtimestamp(0, timezone.utc) + timedelta(microseconds=int(opens[i]) // 1000)
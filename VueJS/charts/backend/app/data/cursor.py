@@ -0,0 +1,60 @@
+"""
+Continuation tokens for paging back through market history.
+
+A token is the start of the oldest bar of the page already sent, bound to
+the query it came from (symbol, mode, bar size, session). The next page is
+the newest `limit` rows strictly before it, so the planner starts at the
+cursor's partition, skips the row groups after it and stops once the page
+is full. Daily and longer bars are labelled by date but start at the
+session open of their first trading day, which is where the token points:
+the previous day's post-market runs past midnight UTC.
+"""
+import base64
+from datetime import date, datetime, timedelta, timezone
+
+import orjson
+
+from app.data.calendar import session_open
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _micros(ts: datetime) -> int:
+    delta = ts - EPOCH
+    return (delta.days * 86_400 + delta.seconds) * 10**6 + delta.microseconds
+
+
+def bar_start(bar: datetime | date, session: str | None) -> datetime:
+    """When a bar labelled `bar` starts: its label, or the session open for date bars (1d/1w/1mo)."""
+    return bar if isinstance(bar, datetime) else session_open(bar, session)
+
+
+def encode_cursor(symbol: str, mode: str, bar_size: str | None, session: str | None, oldest: datetime | date) -> str:
+    raw = orjson.dumps({"s": symbol, "m": mode, "b": bar_size, "x": session, "t": _micros(bar_start(oldest, session))})
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str, symbol: str, mode: str, bar_size: str | None, session: str | None) -> datetime:
+    """Time the next page ends before; ValueError if the token is malformed or from another query."""
+    try:
+        data = orjson.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        key, t = (data["s"], data["m"], data["b"], data["x"]), int(data["t"])
+        cursor = EPOCH + timedelta(microseconds=t)
+    except (ValueError, TypeError, KeyError, OverflowError):
+        raise ValueError("Invalid cursor")
+    if key != (symbol, mode, bar_size, session):
+        raise ValueError("Cursor belongs to a different symbol, mode, bar size or session")
+    return cursor
+
+
+def page_end(end_ts: datetime, cursor: datetime) -> datetime:
+    # window ends are inclusive; rows at the cursor were on the previous page
+    return min(end_ts, cursor - timedelta(microseconds=1))
+
+
+def next_cursor(symbol: str, mode: str, bar_size: str | None, session: str | None, times, limit: int | None) -> str | None:
+    """Token for the page before `times` (this page's time column), None when the window is exhausted."""
+    if limit is None or len(times) < limit:
+        return None
+    return encode_cursor(symbol, mode, bar_size, session, times.min())
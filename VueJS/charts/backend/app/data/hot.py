@@ -0,0 +1,178 @@
+"""
+Hot tier: memory-mapped copies of the busiest symbols' bars.
+
+    python -m app.data.hot --symbol SPY --symbol QQQ
+    python -m app.data.hot --symbol SPY --until 2025-01-01
+
+For each symbol the minute bars and every rollup tier are written as one
+uncompressed Arrow IPC file (fixed-width columns, one record batch):
+
+    <HOT_STORE_DIR>/bar=1m/symbol=SPY.arrow
+    <HOT_STORE_DIR>/bar=5m/symbol=SPY.arrow   ...
+
+The loader memory-maps them and slices a window by binary-searching the
+timestamp column, so a read is two searchsorted calls and a zero-copy
+slice: nothing is decompressed or copied into the heap, and every worker
+process maps the same pages of the OS page cache.
+
+A file holds the complete buckets before its `until` (by default the
+start of the current UTC month); newer rows are still read from the
+bucket. Rebuild after backfills or compaction of older months; workers
+pick up a replaced file on their next read.
+"""
+import argparse
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import polars as pl
+import pyarrow as pa
+
+from app.config import load_settings
+from app.data.partitions import load_manifest, manifest_key, month_groups, rollup_keys
+from app.data.planner import _to_int, read_window
+from app.data.rollup import ROLLUPS
+from app.data.store import get_cache
+
+
+TIERS = ("1m", *ROLLUPS)
+
+
+def hot_key(symbol: str, tier: str) -> str:
+    return f"bar={tier}/symbol={symbol}.arrow"
+
+
+class HotFile:
+    """One memory-mapped (symbol, tier) file."""
+
+    def __init__(self, path: str):
+        self.table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        meta = self.table.schema.metadata
+        self.symbol = meta[b"symbol"].decode()
+        self.until = datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(microseconds=int(meta[b"until"]) // 1000)
+        # timestamp index: a view of the mapped column
+        ts = self.table.column("timestamp")
+        self.ts = ts.chunk(0).to_numpy(zero_copy_only=True).view(np.int64) if ts.num_chunks else np.empty(0, np.int64)
+
+    def slice(self, start_ts, end_ts, limit: int | None = None, descending: bool = False) -> pl.DataFrame:
+        """Rows in [start_ts, end_ts] like read_window: the first (or, descending, newest) `limit`."""
+        lo = int(np.searchsorted(self.ts, _to_int(start_ts, "ns"), side="left"))
+        hi = int(np.searchsorted(self.ts, _to_int(end_ts, "ns"), side="right"))
+        if limit is not None:
+            if descending:
+                lo = max(lo, hi - limit)
+            else:
+                hi = min(hi, lo + limit)
+        df = pl.from_arrow(self.table.slice(lo, max(hi - lo, 0)))
+        df = df.select(pl.lit(self.symbol).alias("symbol"), pl.all())
+        return df.reverse() if descending else df
+
+
+class HotStore:
+    """Hot files by (symbol, tier), opened on first use and re-opened when replaced."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._files: dict[str, tuple[tuple, HotFile]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, symbol: str, tier: str) -> HotFile | None:
+        path = os.path.join(self.root, hot_key(symbol, tier))
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._files.pop(path, None)
+            return None
+
+        ident = (st.st_ino, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            hit = self._files.get(path)
+            if hit is not None and hit[0] == ident:
+                return hit[1]
+        f = HotFile(path)
+        with self._lock:
+            self._files[path] = (ident, f)
+        return f
+
+    def stats(self) -> dict:
+        with self._lock:
+            files = [f for _, f in self._files.values()]
+        return {"files": len(files), "rows": sum(f.table.num_rows for f in files), "bytes": sum(f.table.nbytes for f in files)}
+
+
+def write_hot(root: str, symbol: str, tier: str, df: pl.DataFrame, until: datetime) -> str:
+    table = df.drop("symbol", strict=False).sort("timestamp").to_arrow().combine_chunks()
+    table = table.replace_schema_metadata({"symbol": symbol, "tier": tier, "until": str(_to_int(until, "ns"))})
+
+    path = os.path.join(root, hot_key(symbol, tier))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with pa.OSFile(path + ".tmp", "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table, max_chunksize=max(table.num_rows, 1))
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def build(root: str, symbol: str, until: datetime, start: datetime | None = None) -> dict[str, int]:
+    """
+    Write the hot files of `symbol` from the bucket: every tier from
+    `start` (default: first month in the manifest) up to the last bucket
+    that is complete before `until`. Returns rows written per tier.
+    """
+    cache = get_cache()
+    with cache.fetch([manifest_key(symbol)]) as paths:
+        manifest = load_manifest(paths[0]) if paths else None
+    if start is None:
+        months = sorted((manifest or {}).get("months", {}))
+        if not months:
+            raise ValueError(f"No manifest for {symbol}, pass --start")
+        start = datetime(int(months[0][:4]), int(months[0][5:]), 1, tzinfo=timezone.utc)
+
+    written = {}
+    for tier in TIERS:
+        # buckets (stamped at their start, days at midnight UTC) before `end` are finished
+        end = until if tier == "1m" else pl.Series([until]).dt.truncate(tier)[0]
+        lo = start if tier == "1m" else pl.Series([start]).dt.truncate(tier)[0]
+        if tier == "1m":
+            groups = month_groups(manifest, symbol, lo, end)
+        else:
+            groups = [[k] for k in rollup_keys(symbol, tier, lo, end)]
+        df = read_window(cache, groups, lo, end - timedelta(microseconds=1), descending=False)
+        if df.is_empty():
+            continue
+        write_hot(root, symbol, tier, df, end)
+        written[tier] = df.height
+    return written
+
+
+_hot: HotStore | None = None
+_lock = threading.Lock()
+
+
+def get_hot() -> HotStore:
+    global _hot
+    with _lock:
+        if _hot is None:
+            _hot = HotStore(load_settings().hot_dir)
+        return _hot
+
+
+def _date(s: str) -> datetime:
+    return datetime.fromisoformat(s).replace(tzinfo=timezone.utc)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build memory-mapped hot files from the bucket")
+    parser.add_argument("--symbol", action="append", required=True)
+    parser.add_argument("--root", default=None, help="defaults to HOT_STORE_DIR (app/.env)")
+    parser.add_argument("--start", type=_date, default=None, help="first day to include (default: first manifest month)")
+    parser.add_argument("--until", type=_date, default=None, help="exclusive end (default: start of the current UTC month)")
+    args = parser.parse_args()
+
+    now = datetime.now(timezone.utc)
+    until = args.until or datetime(now.year, now.month, 1, tzinfo=timezone.utc)
+    root = args.root or load_settings().hot_dir
+    for sym in args.symbol:
+        for tier, rows in build(root, sym, until, args.start).items():
+            print(f"{sym} {tier:>4}: {rows} rows → {os.path.join(root, hot_key(sym, tier))}")
@@ -0,0 +1,266 @@
+"""
+Timestamp index sidecars.
+
+Every partition file is written with row groups cut on time (one UTC day
+of minute bars, a week of 5m bars, whole files for the coarser tiers, at
+most TRADE_ROW_GROUP trades) and gets a small JSON sidecar next to it:
+
+    symbol=SPY/year=2024/month=01/base-*.parquet
+    symbol=SPY/year=2024/month=01/base-*.parquet.idx
+
+The sidecar maps each row group to its time range, first row and byte
+range in the file, and carries the parquet footer and the ETag the file
+gets when app.ingest.sync uploads it (ranged reads are conditional on it,
+so a file rewritten in place is never read through a stale sidecar). A reader that holds
+only the sidecar finds the row groups of a window with two binary
+searches and fetches exactly their bytes with one ranged GET, so a one-day
+query costs the same whatever the size of the month or year file
+(app.data.planner.read_ranged).
+
+Backfill sidecars (and the row-group layout) for existing files:
+
+    python -m app.data.index --root ../alpaca/data --symbol SPY
+"""
+import argparse
+import base64
+import functools
+import glob
+import hashlib
+import io
+import json
+import os
+import struct
+
+import numpy as np
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+from s3transfer.utils import ChunksizeAdjuster
+
+
+INDEX_SUFFIX = ".idx"
+
+# row groups span a calendar period of roughly a thousand bars or more
+ROW_GROUP_EVERY = {"1m": "1d", "5m": "1w", "15m": "1mo", "1h": "1mo", "1d": "1y", "1w": "1y", "1mo": "1y"}
+
+# trades per row group in the day files
+TRADE_ROW_GROUP = 256_000
+
+# multipart upload settings of app.ingest.sync, which decide the ETag of a file
+MB = 1024 * 1024
+MULTIPART_THRESHOLD = 16 * MB
+MULTIPART_CHUNK = 8 * MB
+
+
+def index_key(key: str) -> str:
+    return f"{key}{INDEX_SUFFIX}"
+
+
+def file_etag(path: str, threshold: int = MULTIPART_THRESHOLD, part_size: int = MULTIPART_CHUNK) -> str:
+    """ETag S3/MinIO give the file: plain MD5, or the MD5 of the part MD5s ("-N") for multipart uploads."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        if size < threshold:
+            return hashlib.md5(f.read()).hexdigest()
+        # same part size boto3 will really use (>= 5 MiB, <= 10k parts)
+        part_size = ChunksizeAdjuster().adjust_chunksize(part_size, size)
+        parts = [hashlib.md5(chunk).digest() for chunk in iter(lambda: f.read(part_size), b"")]
+    return f"{hashlib.md5(b''.join(parts)).hexdigest()}-{len(parts)}"
+
+
+def row_group_every(key: str) -> str | None:
+    # time span of a row group in the file at `key` (None: trades, cut by row count)
+    if key.startswith("trades/"):
+        return None
+    tier = key[len("bar="):key.index("/")] if key.startswith("bar=") else "1m"
+    return ROW_GROUP_EVERY[tier]
+
+
+def _row_groups(ts: pl.Series, every: str | None, max_rows: int | None) -> list[tuple[int, int]]:
+    # (offset, length) of each row group of timestamps sorted ascending
+    if ts.is_empty():
+        return []
+    if every is None:
+        starts = np.array([0])
+    else:
+        bucket = ts.dt.truncate(every)
+        starts = np.flatnonzero(bucket.ne_missing(bucket.shift(1)).to_numpy())
+    ends = np.append(starts[1:], ts.len())
+
+    out = []
+    for a, b in zip(starts.tolist(), ends.tolist()):
+        step = max_rows or b - a
+        out.extend((i, min(step, b - i)) for i in range(a, b, step))
+    return out
+
+
+def write_partition(df: pl.DataFrame, root: str, key: str, max_rows: int | None = None) -> str:
+    """
+    Write `df` sorted by timestamp (stable, so later duplicates stay later)
+    to `root/key` with the row groups of its layout, then its index
+    sidecar. Both are replaced atomically, data file first.
+    """
+    df = df.sort("timestamp", maintain_order=True)
+    every = row_group_every(key)
+    if every is None:
+        max_rows = max_rows or TRADE_ROW_GROUP
+    path = os.path.join(root, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    table = df.to_arrow()
+    # like polars' writer: zstd level 3, dictionary pages only for repetitive columns;
+    # statistics only on timestamp, the one column readers prune on (a smaller footer)
+    distinct = df.select(pl.all().n_unique()).row(0, named=True)
+    writer = pq.ParquetWriter(
+        path + ".tmp",
+        table.schema,
+        compression="zstd",
+        compression_level=3,
+        use_dictionary=[c for c, n in distinct.items() if n <= df.height // 2],
+        write_statistics=["timestamp"],
+    )
+    with writer:
+        for offset, length in _row_groups(df["timestamp"], every, max_rows):
+            writer.write_table(table.slice(offset, length), row_group_size=length)
+    os.replace(path + ".tmp", path)
+
+    PartitionIndex.build(path).dump(path + INDEX_SUFFIX)
+    return path
+
+
+class RangeFile(io.RawIOBase):
+    """Read-only file over one fetched byte range [base, base + len(data)) of a `size`-byte object."""
+
+    def __init__(self, data: bytes, base: int, size: int):
+        self.data = data
+        self.base = base
+        self.size = size
+        self.pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self.pos = {io.SEEK_SET: 0, io.SEEK_CUR: self.pos, io.SEEK_END: self.size}[whence] + offset
+        return self.pos
+
+    def tell(self) -> int:
+        return self.pos
+
+    def readinto(self, buf) -> int:
+        n = min(len(buf), self.size - self.pos)
+        lo = self.pos - self.base
+        if lo < 0 or lo + n > len(self.data):
+            raise OSError(f"read of [{self.pos}, {self.pos + n}) outside the fetched range")
+        buf[:n] = self.data[lo:lo + n]
+        self.pos += n
+        return n
+
+
+class PartitionIndex:
+    """
+    Row groups of one parquet file of `size` bytes and `rows` rows: time
+    range (`min`, `max`, in `unit`), first `row` and byte range [`start`,
+    `end`) of each, plus the file's footer and expected `etag` (None in
+    sidecars written before it was recorded).
+    """
+
+    def __init__(self, doc: dict):
+        self.doc = doc
+        self.size = doc["size"]
+        self.rows = doc["rows"]
+        self.unit = doc["unit"]
+        self.etag = doc.get("etag")
+        self.footer = base64.b64decode(doc["footer"])
+        groups = doc["row_groups"]
+        self.min = np.array(groups["min"], dtype=np.int64)
+        self.max = np.array(groups["max"], dtype=np.int64)
+        self.row = np.array(groups["row"], dtype=np.int64)
+        self.start = np.array(groups["start"], dtype=np.int64)
+        self.end = np.array(groups["end"], dtype=np.int64)
+
+    @classmethod
+    def build(cls, path: str) -> "PartitionIndex":
+        pf = pq.ParquetFile(path)
+        md = pf.metadata
+        col = pf.schema_arrow.get_field_index("timestamp")
+        groups = {"min": [], "max": [], "row": [], "start": [], "end": []}
+        row = 0
+        for i in range(md.num_row_groups):
+            rg = md.row_group(i)
+            stats = rg.column(col).statistics
+            if stats is None or not stats.has_min_max:
+                raise ValueError(f"{path}: row group {i} has no timestamp statistics")
+            chunks = [rg.column(c) for c in range(rg.num_columns)]
+            starts = [c.dictionary_page_offset if c.has_dictionary_page else c.data_page_offset for c in chunks]
+            groups["min"].append(stats.min_raw)
+            groups["max"].append(stats.max_raw)
+            groups["row"].append(row)
+            groups["start"].append(min(starts))
+            groups["end"].append(max(s + c.total_compressed_size for s, c in zip(starts, chunks)))
+            row += rg.num_rows
+
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            f.seek(size - 8)
+            footer_len = struct.unpack("<I", f.read(4))[0]
+            f.seek(size - 8 - footer_len)
+            footer = f.read(footer_len + 8)
+        return cls({
+            "size": size,
+            "etag": file_etag(path),
+            "rows": row,
+            "unit": pf.schema_arrow.field("timestamp").type.unit,
+            "row_groups": groups,
+            "footer": base64.b64encode(footer).decode(),
+        })
+
+    def dump(self, path: str):
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.doc, f)
+        os.replace(path + ".tmp", path)
+
+    @functools.cached_property
+    def metadata(self) -> pq.FileMetaData:
+        # the footer alone parses as a file ("PAR1" + footer + length + "PAR1")
+        return pq.read_metadata(pa.py_buffer(b"PAR1" + self.footer))
+
+    def select(self, lo: int, hi: int) -> range:
+        """Row groups overlapping [lo, hi] (in `unit`); the file is sorted, so two binary searches."""
+        first = int(np.searchsorted(self.max, lo, side="left"))
+        last = int(np.searchsorted(self.min, hi, side="right"))
+        return range(first, max(first, last))
+
+    def span(self, groups: range) -> tuple[int, int]:
+        # bytes [start, end) holding the column chunks of consecutive row groups
+        return int(self.start[groups.start]), int(self.end[groups.stop - 1])
+
+
+@functools.lru_cache(maxsize=4096)
+def load_index(path: str) -> PartitionIndex:
+    # cached local sidecars are named after their ETag, so a path never changes content
+    with open(path) as f:
+        return PartitionIndex(json.load(f))
+
+
+def partition_files(root: str, symbol: str) -> list[str]:
+    # keys of every minute, rollup and trade file of `symbol` under root
+    patterns = [f"symbol={symbol}/**/*.parquet", f"bar=*/symbol={symbol}/**/*.parquet", f"trades/symbol={symbol}/*.parquet"]
+    paths = sorted({p for pattern in patterns for p in glob.glob(os.path.join(root, pattern), recursive=True)})
+    return [os.path.relpath(p, root).replace(os.sep, "/") for p in paths]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rewrite partition files with time row groups and index sidecars")
+    parser.add_argument("--root", default="../alpaca/data")
+    parser.add_argument("--symbol", action="append", required=True)
+    args = parser.parse_args()
+
+    for sym in args.symbol:
+        keys = partition_files(args.root, sym)
+        for key in keys:
+            write_partition(pl.read_parquet(os.path.join(args.root, key)), args.root, key)
+        print(f"{sym}: indexed {len(keys)} files")
@@ -0,0 +1,354 @@
+"""
+Technical indicators over bar frames (open/high/low/close/volume/vwap).
+
+Each indicator comes in two forms that give the same numbers:
+
+- Polars expressions, applied to a whole query result (`apply`), and
+- an incremental object with O(1) `update(bar)` for live candles, where
+  `update(bar, final=False)` previews a still-open bar without moving the
+  state forward.
+
+Output columns are named after the spec: sma_20, ema_50_open,
+bollinger_20_2_upper, macd_12_26_9_signal, ...
+"""
+import math
+from collections import deque
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import polars as pl
+
+from app.data.calendar import TZ, local_day
+
+
+DEFAULTS = {
+    "sma": {"period": 20, "source": "close"},
+    "ema": {"period": 20, "source": "close"},
+    "rsi": {"period": 14},
+    "bollinger": {"period": 20, "k": 2.0},
+    "vwap_bands": {"k": 2.0},
+    "atr": {"period": 14},
+    "macd": {"fast": 12, "slow": 26, "signal": 9},
+}
+
+# bar columns an indicator can run on (`source`)
+SOURCES = ("open", "high", "low", "close", "volume", "vwap")
+
+
+def resolve(name: str, params: dict | None = None) -> tuple[str, dict, str]:
+    """(name, params with defaults, column prefix); ValueError for unknown names/params."""
+    name = name.lower()
+    if name not in DEFAULTS:
+        raise ValueError(f"Unknown indicator: {name}")
+    params = params or {}
+    unknown = set(params) - set(DEFAULTS[name])
+    if unknown:
+        raise ValueError(f"Unknown parameters for {name}: {sorted(unknown)}")
+    params = {**DEFAULTS[name], **params}
+    for key, value in params.items():
+        if key == "source":
+            if value not in SOURCES:
+                raise ValueError(f"{name}.source must be one of {', '.join(SOURCES)}")
+        elif isinstance(value, bool) or not (isinstance(value, (int, float)) and value > 0):
+            raise ValueError(f"{name}.{key} must be a positive number")
+        if key in ("period", "fast", "slow", "signal"):
+            params[key] = int(value)
+
+    parts = [name]
+    for key, value in params.items():
+        if key == "source":
+            if value != "close":
+                parts.append(value)
+        else:
+            parts.append(f"{value:g}")
+    return name, params, "_".join(parts)
+
+
+def warmup(name: str, params: dict) -> int:
+    # bars of history needed before the first value is settled
+    if name in ("sma", "bollinger"):
+        return params["period"] - 1
+    # exponential ones never fully settle; 5 periods leave < 1% of the seed
+    if name in ("ema", "rsi", "atr"):
+        return 5 * params["period"]
+    if name == "macd":
+        return 5 * params["slow"] + 5 * params["signal"]
+    return 0
+
+
+# ---------------------------------------------------------------- vectorized
+
+
+def _wilder(x: pl.Expr, period: int) -> pl.Expr:
+    return x.ewm_mean(alpha=1 / period, adjust=False, min_samples=period)
+
+
+def _ema(x: pl.Expr, span: int) -> pl.Expr:
+    return x.ewm_mean(span=span, adjust=False, min_samples=span)
+
+
+def exprs(name: str, params: dict, prefix: str, time_col: str, dated: bool = False) -> list[pl.Expr]:
+    # dated: the time column holds dates (daily bars), not timestamps
+    close = pl.col("close")
+
+    if name == "sma":
+        return [pl.col(params["source"]).rolling_mean(params["period"]).alias(prefix)]
+
+    if name == "ema":
+        return [_ema(pl.col(params["source"]), params["period"]).alias(prefix)]
+
+    if name == "rsi":
+        delta = close.diff()
+        gain = _wilder(delta.clip(lower_bound=0), params["period"])
+        loss = _wilder((-delta).clip(lower_bound=0), params["period"])
+        return [pl.when(gain + loss > 0).then(100 * gain / (gain + loss)).alias(prefix)]
+
+    if name == "bollinger":
+        mid = close.rolling_mean(params["period"])
+        sd = close.rolling_std(params["period"], ddof=0)
+        return [
+            mid.alias(f"{prefix}_mid"),
+            (mid + params["k"] * sd).alias(f"{prefix}_upper"),
+            (mid - params["k"] * sd).alias(f"{prefix}_lower"),
+        ]
+
+    if name == "vwap_bands":
+        # running VWAP of the exchange session (its New York date), bands at k volume-weighted std devs
+        session = pl.col(time_col) if dated else local_day(pl.col(time_col))
+        v, p = pl.col("volume"), pl.col("vwap")
+        cum_v = v.cum_sum().over(session)
+        line = (p * v).cum_sum().over(session) / cum_v
+        sd = ((p * p * v).cum_sum().over(session) / cum_v - line * line).clip(lower_bound=0).sqrt()
+        return [
+            line.alias(prefix),
+            (line + params["k"] * sd).alias(f"{prefix}_upper"),
+            (line - params["k"] * sd).alias(f"{prefix}_lower"),
+        ]
+
+    if name == "atr":
+        prev = close.shift(1)
+        tr = pl.max_horizontal(
+            pl.col("high") - pl.col("low"),
+            (pl.col("high") - prev).abs(),
+            (pl.col("low") - prev).abs(),
+        )
+        return [_wilder(tr, params["period"]).alias(prefix)]
+
+    if name == "macd":
+        line = _ema(close, params["fast"]) - _ema(close, params["slow"])
+        signal = _ema(line, params["signal"])
+        return [
+            line.alias(prefix),
+            signal.alias(f"{prefix}_signal"),
+            (line - signal).alias(f"{prefix}_hist"),
+        ]
+
+    raise ValueError(f"Unknown indicator: {name}")
+
+
+def columns(specs) -> list[str]:
+    """Output column names of the specs, in order."""
+    return [e.meta.output_name() for e in _all_exprs(specs, "timestamp")]
+
+
+def apply(df: pl.DataFrame, specs, time_col: str, history=None) -> tuple[pl.DataFrame, list[str]]:
+    """
+    Add the columns of every spec (IndicatorSpec or (name, params)) to an
+    oldest-first frame. `history(n, since)`, if given, returns the bars
+    before `df` (same columns): up to n of them, and all of those at or
+    after `since` if that isn't None. They warm the indicators up and are
+    not returned.
+    """
+    dated = df.schema[time_col] == pl.Date
+    out = _all_exprs(specs, time_col, dated)
+    if not out or df.is_empty():
+        return df, [e.meta.output_name() for e in out]
+
+    n = max(warmup(*resolve(*_spec(s))[:2]) for s in specs)
+    # session VWAPs run from the New York midnight of the first bar's day
+    since = None
+    if not dated and any(_spec(s)[0] == "vwap_bands" for s in specs):
+        since = _day_start(df[time_col][0])
+    past = history(n, since) if history is not None and (n or since) else None
+    if past is not None and past.height:
+        full = pl.concat([past, df], how="vertical_relaxed").with_columns(out)
+        df = full.tail(df.height)
+    else:
+        df = df.with_columns(out)
+    return df, [e.meta.output_name() for e in out]
+
+
+def _all_exprs(specs, time_col: str, dated: bool = False) -> list[pl.Expr]:
+    out = []
+    for spec in specs or []:
+        out.extend(exprs(*resolve(*_spec(spec)), time_col, dated))
+    return out
+
+
+def _spec(spec) -> tuple[str, dict]:
+    if isinstance(spec, tuple):
+        return spec
+    return spec.name, spec.params
+
+
+# ---------------------------------------------------------------- incremental
+
+
+class _Ema:
+    def __init__(self, alpha: float, min_samples: int):
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.y: float | None = None
+        self.n = 0
+
+    def step(self, x: float | None, final: bool) -> float | None:
+        if x is None:
+            return None
+        y = x if self.y is None else self.y + self.alpha * (x - self.y)
+        n = self.n + 1
+        if final:
+            self.y, self.n = y, n
+        return y if n >= self.min_samples else None
+
+
+class _Window:
+    """Running sum and sum of squares over the last `size` values."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.values: deque[float] = deque()
+        self.sum = 0.0
+        self.sumsq = 0.0
+
+    def step(self, x: float, final: bool) -> tuple[float, float, int]:
+        out = self.values[0] if len(self.values) == self.size else 0.0
+        s, ss = self.sum + x - out, self.sumsq + x * x - out * out
+        n = min(len(self.values) + 1, self.size)
+        if final:
+            if len(self.values) == self.size:
+                self.values.popleft()
+            self.values.append(x)
+            self.sum, self.sumsq = s, ss
+        return s, ss, n
+
+
+class Incremental:
+    """One indicator over a stream of bars, oldest first."""
+
+    def __init__(self, name: str, params: dict, prefix: str):
+        self.name = name
+        self.params = params
+        self.prefix = prefix
+        self.prev_close: float | None = None
+
+        if name in ("sma", "bollinger"):
+            self.window = _Window(params["period"])
+        elif name == "ema":
+            self.ema = _Ema(2 / (params["period"] + 1), params["period"])
+        elif name == "rsi":
+            self.gain = _Ema(1 / params["period"], params["period"])
+            self.loss = _Ema(1 / params["period"], params["period"])
+        elif name == "atr":
+            self.tr = _Ema(1 / params["period"], params["period"])
+        elif name == "macd":
+            self.fast = _Ema(2 / (params["fast"] + 1), params["fast"])
+            self.slow = _Ema(2 / (params["slow"] + 1), params["slow"])
+            self.signal = _Ema(2 / (params["signal"] + 1), params["signal"])
+        elif name == "vwap_bands":
+            self.session = None
+            self.sums = (0.0, 0.0, 0.0)      # volume, pv, p^2 v
+
+    def update(self, bar: dict, final: bool = True) -> dict[str, float | None]:
+        p, name = self.prefix, self.name
+        close = bar["close"]
+
+        if name == "sma":
+            s, _, n = self.window.step(bar[self.params["source"]], final)
+            out = {p: s / n if n == self.params["period"] else None}
+
+        elif name == "ema":
+            out = {p: self.ema.step(bar[self.params["source"]], final)}
+
+        elif name == "rsi":
+            delta = None if self.prev_close is None else close - self.prev_close
+            gain = self.gain.step(None if delta is None else max(delta, 0.0), final)
+            loss = self.loss.step(None if delta is None else max(-delta, 0.0), final)
+            out = {p: None if gain is None or gain + loss == 0 else 100 * gain / (gain + loss)}
+
+        elif name == "bollinger":
+            s, ss, n = self.window.step(close, final)
+            if n < self.params["period"]:
+                out = {f"{p}_mid": None, f"{p}_upper": None, f"{p}_lower": None}
+            else:
+                mid = s / n
+                sd = math.sqrt(max(ss / n - mid * mid, 0.0))
+                k = self.params["k"]
+                out = {f"{p}_mid": mid, f"{p}_upper": mid + k * sd, f"{p}_lower": mid - k * sd}
+
+        elif name == "vwap_bands":
+            session = _day(bar["time"])
+            v, pv, ppv = self.sums if session == self.session else (0.0, 0.0, 0.0)
+            price, volume = bar["vwap"], bar["volume"]
+            v, pv, ppv = v + volume, pv + price * volume, ppv + price * price * volume
+            if final:
+                self.session, self.sums = session, (v, pv, ppv)
+            if v:
+                line = pv / v
+                sd = math.sqrt(max(ppv / v - line * line, 0.0))
+                k = self.params["k"]
+                out = {p: line, f"{p}_upper": line + k * sd, f"{p}_lower": line - k * sd}
+            else:
+                out = {p: None, f"{p}_upper": None, f"{p}_lower": None}
+
+        elif name == "atr":
+            hl = bar["high"] - bar["low"]
+            if self.prev_close is None:
+                tr = hl
+            else:
+                tr = max(hl, abs(bar["high"] - self.prev_close), abs(bar["low"] - self.prev_close))
+            out = {p: self.tr.step(tr, final)}
+
+        elif name == "macd":
+            fast, slow = self.fast.step(close, final), self.slow.step(close, final)
+            line = None if fast is None or slow is None else fast - slow
+            signal = self.signal.step(line, final)
+            out = {
+                p: line,
+                f"{p}_signal": signal,
+                f"{p}_hist": None if signal is None else line - signal,
+            }
+
+        if final:
+            self.prev_close = close
+        return out
+
+
+class IndicatorSet:
+    """Incremental versions of a list of specs, updated together per bar."""
+
+    def __init__(self, specs):
+        self.items = [Incremental(*resolve(*_spec(s))) for s in specs]
+
+    def update(self, bar: dict, final: bool = True) -> dict[str, float | None]:
+        out = {}
+        for item in self.items:
+            out.update(item.update(bar, final))
+        return out
+
+
+_TZ = ZoneInfo(TZ)
+
+
+def _day(ts):
+    # exchange session (New York date) of a bar time: datetime (naive = UTC), date, or epoch ms from live candles
+    if isinstance(ts, (int, float)):
+        ts = datetime.fromtimestamp(ts / 1000, tz=timezone.utc)
+    if isinstance(ts, datetime):
+        return (ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)).astimezone(_TZ).date()
+    return ts
+
+
+def _day_start(ts) -> datetime:
+    # New York midnight (as UTC) of the session a bar time belongs to
+    d = _day(ts)
+    return datetime(d.year, d.month, d.day, tzinfo=_TZ).astimezone(timezone.utc)
@@ -1,40 +1,463 @@
-from dateutil.relativedelta import relativedelta
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
 import polars as pl
 
+from app.data import aio, indicators
+from app.data.partitions import key_symbol, load_manifest, manifest_key, month_groups, rollup_keys
+from app.data.budget import get_budget, window_rows
+from app.data.hot import HotFile, get_hot
+from app.data.planner import lazy_window, read_window
+from app.data.bars import parse_bar_size
+from app.data.cursor import bar_start
+from app.data.resample import resample_bars
+from app.data.rollup import SOURCE, floor_ts, full_buckets, rollup_tier, to_rollup
+from app.data.store import get_cache
+from app.data.trades import trade_bars
 
-def month_range(start, end):
-    cur = start.replace(day=1)
-    while cur <= end:
-        yield cur
-        cur += relativedelta(months=1)
 
+SCHEMA = {
+    "symbol": pl.String,
+    "timestamp": pl.Datetime("ns", "UTC"),
+    "open": pl.Float64,
+    "high": pl.Float64,
+    "low": pl.Float64,
+    "close": pl.Float64,
+    "volume": pl.Float64,
+    "trade_count": pl.Float64,
+    "vwap": pl.Float64,
+}
 
-def load_ticks(symbol: str, start_ts, end_ts, limit: int = 1000) -> pl.DataFrame:
-    paths = []
+# objects fetched at once by multi-symbol queries
+FETCH_WORKERS = 16
 
-    for d in month_range(start_ts, end_ts):
-        paths.append(
-            f"s3://market-data/symbol={symbol}/year={d.year}/month={d.month:02d}.parquet"
-        )
 
-    df = pl.scan_parquet(
-        paths,
-        storage_options={
-            "aws_access_key_id": "minioadmin",
-            "aws_secret_access_key": "minioadmin",
-            "endpoint_url": "http://localhost:9100",
-        },
-    )
-
-    df = (
-        df.filter(
-            (pl.col("timestamp") >= start_ts) &
-            (pl.col("timestamp") <= end_ts)
+def minute_groups(symbol: str, start_ts, end_ts) -> list[list[str]]:
+    # one snapshot of the manifest per query, so compaction can't change the file set under it
+    with get_cache().fetch([manifest_key(symbol)]) as paths:
+        manifest = load_manifest(paths[0]) if paths else None
+    return month_groups(manifest, symbol, start_ts, end_ts)
+
+
+def _groups(symbol: str, tier: str, start_ts, end_ts) -> list[list[str]]:
+    # objects of the minute partitions or a rollup tier over the window
+    if tier == "1m":
+        return minute_groups(symbol, start_ts, end_ts)
+    return [[k] for k in rollup_keys(symbol, tier, start_ts, end_ts)]
+
+
+def _read_hot(hot: HotFile, tier: str, start_ts, end_ts, limit: int | None, descending: bool, cancel) -> pl.DataFrame:
+    """
+    read_window over a symbol with a hot file: rows before `hot.until` are
+    sliced from the mapped file, newer ones read from the bucket.
+    """
+    if end_ts < hot.until:
+        return hot.slice(start_ts, end_ts, limit, descending)
+
+    def recent(n):
+        groups = _groups(hot.symbol, tier, hot.until, end_ts)
+        return read_window(get_cache(), groups, hot.until, end_ts, limit=n, descending=descending, schema=SCHEMA, cancel=cancel)
+
+    def older(n):
+        return hot.slice(start_ts, end_ts, n, descending)
+
+    first, second = (recent, older) if descending else (older, recent)
+    df = first(limit)
+    if limit is not None and df.height >= limit:
+        return df
+    rest = second(None if limit is None else limit - df.height)
+    return pl.concat([df, rest], how="vertical_relaxed")
+
+
+def load_ticks(
+    symbol: str,
+    start_ts,
+    end_ts,
+    limit: int | None = 1000,
+    descending: bool = True,
+    cancel=None,
+) -> pl.DataFrame:
+    # newest `limit` rows by default; months missing from the bucket are skipped
+    hot = get_hot().get(symbol, "1m")
+    if hot is not None and start_ts < hot.until:
+        return _read_hot(hot, "1m", start_ts, end_ts, limit, descending, cancel)
+
+    groups = minute_groups(symbol, start_ts, end_ts)
+    if not get_budget().streams(window_rows(start_ts, end_ts, "1m", limit)):
+        return read_window(
+            get_cache(),
+            groups,
+            start_ts,
+            end_ts,
+            limit=limit,
+            descending=descending,
+            schema=SCHEMA,
+            cancel=cancel,
         )
-        .sort("timestamp", descending=True)
-    )
 
-    # df = df.sort("bar", descending=True).limit(limit)
-    # return df.collect()
-    
-    return df.limit(limit).collect()
+    # over the per-request budget: let the streaming engine scan and sort
+    with lazy_window(get_cache(), groups, start_ts, end_ts, cancel=cancel) as lf:
+        if lf is None:
+            return pl.DataFrame(schema=SCHEMA)
+        lf = lf.sort("timestamp", descending=descending)
+        return (lf.head(limit) if limit is not None else lf).collect(engine="streaming")
+
+
+def _read_tier(symbol: str, tier: str, start_ts, end_ts, cancel) -> pl.DataFrame:
+    # rows of a tier in the window, ascending
+    hot = get_hot().get(symbol, tier)
+    if hot is not None and start_ts < hot.until:
+        return _read_hot(hot, tier, start_ts, end_ts, None, False, cancel)
+    return read_window(get_cache(), _groups(symbol, tier, start_ts, end_ts), start_ts, end_ts, descending=False, schema=SCHEMA, cancel=cancel)
+
+
+def _tier_rows(symbol: str, tier: str, start_ts, end_ts, cancel) -> pl.DataFrame:
+    """
+    Rows of `tier` (rollup layout, stamped at the bucket start) holding
+    exactly the minutes in [start_ts, end_ts]: the stored buckets that lie
+    wholly inside, plus the partial ones at either end rebuilt from the
+    tier below, down to minutes. A tier that isn't built is rebuilt whole.
+    Meant for short windows (the edges of a query).
+    """
+    if tier == "1m":
+        return _read_tier(symbol, "1m", start_ts, end_ts, cancel)
+    full = full_buckets(tier, start_ts, end_ts)
+    if full is None:
+        return _rebuild(symbol, tier, start_ts, end_ts, cancel)
+
+    first, last, lo, hi = full
+    middle = _read_tier(symbol, tier, first, last, cancel)
+    if middle.is_empty():
+        return _rebuild(symbol, tier, start_ts, end_ts, cancel)
+    head, tail = _edges(symbol, tier, start_ts, end_ts, lo, hi, cancel)
+    return pl.concat([head, middle, tail], how="vertical_relaxed")
+
+
+def _rebuild(symbol: str, tier: str, start_ts, end_ts, cancel) -> pl.DataFrame:
+    # `tier` rows of the window resampled from the tier it is built from
+    source = SOURCE[tier]
+    rows = _tier_rows(symbol, source, start_ts, end_ts, cancel) if start_ts <= end_ts else None
+    if rows is None or rows.is_empty():
+        return pl.DataFrame(schema=SCHEMA)
+    return to_rollup(resample_bars(rows.sort("timestamp"), tier, source=source), symbol)
+
+
+def _edges(symbol: str, tier: str, start_ts, end_ts, lo, hi, cancel) -> list[pl.DataFrame]:
+    # partial `tier` buckets before `lo` and from `hi` on (full_buckets)
+    return [
+        _rebuild(symbol, tier, start_ts, lo - timedelta(microseconds=1), cancel),
+        _rebuild(symbol, tier, hi, end_ts, cancel),
+    ]
+
+
+def _read_bars(
+    symbol: str,
+    start_ts,
+    end_ts,
+    step: str,
+    bar_size: str,
+    limit: int | None,
+    session,
+    cancel,
+    edges: list[pl.DataFrame] = (),
+) -> pl.DataFrame | None:
+    """
+    Newest `limit` rows of `step` resolution together with `edges` (rows
+    of the same step around the window), resampled to bar_size; streamed
+    when over budget. None if the window has no `step` rows.
+    """
+    edges = [e for e in edges if not e.is_empty()]
+    hot = get_hot().get(symbol, step)
+    if hot is not None and start_ts < hot.until:
+        # mapped, not decoded: slicing a long window costs no heap
+        df = _read_hot(hot, step, start_ts, end_ts, limit, True, cancel)
+        if df.is_empty():
+            return None
+        df = pl.concat([df, *edges], how="vertical_relaxed").sort("timestamp")
+        return resample_bars(df, bar_size, session=session, source=step)
+
+    groups = _groups(symbol, step, start_ts, end_ts)
+    if not get_budget().streams(window_rows(start_ts, end_ts, step, limit)):
+        df = read_window(get_cache(), groups, start_ts, end_ts, limit=limit, schema=SCHEMA, cancel=cancel)
+        if df.is_empty():
+            return None
+        df = pl.concat([df, *edges], how="vertical_relaxed").sort("timestamp")
+        return resample_bars(df, bar_size, session=session, source=step)
+
+    with lazy_window(get_cache(), groups, start_ts, end_ts, cancel=cancel) as lf:
+        if lf is None:
+            return None
+        lf = pl.concat([lf, *[e.lazy() for e in edges]], how="vertical_relaxed").sort("timestamp")
+        if limit is not None:
+            lf = lf.tail(limit)
+        return resample_bars(lf, bar_size, session=session, source=step).collect(engine="streaming")
+
+
+def _read_limit(step: str, bar_size: str, limit: int | None, session: str | None) -> int | None:
+    # rows to read for `limit` bars: only countable up front when rows are already the bars
+    return limit if step == bar_size and session is None else None
+
+
+def load_bars(
+    symbol: str,
+    start_ts,
+    end_ts,
+    bar_size: str,
+    limit: int | None = None,
+    session: str | None = None,
+    cancel=None,
+) -> pl.DataFrame:
+    """
+    Newest `limit` bars of `bar_size` in the window, oldest first.
+    Reads the coarsest materialized rollup that can produce `bar_size`
+    and falls back to minute partitions if it hasn't been built. Only
+    rollup buckets wholly inside the window are read; the partial ones at
+    its ends are rebuilt from finer tiers, so bars hold exactly the
+    window's minutes. `session` ("rth" | "extended") is passed to
+    resample_bars.
+    """
+    tier = rollup_tier(bar_size, session)
+    df = None
+
+    if tier != "1m":
+        full = full_buckets(tier, start_ts, end_ts)
+        if full is not None:
+            first, last, lo, hi = full
+            edges = _edges(symbol, tier, start_ts, end_ts, lo, hi, cancel)
+            df = _read_bars(symbol, first, last, tier, bar_size, _read_limit(tier, bar_size, limit, session), session, cancel, edges)
+
+    if df is None:
+        df = _read_bars(symbol, start_ts, end_ts, "1m", bar_size, _read_limit("1m", bar_size, limit, session), session, cancel)
+    if df is None:
+        df = resample_bars(pl.DataFrame(schema=SCHEMA), bar_size, session=session)
+
+    return df.tail(limit) if limit is not None else df
+
+
+def load_trade_bars(
+    symbol: str,
+    start_ts,
+    end_ts,
+    bar_size: str,
+    limit: int | None = None,
+    session: str | None = None,
+    cancel=None,
+) -> pl.DataFrame:
+    """
+    Newest `limit` bars of any fixed size (e.g. "10s", "1d", "1w") or
+    information bars ("tick:100"), built from the trade day files; daily
+    and longer bars are exchange sessions like load_bars'. With a limit
+    only the end of the window is read, widened until it holds `limit`
+    bars, so a page costs about its own size; information bars are
+    numbered from the start of the window, so they always read all of it.
+    """
+    if limit is None or parse_bar_size(bar_size).kind != "time":
+        df = trade_bars(get_cache(), symbol, start_ts, end_ts, bar_size, session, cancel=cancel)
+        return df if limit is None else df.tail(limit)
+
+    span = _lookback(bar_size, limit)
+    while True:
+        lo = start_ts if span >= end_ts - start_ts else max(start_ts, floor_ts(end_ts - span, bar_size))
+        df = trade_bars(get_cache(), symbol, lo, end_ts, bar_size, session, cancel=cancel)
+        if df.height >= limit or lo <= start_ts:
+            return df.tail(limit)
+        span *= 4
+
+
+def _hot_files(symbols: list[str], tier: str, start_ts) -> dict[str, HotFile]:
+    # symbols whose window starts inside their hot file
+    hot = get_hot()
+    files = {s: hot.get(s, tier) for s in symbols}
+    return {s: f for s, f in files.items() if f is not None and start_ts < f.until}
+
+
+def _read_bars_multi(groups, start_ts, end_ts, step: str, bar_size: str, symbols: int, session, cancel, hot=None, edges=None) -> pl.DataFrame:
+    # one lazy scan over every symbol's partitions, resampled grouped by symbol;
+    # `hot` symbols are sliced from their mapped files up to `until`, scanned after it;
+    # `edges` (symbol -> rows of the same step around the window) join the symbols with hot or stored rows
+    hot = hot or {}
+    keys = set()
+    with lazy_window(get_cache(), groups, start_ts, end_ts, by=["symbol"], workers=FETCH_WORKERS, cancel=cancel, found=keys) as lf:
+        if lf is not None and hot:
+            # yearly rollup files also hold the months that are hot
+            lf = lf.filter(~pl.any_horizontal(
+                pl.lit(False),
+                *[(pl.col("symbol") == s) & (pl.col("timestamp") < f.until) for s, f in hot.items()],
+            ))
+        frames = [f.slice(start_ts, end_ts).lazy() for f in hot.values()] + ([lf] if lf is not None else [])
+        if edges:
+            found = set(hot) | {key_symbol(k) for k in keys}
+            frames += [e.lazy() for s, e in edges.items() if s in found and not e.is_empty()]
+        lf = pl.concat(frames, how="vertical_relaxed") if frames else pl.LazyFrame(schema=SCHEMA)
+        lf = lf.sort("symbol", "timestamp")
+        streaming = get_budget().streams(symbols * window_rows(start_ts, end_ts, step))
+        plan = resample_bars(lf, bar_size, by=["symbol"], session=session, source=step)
+        return plan.collect(engine="streaming" if streaming else "auto")
+
+
+def load_bars_multi(
+    symbols: list[str],
+    start_ts,
+    end_ts,
+    bar_size: str,
+    limit: int | None = None,
+    session: str | None = None,
+    cancel=None,
+) -> pl.DataFrame:
+    """
+    Bars of `bar_size` for many symbols over one window, as one frame with
+    a symbol column sorted by (symbol, bar); `limit` is per symbol (newest).
+    The partitions of every symbol are planned together and read in one
+    parallel scan, and the resample runs once over the symbol-grouped frame.
+    Symbols without the rollup fall back to minute partitions, and the
+    partial buckets at the window's ends are rebuilt, like load_bars.
+    """
+    cache = get_cache()
+    tier = rollup_tier(bar_size, session)
+    budget = get_budget()
+    out_rows = len(symbols) * window_rows(start_ts, end_ts, bar_size, limit)
+    read_rows = len(symbols) * window_rows(start_ts, end_ts, tier)
+
+    with budget.reserve(budget.footprint(read_rows, out_rows), cancel):
+        frames, missing = [], list(symbols)
+
+        full = full_buckets(tier, start_ts, end_ts) if tier != "1m" else None
+        if full is not None:
+            # whole buckets from the rollup, the partial ones at the ends rebuilt per symbol
+            first, last, lo, hi = full
+            with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+                edges = pool.map(lambda s: pl.concat(_edges(s, tier, start_ts, end_ts, lo, hi, cancel)), symbols)
+                edges = dict(zip(symbols, edges))
+            hot = _hot_files(symbols, tier, first)
+            groups = [
+                [k] for s in symbols
+                for k in rollup_keys(s, tier, hot[s].until if s in hot else first, last)
+            ]
+            df = _read_bars_multi(groups, first, last, tier, bar_size, len(symbols), session, cancel, hot, edges)
+            found = set(df["symbol"].unique().to_list())
+            frames.append(df)
+            missing = [s for s in symbols if s not in found]
+        elif tier != "1m":
+            # no whole bucket in the window: every bar is partial
+            rebuilt = [_rebuild(s, tier, start_ts, end_ts, cancel) for s in symbols]
+            rebuilt = pl.concat([r for r in rebuilt if not r.is_empty()] or [pl.DataFrame(schema=SCHEMA)]).sort("symbol", "timestamp")
+            if not rebuilt.is_empty():
+                frames.append(resample_bars(rebuilt, bar_size, by=["symbol"], session=session, source=tier))
+            found = set(rebuilt["symbol"].unique().to_list())
+            missing = [s for s in symbols if s not in found]
+
+        if missing:
+            hot = _hot_files(missing, "1m", start_ts)
+            manifests = {}
+            with cache.fetch_many([manifest_key(s) for s in missing], FETCH_WORKERS) as paths:
+                for s in missing:
+                    path = paths.get(manifest_key(s))
+                    manifests[s] = load_manifest(path) if path else None
+            groups = [
+                g for s in missing
+                for g in month_groups(manifests[s], s, hot[s].until if s in hot else start_ts, end_ts)
+            ]
+            frames.append(_read_bars_multi(groups, start_ts, end_ts, "1m", bar_size, len(missing), session, cancel, hot))
+
+        df = pl.concat(frames, how="vertical_relaxed").sort("symbol", "bar")
+        if limit is not None:
+            df = df.group_by("symbol", maintain_order=True).tail(limit)
+        return df
+
+
+def _lookback(bar_size: str, n: int) -> timedelta:
+    # time span that holds n bars, with room for nights, weekends and holidays
+    # (information bars count as a minute each, the shortest they can be from minute rows)
+    spec = parse_bar_size(bar_size)
+    approx = timedelta(days=31 * spec.n) if spec.unit == "mo" else timedelta(microseconds=spec.step_ns // 1000)
+    return approx * n * 2 + timedelta(days=5)
+
+
+def load_market(
+    symbol: str,
+    start_ts,
+    end_ts,
+    mode: str = "bars",
+    bar_size: str | None = None,
+    limit: int | None = None,
+    descending: bool = False,
+    specs=None,
+    session: str | None = None,
+    cancel=None,
+) -> tuple[pl.DataFrame, str, list[str]]:
+    """
+    The query pipeline behind the HTTP and WebSocket endpoints: load by
+    mode (bars | trades | ticks), then add the indicator columns in `specs`,
+    warmed up on the bars just before the result. `descending` only applies
+    to ticks, `session` to bars and trades. Returns (frame, time column, indicator columns).
+    """
+    if mode in ("bars", "trades"):
+        if not bar_size:
+            raise ValueError(f"bar_size required for {mode} mode")
+        if mode == "bars":
+            load = functools.partial(load_bars, bar_size=bar_size, session=session)
+        else:
+            load = functools.partial(load_trade_bars, bar_size=bar_size, session=session)
+        time_col = "bar"
+    elif mode == "ticks":
+        load = functools.partial(load_ticks, descending=descending)
+        time_col = "timestamp"
+    else:
+        raise ValueError(f"Invalid mode: {mode}")
+
+    with get_budget().reserve(_footprint(mode, bar_size, start_ts, end_ts, limit, session), cancel):
+        df = load(symbol, start_ts, end_ts, limit=limit, cancel=cancel)
+        if not specs:
+            return df, time_col, []
+
+        def history(n: int, since=None) -> pl.DataFrame:
+            end = bar_start(df[time_col].min(), session) - timedelta(microseconds=1)
+            past = functools.partial(load, descending=True) if mode == "ticks" else load
+            rows = past(symbol, end - _lookback(bar_size or "1m", n), end, limit=n, cancel=cancel) if n else None
+            if since is not None and since <= end:
+                # both end right before the first bar: the longer one holds the other
+                day = past(symbol, since, end, cancel=cancel)
+                if rows is None or day.height > rows.height:
+                    rows = day
+            return rows.sort(time_col) if rows is not None else df.clear()
+
+        flip = mode == "ticks" and descending      # indicators run oldest first
+        df, cols = indicators.apply(df.reverse() if flip else df, specs, time_col, history)
+        return (df.reverse() if flip else df), time_col, cols
+
+
+def _footprint(mode: str, bar_size: str | None, start_ts, end_ts, limit: int | None, session: str | None) -> int:
+    # peak memory of a load_market call, for admission (app.data.budget)
+    out_rows = window_rows(start_ts, end_ts, bar_size or "1m", limit)
+    if mode == "trades":
+        read_rows = 0       # trades are folded into bars one record batch at a time
+    elif mode == "ticks":
+        read_rows = out_rows
+    else:
+        step = rollup_tier(bar_size, session)
+        read_rows = window_rows(start_ts, end_ts, step, _read_limit(step, bar_size, limit, session))
+    return get_budget().footprint(read_rows, out_rows)
+
+
+# awaitable versions for async handlers: run in the data pool, cancelled with the caller
+
+
+async def aload_ticks(symbol: str, start_ts, end_ts, **kwargs) -> pl.DataFrame:
+    return await aio.run(load_ticks, symbol, start_ts, end_ts, **kwargs)
+
+
+async def aload_bars(symbol: str, start_ts, end_ts, bar_size: str, **kwargs) -> pl.DataFrame:
+    return await aio.run(load_bars, symbol, start_ts, end_ts, bar_size, **kwargs)
+
+
+async def aload_trade_bars(symbol: str, start_ts, end_ts, bar_size: str, **kwargs) -> pl.DataFrame:
+    return await aio.run(load_trade_bars, symbol, start_ts, end_ts, bar_size, **kwargs)
+
+
+async def aload_bars_multi(symbols: list[str], start_ts, end_ts, bar_size: str, **kwargs) -> pl.DataFrame:
+    return await aio.run(load_bars_multi, symbols, start_ts, end_ts, bar_size, **kwargs)
+
+
+async def aload_market(symbol: str, start_ts, end_ts, **kwargs) -> tuple[pl.DataFrame, str, list[str]]:
+    return await aio.run(load_market, symbol, start_ts, end_ts, **kwargs)
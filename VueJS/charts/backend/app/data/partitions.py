@@ -0,0 +1,103 @@
+"""
+Object layout of the market-data bucket (mirrored by the local ../alpaca/data):
+
+    symbol=SPY/_manifest.json                      live 1m files per month
+    symbol=SPY/year=2020/month=01.parquet          1m bars (pre-manifest base)
+    symbol=SPY/year=2020/month=01/base-*.parquet   1m bars, compacted base
+    symbol=SPY/year=2020/month=01/delta-*.parquet  1m bars, appended batches
+    bar=5m/symbol=SPY/year=2020/month=01.parquet   5m / 15m / 1h rollups
+    bar=1d/symbol=SPY/year=2020.parquet            1d / 1w / 1mo rollups
+    trades/symbol=SPY/date=2020-01-02.parquet      trades of one UTC day
+
+Every parquet file has a timestamp index sidecar, `<key>.idx` (app.data.index).
+"""
+import json
+import os
+from datetime import timedelta
+
+from dateutil.relativedelta import relativedelta
+
+
+YEARLY = {"1d", "1w", "1mo"}
+
+
+def month_range(start, end):
+    cur = start.replace(day=1)
+    while cur <= end:
+        yield cur
+        cur += relativedelta(months=1)
+
+
+def partition_key(symbol: str, year: int, month: int) -> str:
+    return f"symbol={symbol}/year={year}/month={month:02d}.parquet"
+
+
+def partition_keys(symbol: str, start_ts, end_ts) -> list[str]:
+    return [partition_key(symbol, d.year, d.month) for d in month_range(start_ts, end_ts)]
+
+
+def manifest_key(symbol: str) -> str:
+    return f"symbol={symbol}/_manifest.json"
+
+
+def key_symbol(key: str) -> str:
+    # symbol of any partition, rollup or trade key
+    return key.split("symbol=", 1)[1].split("/", 1)[0]
+
+
+def month_id(year: int, month: int) -> str:
+    return f"{year}-{month:02d}"
+
+
+def month_file_key(symbol: str, year: int, month: int, name: str) -> str:
+    return f"symbol={symbol}/year={year}/month={month:02d}/{name}"
+
+
+def load_manifest(path: str) -> dict | None:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def month_groups(manifest: dict | None, symbol: str, start_ts, end_ts) -> list[list[str]]:
+    """
+    Minute files per month in the window, ascending. Within a month the
+    files are in write order (base first, then deltas), so later files win
+    on duplicate timestamps. Without a manifest each month is its
+    single pre-manifest file.
+    """
+    months = (manifest or {}).get("months", {})
+    return [
+        months.get(month_id(d.year, d.month)) or [partition_key(symbol, d.year, d.month)]
+        for d in month_range(start_ts, end_ts)
+    ]
+
+
+def rollup_key(symbol: str, tier: str, year: int, month: int | None = None) -> str:
+    if tier in YEARLY:
+        return f"bar={tier}/symbol={symbol}/year={year}.parquet"
+    return f"bar={tier}/symbol={symbol}/year={year}/month={month:02d}.parquet"
+
+
+def rollup_keys(symbol: str, tier: str, start_ts, end_ts) -> list[str]:
+    if tier == "1m":
+        return partition_keys(symbol, start_ts, end_ts)
+    if tier in YEARLY:
+        return [rollup_key(symbol, tier, y) for y in range(start_ts.year, end_ts.year + 1)]
+    return [rollup_key(symbol, tier, d.year, d.month) for d in month_range(start_ts, end_ts)]
+
+
+def day_range(start, end):
+    cur = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    while cur <= end:
+        yield cur
+        cur += timedelta(days=1)
+
+
+def trade_key(symbol: str, day) -> str:
+    return f"trades/symbol={symbol}/date={day:%Y-%m-%d}.parquet"
+
+
+def trade_keys(symbol: str, start_ts, end_ts) -> list[str]:
+    return [trade_key(symbol, d) for d in day_range(start_ts, end_ts)]
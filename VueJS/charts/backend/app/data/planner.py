@@ -0,0 +1,277 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from datetime import datetime
+
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.data.aio import check
+from app.data.index import RangeFile, index_key, load_index
+
+
+UNIT_SCALE = {"s": 1, "ms": 10**3, "us": 10**6, "ns": 10**9}
+
+# windows needing more of a file than this fetch it whole (into the cache) instead of by range
+RANGED_FRACTION = 0.25
+
+# keys seen without an index sidecar, by time.monotonic(); not asked again for a cache TTL.
+# Least recently seen first, at most UNINDEXED_KEYS of them.
+UNINDEXED_KEYS = 4096
+_unindexed: OrderedDict[str, float] = OrderedDict()
+_unindexed_lock = threading.Lock()
+
+
+def _recently_unindexed(key: str, ttl: float) -> bool:
+    with _unindexed_lock:
+        seen = _unindexed.get(key)
+        if seen is None:
+            return False
+        if time.monotonic() - seen < ttl:
+            return True
+        del _unindexed[key]
+        return False
+
+
+def _mark_unindexed(key: str):
+    with _unindexed_lock:
+        _unindexed[key] = time.monotonic()
+        _unindexed.move_to_end(key)
+        while len(_unindexed) > UNINDEXED_KEYS:
+            _unindexed.popitem(last=False)
+
+
+def _to_int(ts: datetime, unit: str) -> int:
+    # exact integer conversion, float timestamps lose the ns digits
+    delta = ts - datetime(1970, 1, 1, tzinfo=ts.tzinfo)
+    micros = (delta.days * 86_400 + delta.seconds) * 10**6 + delta.microseconds
+    return micros * UNIT_SCALE[unit] // 10**6
+
+
+def _column_index(pf: pq.ParquetFile, name: str) -> int:
+    md = pf.metadata
+    for i in range(md.num_columns):
+        if md.row_group(0).column(i).path_in_schema == name:
+            return i
+    raise KeyError(name)
+
+
+def prune_row_groups(pf: pq.ParquetFile, start_ts, end_ts, time_col: str = "timestamp") -> list[tuple[int, int, int]]:
+    """
+    Row groups of `pf` whose [min, max] time range overlaps the window,
+    as (index, min, max) in the column's own integer unit.
+    """
+    md = pf.metadata
+    if md.num_row_groups == 0:
+        return []
+
+    unit = pf.schema_arrow.field(time_col).type.unit
+    lo, hi = _to_int(start_ts, unit), _to_int(end_ts, unit)
+    col = _column_index(pf, time_col)
+
+    keep = []
+    for i in range(md.num_row_groups):
+        stats = md.row_group(i).column(col).statistics
+        if stats is None or not stats.has_min_max:
+            keep.append((i, lo, hi))    # no stats, can't skip it
+        elif stats.max_raw >= lo and stats.min_raw <= hi:
+            keep.append((i, stats.min_raw, stats.max_raw))
+    return keep
+
+
+def read_ranged(cache, key: str, start_ts, end_ts, columns: list[str] | None = None) -> pa.Table | None:
+    """
+    Row groups of `key` overlapping [start_ts, end_ts], planned from its
+    index sidecar (app.data.index) and fetched with one ranged GET. None
+    when the object is better read whole: it is already in the local cache,
+    has no sidecar, the window needs more than RANGED_FRACTION of it, or it
+    was replaced since the sidecar was written (its ETag, or for sidecars
+    without one its size, changed).
+    """
+    if cache.has(key) or _recently_unindexed(key, cache.ttl):
+        return None
+
+    with cache.fetch([index_key(key)]) as paths:
+        if not paths:
+            _mark_unindexed(key)
+            return None
+        index = load_index(paths[0])
+
+    groups = index.select(_to_int(start_ts, index.unit), _to_int(end_ts, index.unit))
+    if not groups:
+        return index.metadata.schema.to_arrow_schema().empty_table()
+    start, end = index.span(groups)
+    if end - start > index.size * RANGED_FRACTION:
+        return None
+
+    got = cache.store.read_range(key, start, end, index.etag)
+    if got is None or got[1] != index.size:
+        return None
+    try:
+        pf = pq.ParquetFile(RangeFile(got[0], start, index.size), metadata=index.metadata)
+        return pf.read_row_groups(list(groups), columns=columns)
+    except (OSError, pa.ArrowException):
+        return None
+
+
+def _read_ranged_many(cache, keys: list[str], start_ts, end_ts, workers: int) -> dict[str, pa.Table]:
+    def read(key):
+        return read_ranged(cache, key, start_ts, end_ts)
+
+    if workers > 1 and len(keys) > 1:
+        with ThreadPoolExecutor(min(workers, len(keys))) as pool:
+            tables = dict(zip(keys, pool.map(read, keys)))
+    else:
+        tables = {key: read(key) for key in keys}
+    return {key: t for key, t in tables.items() if t is not None}
+
+
+def _batches(groups, descending: bool):
+    """
+    Split row groups into batches that can be read and returned one after
+    another. Groups are only separated when their time ranges don't overlap,
+    which is the case for files written in timestamp order.
+    """
+    groups = sorted(groups, key=lambda g: g[2] if descending else g[1], reverse=descending)
+    batches = []
+    for g in groups:
+        if batches:
+            prev = batches[-1]
+            if descending:
+                overlap = g[2] >= min(p[1] for p in prev)
+            else:
+                overlap = g[1] <= max(p[2] for p in prev)
+            if overlap:
+                prev.append(g)
+                continue
+        batches.append([g])
+    return [[g[0] for g in b] for b in batches]
+
+
+def dedupe(df: pl.DataFrame) -> pl.DataFrame:
+    # later files of a month (deltas) win over earlier ones on the same timestamp
+    return df.unique(subset=["timestamp"], keep="last", maintain_order=True)
+
+
+def iter_window(cache, groups: list[list[str]], start_ts, end_ts, descending: bool = True, cancel=None):
+    """
+    Yield frames of rows in [start_ts, end_ts], newest first when
+    `descending`. Each frame is sorted and frames don't overlap in time.
+
+    `groups` are the partitions in ascending time order, each a list of
+    objects (a month's base file and its deltas). Inside a file only the row
+    groups whose statistics overlap the window are decoded, and sorting is
+    local to what was read; single-file partitions that aren't cached are
+    read by range when the window is a small part of them. `cancel` (a
+    threading.Event) is checked between partitions and row-group batches.
+    """
+    window = (pl.col("timestamp") >= start_ts) & (pl.col("timestamp") <= end_ts)
+
+    for group in (reversed(groups) if descending else groups):
+        check(cancel)
+        if len(group) == 1:
+            table = read_ranged(cache, group[0], start_ts, end_ts)
+            if table is not None:
+                part = pl.from_arrow(table).filter(window).sort("timestamp", descending=descending)
+                if part.height:
+                    yield part
+                continue
+
+        with cache.fetch(group) as paths:
+            if len(paths) == 1:
+                pf = pq.ParquetFile(paths[0])
+                for batch in _batches(prune_row_groups(pf, start_ts, end_ts), descending):
+                    check(cancel)
+                    part = (
+                        pl.from_arrow(pf.read_row_groups(batch))
+                        .filter(window)
+                        .sort("timestamp", descending=descending)
+                    )
+                    if part.height:
+                        yield part
+                continue
+
+            frames = []
+            for path in paths:
+                pf = pq.ParquetFile(path)
+                keep = [g[0] for g in prune_row_groups(pf, start_ts, end_ts)]
+                if keep:
+                    frames.append(pl.from_arrow(pf.read_row_groups(keep)))
+            if frames:
+                part = (
+                    dedupe(pl.concat(frames, how="vertical_relaxed"))
+                    .filter(window)
+                    .sort("timestamp", descending=descending)
+                )
+                if part.height:
+                    yield part
+
+
+def read_window(
+    cache,
+    groups: list[list[str]],
+    start_ts,
+    end_ts,
+    limit: int | None = None,
+    descending: bool = True,
+    schema: dict | None = None,
+    cancel=None,
+) -> pl.DataFrame:
+    """
+    "Latest N" / "first N" rows of the window. Partitions are already time
+    ordered, so this walks them from one end and stops reading as soon as
+    `limit` rows are collected instead of sorting the whole range.
+    """
+    frames, n = [], 0
+    with closing(iter_window(cache, groups, start_ts, end_ts, descending, cancel)) as parts:
+        for part in parts:
+            frames.append(part)
+            n += part.height
+            if limit is not None and n >= limit:
+                break
+
+    if not frames:
+        return pl.DataFrame(schema=schema)
+
+    df = pl.concat(frames, how="vertical_relaxed")
+    return df.head(limit) if limit is not None else df
+
+
+@contextmanager
+def lazy_window(
+    cache, groups: list[list[str]], start_ts, end_ts, by: list[str] = (), workers: int = 1, cancel=None, found: set | None = None,
+):
+    """
+    Yield the rows in [start_ts, end_ts] of `groups` as one LazyFrame (None
+    if no object exists), for plans that run on Polars' streaming engine or
+    span many symbols. Objects are fetched up front, `workers` at a time,
+    and stay leased until the block exits. Single-file partitions are
+    scanned lazily, with row groups skipped by their statistics; months
+    that still have deltas are merged eagerly (one month) and deduplicated
+    on (*by, timestamp) like `dedupe`. Single-file partitions that aren't
+    cached are read by range when the window is a small part of them. Unsorted.
+    `found`, if given, collects the keys that exist.
+    """
+    window = (pl.col("timestamp") >= start_ts) & (pl.col("timestamp") <= end_ts)
+
+    ranged = _read_ranged_many(cache, [group[0] for group in groups if len(group) == 1], start_ts, end_ts, workers)
+    with cache.fetch_many([k for group in groups for k in group if k not in ranged], workers) as paths:
+        if found is not None:
+            found.update(ranged, paths)
+        scans = []
+        for group in groups:
+            check(cancel)
+            if group[0] in ranged:
+                scans.append(pl.from_arrow(ranged[group[0]]).lazy().filter(window))
+                continue
+            files = [paths[k] for k in group if k in paths]
+            if len(files) == 1:
+                scans.append(pl.scan_parquet(files[0]).filter(window))
+            elif files:
+                merged = pl.concat([pl.read_parquet(p) for p in files], how="vertical_relaxed")
+                merged = merged.unique(subset=[*by, "timestamp"], keep="last", maintain_order=True)
+                scans.append(merged.lazy().filter(window))
+        yield pl.concat(scans, how="vertical_relaxed") if scans else None
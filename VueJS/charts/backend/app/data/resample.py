@@ -1,56 +1,108 @@
+import numpy as np
 import polars as pl
 
+from app.data.bars import UNIT_NS, aggregate_runs, check_bar_size, information_bars, ohlcv_aggs, parse_bar_size
+from app.data.calendar import session_bounds, sessions
 
-def resample_bars(bars: pl.DataFrame, timeframe: str) -> pl.DataFrame:
 
-    # ✅ 1m = already bars → just rename for consistency
-    if timeframe == "1m":
-        if "bar" not in bars.columns:
-            bars = bars.with_columns(
-                pl.col("timestamp").alias("bar")
-            )
-        return bars.sort("bar")
-
-    # intraday
-    if timeframe in {"5m", "15m", "1h"}:
-        df = bars.with_columns(
-            pl.col("timestamp").dt.truncate(timeframe).alias("bar")
-        )
-
-    elif timeframe == "1d":
-        df = bars.with_columns(
-            pl.col("timestamp").dt.date().alias("bar")
-        )
-
-    elif timeframe == "1w":
-        df = bars.with_columns(
-            pl.col("timestamp").dt.truncate("1w").alias("bar")
-        )
-
-    elif timeframe == "1mo":
-        df = bars.with_columns(
-            pl.col("timestamp")
-            .dt.strftime("%Y-%m-01")
-            .str.strptime(pl.Date)
-            .alias("bar")
-        )
+def duration_ns(bar_size: str) -> int:
+    # fixed-length bar sizes: "500ms", "10s", "1m", "4h", "1d"
+    spec = parse_bar_size(bar_size)
+    if spec.kind != "time" or spec.unit not in UNIT_NS:
+        raise ValueError(f"Invalid bar size: {bar_size}")
+    return spec.step_ns
+
+
+# the stored resolutions (minute partitions and rollups)
+DAILY = ("1d", "1w", "1mo")
 
-    else:
-        raise ValueError(f"Invalid timeframe: {timeframe}")
 
+def label_sessions(bars, session: str):
+    """
+    Keep the bars (by start time) inside `session` ("rth" | "extended") of a
+    trading day and add that day as `day`. Holidays and weekends drop out.
+    Each timestamp is binary-searched into the (sorted) session opens, so
+    this is neither a hash join nor a per-row time zone conversion.
+    """
+    opens, closes = session_bounds(session)
+    cal = sessions()
+
+    if isinstance(bars, pl.DataFrame):
+        ts = bars["timestamp"].dt.epoch("ns").to_numpy()
+        i = np.searchsorted(cal[opens].dt.epoch("ns").to_numpy(), ts, side="right") - 1
+        keep = (i >= 0) & (ts < cal[closes].dt.epoch("ns").to_numpy()[np.maximum(i, 0)])
+        return bars.filter(keep).with_columns(cal["day"].gather(i[keep]).alias("day"))
+
+    ts = pl.col("timestamp")
+    i = pl.col("_session")
     return (
-        df.group_by("bar")
-        .agg([
-            pl.col("open").first().alias("open"),
-            pl.col("high").max().alias("high"),
-            pl.col("low").min().alias("low"),
-            pl.col("close").last().alias("close"),
-            pl.col("volume").sum().alias("volume"),
-            pl.col("trade_count").sum().alias("trade_count"),
-            (
-                (pl.col("vwap") * pl.col("volume")).sum()
-                / pl.col("volume").sum()
-            ).alias("vwap"),
-        ])
-        .sort("bar")
+        bars.with_columns((pl.lit(cal[opens]).search_sorted(ts, side="right").cast(pl.Int64) - 1).alias("_session"))
+        .filter(i >= 0)
+        .filter(ts < pl.lit(cal[closes]).gather(i))
+        .with_columns(pl.lit(cal["day"]).gather(i).alias("day"))
+        .drop("_session")
     )
+
+
+def resample_bars(
+    bars: pl.DataFrame | pl.LazyFrame,
+    timeframe: str,
+    by: list[str] = (),
+    session: str | None = None,
+    source: str = "1m",
+) -> pl.DataFrame | pl.LazyFrame:
+    """
+    OHLCV bars of `timeframe` (any bar size of app.data.bars built from
+    minutes: 30m, 4h, 2w, volume:50000, ...) from `bars` sorted by
+    (*by, timestamp).
+
+    Sorted input makes every output bar a run of consecutive rows, so a
+    DataFrame is aggregated in one pass over the runs (`aggregate_runs`):
+    open/close are the first/last row of the run, whatever the thread
+    count, and nothing is hashed or re-sorted. A LazyFrame in gives a
+    LazyFrame out (group_by_dynamic, for the streaming engine).
+
+    - intraday: fixed windows on the UTC epoch; `session` keeps only the
+      regular ("rth") or extended hours of trading days.
+    - 1d / Nw / Nmo: built from exchange sessions (America/New_York days,
+      holidays removed), regular hours unless session="extended". Weeks
+      start on Monday, months on the 1st, labelled by date.
+    - volume / dollar / tick: information bars over the (session-filtered)
+      rows, see app.data.bars.
+
+    `source` is the resolution of `bars`. Daily sources (the 1d/1w/1mo
+    rollups, stamped at midnight UTC of their session day) are already
+    sessions and are only bucketed by date.
+    `by`: extra group keys (e.g. ["symbol"]) to resample many series in one pass.
+    """
+    by = list(by)
+    spec = check_bar_size(timeframe)
+
+    if spec.kind != "time":
+        return information_bars(label_sessions(bars, session).drop("day") if session else bars, spec, by)
+
+    if source in DAILY:
+        df = bars.with_columns(pl.col("timestamp").dt.date().alias("bar"))
+    elif spec.daily:
+        df = label_sessions(bars, session or "rth").rename({"day": "bar"})
+    else:
+        df = label_sessions(bars, session).drop("day") if session else bars
+        df = df.with_columns(pl.col("timestamp").alias("bar"))
+
+    # ✅ 1m = already bars → just rename for consistency
+    if timeframe == "1m":
+        return df
+
+    if isinstance(df, pl.DataFrame):
+        return aggregate_runs(df.with_columns(pl.col("bar").dt.truncate(spec.every)), by)
+
+    out = df.group_by_dynamic(
+        "bar",
+        every=spec.every,
+        closed="left",
+        label="left",
+        start_by="window",
+        group_by=by or None,
+    ).agg(ohlcv_aggs())
+    # windows come out in time order within each group, groups in any order
+    return out.sort([*by, "bar"]) if by else out
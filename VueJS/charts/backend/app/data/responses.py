@@ -0,0 +1,141 @@
+"""
+Cache of serialized market responses.
+
+Entries are keyed on the normalized query (plus the response format) and
+hold the encoded body, so a repeated chart load skips the read, resample
+and encode. Windows that end before the current UTC month only cover
+finished history and stay until evicted (least recently used first, by
+size); windows touching the current month expire after `ttl` seconds.
+Every entry carries an ETag of its body for If-None-Match / 304.
+
+Responses long enough to be streamed (over BATCH_ROWS rows, see
+app.data.serialize) are neither cached nor tagged: the tag would need the
+whole body in memory before the first byte goes out, which is what
+streaming avoids.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+import orjson
+
+from app.config import load_settings
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    media_type: str
+    etag: str
+    expires: float | None
+    headers: dict[str, str] = field(default_factory=dict)
+
+
+def _utc(ts: datetime) -> datetime:
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+
+
+def query_key(query: dict, fmt: str) -> str:
+    """Stable key of a query dict: times in UTC, keys sorted, format included."""
+    norm = {k: _utc(v) if isinstance(v, datetime) else v for k, v in query.items()}
+    norm["format"] = fmt
+    return hashlib.sha1(orjson.dumps(norm, option=orjson.OPT_SORT_KEYS | orjson.OPT_UTC_Z)).hexdigest()
+
+
+def body_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(etag: str, if_none_match: str | None) -> bool:
+    # If-None-Match: "a", W/"b"  or  *
+    if not if_none_match:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int, ttl: float = 30.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl          # seconds, for windows that reach into the current month
+        self.max_entry = max_bytes // 8
+
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def lifetime(self, end_ts: datetime) -> float | None:
+        # None = finished history, kept until evicted
+        now = datetime.now(timezone.utc)
+        month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        return None if _utc(end_ts) < month else self.ttl
+
+    def get(self, key: str) -> CachedResponse | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires is not None and entry.expires < time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, body: bytes, media_type: str, end_ts: datetime, headers: dict | None = None) -> CachedResponse:
+        """Store `body` (if it isn't too big to be worth it) and return its entry."""
+        life = self.lifetime(end_ts)
+        entry = CachedResponse(
+            body=body,
+            media_type=media_type,
+            etag=body_etag(body),
+            expires=None if life is None else time.monotonic() + life,
+            headers=dict(headers or {}),
+        )
+        if len(body) > self.max_entry:
+            return entry
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _drop(self, key: str):
+        self._bytes -= len(self._entries.pop(key).body)
+
+
+_responses: ResponseCache | None = None
+_lock = threading.Lock()
+
+
+def get_responses() -> ResponseCache:
+    global _responses
+    with _lock:
+        if _responses is None:
+            settings = load_settings()
+            _responses = ResponseCache(settings.response_cache_bytes, settings.response_cache_ttl)
+        return _responses
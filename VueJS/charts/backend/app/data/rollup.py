@@ -0,0 +1,251 @@
+"""
+Materialized bar rollups, written next to the minute partitions (layout in
+app.data.partitions). Rollup files have the same columns as the minute
+files, with `timestamp` being the start of the bucket, so the loader reads
+them the same way.
+
+    python -m app.data.rollup --root ../alpaca/data --symbol SPY
+"""
+import argparse
+import functools
+import glob
+import os
+from datetime import datetime, timedelta, timezone
+
+from dateutil.relativedelta import relativedelta
+import polars as pl
+
+from app.data.bars import parse_bar_size
+from app.data.partitions import YEARLY, load_manifest, manifest_key, month_groups, rollup_key, rollup_keys
+from app.data.planner import dedupe
+from app.data.calendar import TZ, local_day, sessions
+from app.data.index import write_partition
+from app.data.resample import DAILY, duration_ns, resample_bars
+
+
+ROLLUPS = ["5m", "15m", "1h", "1d", "1w", "1mo"]
+
+# each tier is built from the previous (finer) one instead of from minutes;
+# days come from 15m bars because the 09:30 open splits an hour
+SOURCE = {"5m": "1m", "15m": "5m", "1h": "15m", "1d": "15m", "1w": "1d", "1mo": "1d"}
+
+
+def rollup_tier(bar_size: str, session: str | None = None) -> str:
+    """
+    Coarsest stored resolution that can produce `bar_size` for `session`:
+    the largest intraday tier that evenly divides it (30m from 15m, 4h
+    from 1h). The 1d/1w/1mo rollups hold regular-hours sessions;
+    extended-hours days and session-filtered hours are rebuilt from 15m
+    bars. Information bars (volume/dollar/tick) always read minutes.
+    """
+    spec = parse_bar_size(bar_size)
+    if spec.kind != "time":
+        return "1m"
+    if spec.daily:
+        return "15m" if session == "extended" else {"d": "1d", "w": "1w", "mo": "1mo"}[spec.unit]
+    for tier in ("1h", "15m", "5m"):
+        # hour bars start at :00, not at the 09:30 open
+        if spec.step_ns % duration_ns(tier) == 0 and not (session and tier == "1h"):
+            return tier
+    return "1m"
+
+
+def floor_ts(ts, tier: str):
+    # start of the `tier` bucket containing ts (daily tiers: midnight UTC of the session day)
+    if tier == "1m":
+        return ts
+    s = pl.Series([ts])
+    if tier in DAILY:
+        s = s.dt.convert_time_zone(TZ).dt.date().cast(pl.Datetime("ns")).dt.replace_time_zone("UTC")
+    return s.dt.truncate(tier)[0]
+
+
+MINUTE = timedelta(minutes=1)
+
+
+@functools.lru_cache(maxsize=None)
+def _daily_buckets(tier: str) -> pl.DataFrame:
+    # regular-hours span of every 1d / 1w / 1mo bucket: first open, last close
+    return (
+        sessions()
+        .group_by(pl.col("day").dt.truncate(tier).alias("bucket"), maintain_order=True)
+        .agg(pl.col("rth_open").min().alias("open"), pl.col("rth_close").max().alias("close"))
+    )
+
+
+def full_buckets(tier: str, start_ts, end_ts) -> tuple[datetime, datetime, datetime, datetime] | None:
+    """
+    The `tier` buckets whose minutes all lie in [start_ts, end_ts], as
+    (first, last, lo, hi): the first and last bucket stamps, and the time
+    their minutes start / stop (exclusive). Stored rows of other buckets
+    hold minutes outside the window; those are rebuilt from the tier below.
+    None if no bucket fits.
+    """
+    if tier in DAILY:
+        full = _daily_buckets(tier).filter((pl.col("open") >= start_ts) & (pl.col("close") - MINUTE <= end_ts))
+        if full.is_empty():
+            return None
+        first, last = (datetime(d.year, d.month, d.day, tzinfo=timezone.utc) for d in (full["bucket"][0], full["bucket"][-1]))
+        return first, last, full["open"][0], full["close"][-1]
+
+    step = timedelta(microseconds=duration_ns(tier) // 1000)
+    epoch = datetime(1970, 1, 1, tzinfo=start_ts.tzinfo)
+    first = epoch - (epoch - start_ts) // step * step                  # ceil
+    last = epoch + (end_ts + MINUTE - step - epoch) // step * step     # floor
+    if last < first:
+        return None
+    return first, last, first, last + step
+
+
+def to_rollup(bars: pl.DataFrame, symbol: str) -> pl.DataFrame:
+    # resample_bars output -> minute-file layout
+    ts = pl.col("bar")
+    if bars.schema["bar"] == pl.Date:
+        ts = ts.cast(pl.Datetime("ns")).dt.replace_time_zone("UTC")
+    else:
+        ts = ts.dt.cast_time_unit("ns")
+
+    return bars.select(
+        pl.lit(symbol).alias("symbol"),
+        ts.alias("timestamp"),
+        "open", "high", "low", "close", "volume",
+        pl.col("trade_count").cast(pl.Float64),
+        "vwap",
+    )
+
+
+def build_rollups(minutes: pl.DataFrame, symbol: str) -> dict[str, pl.DataFrame]:
+    tiers = {"1m": minutes.sort("timestamp")}
+    for tier in ROLLUPS:
+        tiers[tier] = to_rollup(resample_bars(tiers[SOURCE[tier]], tier, source=SOURCE[tier]), symbol)
+    del tiers["1m"]
+    return tiers
+
+
+def _with_partition(df: pl.DataFrame) -> pl.DataFrame:
+    return df.with_columns(
+        pl.col("timestamp").dt.year().alias("_year"),
+        pl.col("timestamp").dt.month().alias("_month"),
+    )
+
+
+def write_rollup(root: str, symbol: str, tier: str, df: pl.DataFrame, buckets: pl.Series | None = None) -> list[str]:
+    """
+    Write rollup bars into their partition files. Without `buckets` the
+    files are replaced; with `buckets` (bucket starts that were recomputed)
+    only those rows are swapped out of the existing files.
+    """
+    by = ["_year"] if tier in YEARLY else ["_year", "_month"]
+    parts = {
+        key: part.drop("_year", "_month")
+        for key, part in _with_partition(df).partition_by(by, as_dict=True).items()
+    }
+    if buckets is not None:
+        buckets = buckets.alias("timestamp").to_frame()
+        for key in _with_partition(buckets).select(by).unique().rows():
+            parts.setdefault(key, df.clear())
+
+    written = []
+    for key, part in parts.items():
+        key = rollup_key(symbol, tier, *key)
+        path = os.path.join(root, key)
+        if buckets is not None and os.path.exists(path):
+            old = pl.read_parquet(path).join(buckets, on="timestamp", how="anti")
+            part = pl.concat([old, part], how="vertical_relaxed")
+        written.append(write_partition(part, root, key))
+    return written
+
+
+def read_local(root: str, symbol: str, tier: str, lo, hi) -> pl.DataFrame | None:
+    # rows of a local tier (1m or rollup) with lo <= timestamp < hi
+    if tier == "1m":
+        manifest = load_manifest(os.path.join(root, manifest_key(symbol)))
+        groups = month_groups(manifest, symbol, lo, hi)
+    else:
+        groups = [[k] for k in rollup_keys(symbol, tier, lo, hi)]
+
+    frames = []
+    for group in groups:
+        paths = [os.path.join(root, k) for k in group if os.path.exists(os.path.join(root, k))]
+        if paths:
+            frames.append(dedupe(pl.concat([pl.read_parquet(p) for p in paths], how="vertical_relaxed")))
+    if not frames:
+        return None
+
+    return (
+        pl.concat(frames, how="vertical_relaxed")
+        .filter((pl.col("timestamp") >= lo) & (pl.col("timestamp") < hi))
+    )
+
+
+def update_rollups(root: str, symbol: str, timestamps: pl.Series) -> dict[str, int]:
+    """
+    Bring the rollups up to date after minute bars at `timestamps` were
+    written. Per tier only the buckets containing those minutes are
+    recomputed (from the tier below, already updated) and merged into the
+    partition files they live in; the rest of the history isn't read.
+    Returns the number of buckets recomputed per tier.
+    """
+    if timestamps.is_empty():
+        return {}
+
+    timestamps = timestamps.dt.cast_time_unit("ns")
+    # session days of the minutes, as stored in the daily tiers (midnight UTC)
+    days = (
+        timestamps.to_frame("timestamp")
+        .select(local_day(pl.col("timestamp")).cast(pl.Datetime("ns")).dt.replace_time_zone("UTC"))
+        .to_series()
+    )
+
+    touched = {}
+    for tier in ROLLUPS:
+        if tier == "1d":
+            buckets = days.unique().sort()
+            # whole local days; the resampler keeps their sessions only
+            local = buckets.dt.replace_time_zone(None).dt.replace_time_zone(TZ)
+            lo = local.dt.convert_time_zone("UTC")[0]
+            hi = local.dt.offset_by("1d").dt.convert_time_zone("UTC")[-1]
+        else:
+            buckets = (days if tier in DAILY else timestamps).dt.truncate(tier).unique().sort()
+            lo, hi = buckets[0], buckets.dt.offset_by(tier)[-1]
+
+        src = read_local(root, symbol, SOURCE[tier], lo, hi)
+        if src is None:
+            continue
+
+        fresh = to_rollup(resample_bars(src.sort("timestamp"), tier, source=SOURCE[tier]), symbol)
+        fresh = fresh.filter(pl.col("timestamp").is_in(buckets.implode()))
+        write_rollup(root, symbol, tier, fresh, buckets=buckets)
+        touched[tier] = buckets.len()
+    return touched
+
+
+def run(root: str, symbol: str):
+    manifest = load_manifest(os.path.join(root, manifest_key(symbol)))
+    if manifest is not None:
+        months = sorted(manifest["months"])
+    else:
+        months = sorted(
+            p.split("year=")[1][:4] + "-" + p.split("month=")[1][:2]
+            for p in glob.glob(os.path.join(root, f"symbol={symbol}", "year=*", "month=*.parquet"))
+        )
+    if not months:
+        print(f"No minute partitions for {symbol} under {root}")
+        return
+
+    lo = datetime(int(months[0][:4]), int(months[0][5:]), 1, tzinfo=timezone.utc)
+    hi = datetime(int(months[-1][:4]), int(months[-1][5:]), 1, tzinfo=timezone.utc) + relativedelta(months=1)
+    minutes = read_local(root, symbol, "1m", lo, hi)
+    for tier, df in build_rollups(minutes, symbol).items():
+        written = write_rollup(root, symbol, tier, df)
+        print(f"{tier:>4}: {df.height} bars → {len(written)} files")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build bar rollups from minute partitions")
+    parser.add_argument("--root", default="../alpaca/data")
+    parser.add_argument("--symbol", action="append", required=True)
+    args = parser.parse_args()
+
+    for sym in args.symbol:
+        run(args.root, sym)
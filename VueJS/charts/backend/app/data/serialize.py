@@ -0,0 +1,160 @@
+import io
+import struct
+from datetime import datetime, timezone
+
+import numpy as np
+import orjson
+import polars as pl
+import pyarrow as pa
+
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+PACKED = "application/x-ohlcv-packed"
+
+MEDIA_TYPES = {
+    "rows": "application/json",
+    "columns": "application/json",
+    "arrow": ARROW_STREAM,
+    "packed": PACKED,
+}
+
+# one bar = 64 bytes, little-endian, same field order as to_columns()
+PACKED_DTYPE = np.dtype([
+    ("timestamp", "<i8"),
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<f8"),
+    ("trade_count", "<i8"),
+    ("vwap", "<f8"),
+])
+PACKED_ROW = struct.Struct("<q5dqd")
+
+# responses above this many rows are sent in chunks of it (iter_* below)
+BATCH_ROWS = 65_536
+
+
+def negotiate(fmt: str | None, accept: str | None, default: str = "rows") -> str:
+    # explicit format (query/body) wins over the Accept header
+    if fmt:
+        if fmt not in MEDIA_TYPES:
+            raise ValueError(f"Invalid format: {fmt}")
+        return fmt
+    for part in (accept or "").split(","):
+        media = part.split(";")[0].strip()
+        if media == ARROW_STREAM:
+            return "arrow"
+        if media in (PACKED, "application/octet-stream"):
+            return "packed"
+    return default
+
+
+def to_columns(df: pl.DataFrame, time_col: str, extra: list[str] = ()) -> pl.DataFrame:
+    # response column order/dtypes: epoch-ms timestamps, integer trade counts, then indicators
+    return df.select(
+        pl.col(time_col).dt.epoch("ms").alias("timestamp"),
+        "open", "high", "low", "close", "volume",
+        pl.col("trade_count").fill_null(0).cast(pl.Int64),
+        "vwap",
+        *extra,
+    )
+
+
+def columns_json(meta: dict, df: pl.DataFrame, time_col: str, extra: list[str] = ()) -> bytes:
+    """
+    {...meta, "count": n, "columns": {"timestamp": [...], "open": [...], ...}}
+
+    Columns go to orjson as numpy buffers, so no Python object is created
+    per bar. Timestamps are epoch milliseconds; indicator warm-up values
+    are null.
+    """
+    cols = to_columns(df, time_col, extra)
+    return orjson.dumps(
+        {
+            **meta,
+            "count": cols.height,
+            "columns": {c: cols[c].to_numpy() for c in cols.columns},
+        },
+        option=orjson.OPT_SERIALIZE_NUMPY,
+    )
+
+
+def columns_json_multi(meta: dict, df: pl.DataFrame, time_col: str, symbols: list[str]) -> bytes:
+    """
+    {...meta, "count": n, "symbols": {"SPY": {"count": n, "columns": {...}}, ...}}
+
+    One columnar block per requested symbol (empty if it had no data), cut
+    out of a frame with a symbol column sorted by symbol.
+    """
+    cols = to_columns(df, time_col, ["symbol"])
+    parts = cols.partition_by("symbol", as_dict=True, include_key=False, maintain_order=True)
+    empty = cols.drop("symbol").clear()
+    out = {}
+    for symbol in symbols:
+        part = parts.get((symbol,), empty)
+        out[symbol] = {"count": part.height, "columns": {c: part[c].to_numpy() for c in part.columns}}
+    return orjson.dumps(
+        {**meta, "count": cols.height, "symbols": out},
+        option=orjson.OPT_SERIALIZE_NUMPY,
+    )
+
+
+def arrow_ipc(df: pl.DataFrame, time_col: str, extra: list[str] = ()) -> bytes:
+    # Arrow IPC stream (schema + record batches), readable by apache-arrow in the browser
+    buf = io.BytesIO()
+    to_columns(df, time_col, extra).write_ipc_stream(buf, compression="uncompressed")
+    return buf.getvalue()
+
+
+def packed(df: pl.DataFrame, time_col: str) -> bytes:
+    # fixed 64-byte layout: indicator columns are not part of it
+    cols = to_columns(df, time_col)
+    out = np.empty(cols.height, dtype=PACKED_DTYPE)
+    for c in cols.columns:
+        out[c] = cols[c].to_numpy()
+    return out.tobytes()
+
+
+# chunked versions of the encoders: same bytes, produced BATCH_ROWS at a time,
+# so a long response never holds a second full copy of itself
+
+
+def iter_columns_json(meta: dict, df: pl.DataFrame, time_col: str, extra: list[str] = (), batch_rows: int = BATCH_ROWS):
+    cols = to_columns(df, time_col, extra)
+    yield orjson.dumps({**meta, "count": cols.height})[:-1] + b',"columns":{'
+    for i, c in enumerate(cols.columns):
+        yield (b"," if i else b"") + orjson.dumps(c) + b":["
+        for j, offset in enumerate(range(0, cols.height, batch_rows)):
+            chunk = orjson.dumps(cols[c].slice(offset, batch_rows).to_numpy(), option=orjson.OPT_SERIALIZE_NUMPY)
+            yield (b"," if j else b"") + chunk[1:-1]
+        yield b"]"
+    yield b"}}"
+
+
+def iter_arrow_ipc(df: pl.DataFrame, time_col: str, extra: list[str] = (), batch_rows: int = BATCH_ROWS):
+    cols = to_columns(df, time_col, extra)
+    buf = io.BytesIO()
+    writer = pa.ipc.new_stream(buf, cols.head(0).to_arrow().schema)
+    for part in cols.iter_slices(batch_rows):
+        writer.write_table(part.to_arrow())
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    writer.close()
+    yield buf.getvalue()
+
+
+def iter_packed(df: pl.DataFrame, time_col: str, batch_rows: int = BATCH_ROWS):
+    for part in df.iter_slices(batch_rows):
+        yield packed(part, time_col)
+
+
+def pack_row(row: dict, time_col: str) -> bytes:
+    ts = row[time_col]
+    if not isinstance(ts, datetime):    # date bars (1d/1mo)
+        ts = datetime(ts.year, ts.month, ts.day, tzinfo=timezone.utc)
+    return PACKED_ROW.pack(
+        int(ts.timestamp() * 1000), row["open"], row["high"], row["low"], row["close"], row["volume"],
+        int(row["trade_count"] or 0), row["vwap"],
+    )
@@ -0,0 +1,97 @@
+import threading
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from app.config import Settings, load_settings
+from app.data.cache import PartitionCache
+
+
+class ObjectStore:
+    """
+    The bucket behind the charts backend. One boto3 client for the whole
+    process: it is thread-safe and keeps a pool of keep-alive connections,
+    so concurrent requests reuse connections instead of handshaking again.
+    """
+
+    def __init__(self, settings: Settings):
+        self.bucket = settings.s3_bucket
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.s3_endpoint_url,
+            aws_access_key_id=settings.s3_access_key,
+            aws_secret_access_key=settings.s3_secret_key,
+            region_name=settings.s3_region,
+            config=Config(
+                max_pool_connections=settings.s3_max_connections,
+                tcp_keepalive=True,
+                retries={"max_attempts": 3, "mode": "standard"},
+            ),
+        )
+
+    def head(self, key: str) -> tuple[str, int] | None:
+        """(ETag, size) of the object, None if it doesn't exist."""
+        try:
+            resp = self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return resp["ETag"].strip('"'), resp["ContentLength"]
+
+    def read_range(self, key: str, start: int, end: int, etag: str | None = None) -> tuple[bytes, int] | None:
+        """
+        Bytes [start, end) of the object and its total size; None if it
+        doesn't exist, or no longer has the ETag `etag` when one is given.
+        """
+        kwargs = {"IfMatch": f'"{etag}"'} if etag else {}
+        try:
+            resp = self.client.get_object(Bucket=self.bucket, Key=key, Range=f"bytes={start}-{end - 1}", **kwargs)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound", "InvalidRange", "412", "PreconditionFailed"):
+                return None
+            raise
+        with resp["Body"] as body:
+            data = body.read()
+        return data, int(resp["ContentRange"].rpartition("/")[2])
+
+    def download(self, key: str, path: str):
+        self.client.download_file(self.bucket, key, path)
+
+    def close(self):
+        self.client.close()
+
+
+_lock = threading.Lock()
+_store: ObjectStore | None = None
+_cache: PartitionCache | None = None
+
+
+def open_store(settings: Settings | None = None) -> ObjectStore:
+    """Create the shared store and partition cache (at app startup; later calls reuse them)."""
+    global _store, _cache
+    with _lock:
+        if _store is None:
+            settings = settings or load_settings()
+            _store = ObjectStore(settings)
+            _cache = PartitionCache(_store, settings.cache_dir, settings.cache_bytes, settings.cache_ttl)
+        return _store
+
+
+def close_store():
+    global _store, _cache
+    with _lock:
+        if _store is not None:
+            _store.close()
+        _store = _cache = None
+
+
+def get_store() -> ObjectStore:
+    return _store or open_store()
+
+
+def get_cache() -> PartitionCache:
+    if _cache is None:
+        open_store()
+    return _cache
@@ -0,0 +1,195 @@
+"""
+Trade ticks: one parquet file per symbol and UTC day (layout in
+app.data.partitions), sorted by timestamp, with compact columns:
+
+    timestamp   Datetime(ns, UTC)   int64 epoch ns on disk
+    price       Int64               price * PRICE_SCALE
+    size        UInt32              shares
+    exchange    Categorical         dictionary-encoded
+    conditions  Categorical         condition codes joined by spaces
+    tape        Categorical
+    id          Int64               exchange trade id
+
+Bars are built from trades batch by batch: only one record batch (and the
+still-open bar) is in memory at a time, never a whole day.
+"""
+import numpy as np
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.data.aio import check
+from app.data.bars import parse_bar_size
+from app.data.calendar import session_spans
+from app.data.partitions import trade_keys
+from app.data.planner import _to_int, prune_row_groups, read_ranged
+from app.data.resample import duration_ns
+
+
+PRICE_SCALE = 10_000
+
+TRADE_SCHEMA = {
+    "timestamp": pl.Datetime("ns", "UTC"),
+    "price": pl.Int64,
+    "size": pl.UInt32,
+    "exchange": pl.Categorical,
+    "conditions": pl.Categorical,
+    "tape": pl.Categorical,
+    "id": pl.Int64,
+}
+
+
+def to_trade_frame(df: pl.DataFrame) -> pl.DataFrame:
+    """Alpaca trades (symbol, timestamp, exchange, price, size, id, conditions, tape) -> TRADE_SCHEMA."""
+    conditions = pl.col("conditions")
+    if df.schema.get("conditions") == pl.List(pl.String):
+        conditions = conditions.list.sort().list.join(" ")
+    return (
+        df.select(
+            pl.col("timestamp").dt.cast_time_unit("ns").dt.convert_time_zone("UTC"),
+            (pl.col("price") * PRICE_SCALE).round().cast(pl.Int64).alias("price"),
+            pl.col("size").round().cast(pl.UInt32),
+            pl.col("exchange").cast(pl.String).cast(pl.Categorical),
+            conditions.cast(pl.String).fill_null("").cast(pl.Categorical).alias("conditions"),
+            pl.col("tape").cast(pl.String).cast(pl.Categorical),
+            pl.col("id").cast(pl.Int64),
+        )
+        .sort("timestamp")
+    )
+
+
+def iter_trade_batches(cache, symbol: str, start_ts, end_ts, batch_size: int = 65_536, cancel=None):
+    """Yield (timestamp ns, scaled price, size) numpy arrays, ascending, inside [start_ts, end_ts]."""
+    lo, hi = _to_int(start_ts, "ns"), _to_int(end_ts, "ns")
+    columns = ["timestamp", "price", "size"]
+
+    def arrays(batches):
+        for batch in batches:
+            check(cancel)
+            ts = batch.column(0).cast(pa.int64()).to_numpy()
+            keep = (ts >= lo) & (ts <= hi)
+            if not keep.any():
+                continue
+            yield ts[keep], batch.column(1).to_numpy()[keep], batch.column(2).to_numpy()[keep].astype(np.float64)
+
+    for key in trade_keys(symbol, start_ts, end_ts):
+        # part of a day: only its row groups, by range
+        table = read_ranged(cache, key, start_ts, end_ts, columns=columns)
+        if table is not None:
+            yield from arrays(table.to_batches(max_chunksize=batch_size))
+            continue
+
+        with cache.fetch([key]) as paths:
+            if not paths:
+                continue
+            pf = pq.ParquetFile(paths[0])
+            groups = [g[0] for g in prune_row_groups(pf, start_ts, end_ts)]
+            if not groups:
+                continue
+            yield from arrays(pf.iter_batches(batch_size=batch_size, row_groups=groups, columns=columns))
+
+
+class BarAccumulator:
+    """
+    Bars from time-sorted trade batches, fixed-length or information bars
+    (app.data.bars). Each batch is aggregated with reduceat; its last bar
+    stays open and is merged with the start of the next batch.
+
+    `session` ("rth" | "extended") keeps only the trades inside it. Daily,
+    weekly and monthly bars are built from exchange sessions like the
+    stored ones (regular hours unless session="extended"), labelled by date.
+    """
+
+    def __init__(self, bar_size: str, session: str | None = None):
+        self.spec = parse_bar_size(bar_size)
+        if self.spec.daily:
+            session = session or "rth"
+        self.spans = session_spans(session, self.spec.every if self.spec.daily else "1d") if session else None
+        self.step = duration_ns(bar_size) if self.spec.kind == "time" and not self.spec.daily else None
+        self.total = 0.0        # information bars: measure traded before the current batch
+        self.done: list[dict[str, np.ndarray]] = []
+        self.open_bar: dict[str, np.ndarray] | None = None
+
+    def _sessions(self, ts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # which trades fall inside a session, and the daily bucket of those
+        opens, closes, buckets = self.spans
+        i = np.searchsorted(opens, ts, side="right") - 1
+        keep = (i >= 0) & (ts < closes[np.maximum(i, 0)])
+        return keep, buckets[i[keep]]
+
+    def _buckets(self, ts: np.ndarray, price: np.ndarray, size: np.ndarray) -> np.ndarray:
+        if self.step is not None:
+            return ts - ts % self.step
+        if self.spec.kind == "volume":
+            m = size
+        elif self.spec.kind == "dollar":
+            m = price * size / PRICE_SCALE
+        else:
+            m = np.ones(len(ts))
+        total = self.total + np.cumsum(m)
+        self.total = total[-1]
+        return ((total - m) // self.spec.threshold).astype(np.int64)
+
+    def add(self, ts: np.ndarray, price: np.ndarray, size: np.ndarray):
+        if self.spans is not None:
+            keep, days = self._sessions(ts)
+            ts, price, size = ts[keep], price[keep], size[keep]
+        if not len(ts):
+            return
+        bucket = days if self.spec.daily else self._buckets(ts, price, size)
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(bucket)) + 1])
+        ends = np.append(starts[1:], len(ts))
+        bars = {
+            "key": bucket[starts],
+            # time bars: start of the window (or date); information bars: first trade
+            "bar": ts[starts] if self.spec.kind != "time" else bucket[starts],
+            "open": price[starts],
+            "high": np.maximum.reduceat(price, starts),
+            "low": np.minimum.reduceat(price, starts),
+            "close": price[ends - 1],
+            "volume": np.add.reduceat(size, starts),
+            "trade_count": ends - starts,
+            "pv": np.add.reduceat(price * size, starts),
+        }
+
+        prev = self.open_bar
+        if prev is not None:
+            if prev["key"][0] == bars["key"][0]:
+                for k, fold in (("high", np.maximum), ("low", np.minimum)):
+                    bars[k][0] = fold(prev[k][0], bars[k][0])
+                for k in ("volume", "trade_count", "pv"):
+                    bars[k][0] += prev[k][0]
+                for k in ("bar", "open"):
+                    bars[k][0] = prev[k][0]
+            else:
+                self.done.append(prev)
+
+        self.done.append({k: v[:-1] for k, v in bars.items()})
+        self.open_bar = {k: v[-1:].copy() for k, v in bars.items()}
+
+    def finish(self) -> pl.DataFrame:
+        parts = self.done + ([self.open_bar] if self.open_bar is not None else [])
+        if not parts:
+            return pl.DataFrame(schema={
+                "bar": pl.Date if self.spec.daily else pl.Datetime("ns", "UTC"), "open": pl.Float64, "high": pl.Float64,
+                "low": pl.Float64, "close": pl.Float64, "volume": pl.Float64, "trade_count": pl.Int64, "vwap": pl.Float64,
+            })
+        cols = {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+        bar = pl.col("bar").cast(pl.Datetime("ns")).dt.replace_time_zone("UTC")
+        return (
+            pl.DataFrame(cols)
+            .select(
+                bar.dt.date() if self.spec.daily else bar,
+                *(pl.col(c) / PRICE_SCALE for c in ("open", "high", "low", "close")),
+                "volume",
+                pl.col("trade_count").cast(pl.Int64),
+                (pl.col("pv") / pl.col("volume") / PRICE_SCALE).alias("vwap"),
+            )
+        )
+
+
+def trade_bars(cache, symbol: str, start_ts, end_ts, bar_size: str, session: str | None = None, cancel=None) -> pl.DataFrame:
+    acc = BarAccumulator(bar_size, session)
+    for ts, price, size in iter_trade_batches(cache, symbol, start_ts, end_ts, cancel=cancel):
+        acc.add(ts, price, size)
+    return acc.finish()
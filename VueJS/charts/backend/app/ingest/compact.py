@@ -0,0 +1,86 @@
+"""
+Background compaction of the append-only minute partitions.
+
+    python -m app.ingest.compact --root ../alpaca/data --symbol SPY
+    python -m app.ingest.compact --root ../alpaca/data --symbol SPY --watch 60
+"""
+import argparse
+import logging
+import threading
+import time
+
+from app.ingest.store import PartitionStore, get_store
+
+log = logging.getLogger(__name__)
+
+
+def compact_store(store: PartitionStore, min_files: int = 2) -> list[str]:
+    bases = []
+    for mid in store.pending(min_files):
+        base = store.compact(mid)
+        if base:
+            print(f"Compacted {store.symbol} {mid} → {base}")
+            bases.append(base)
+    store.purge()
+    return bases
+
+
+# longest wait before retrying a store whose compaction keeps failing, seconds
+MAX_BACKOFF = 3600.0
+
+
+class Compactor(threading.Thread):
+    """
+    Compacts and purges the given stores every `interval` seconds. A store
+    that fails is logged and skipped for a backoff that doubles with each
+    failure in a row (up to MAX_BACKOFF); the others carry on.
+    """
+
+    def __init__(self, stores: list[PartitionStore], interval: float = 60.0, min_files: int = 2):
+        super().__init__(daemon=True, name="compactor")
+        self.stores = stores
+        self.interval = interval
+        self.min_files = min_files
+        self._halt = threading.Event()
+        self._failures: dict[int, int] = {}         # by store index
+        self._retry_at: dict[int, float] = {}
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            for i, store in enumerate(self.stores):
+                if time.monotonic() < self._retry_at.get(i, 0.0):
+                    continue
+                try:
+                    compact_store(store, self.min_files)
+                except Exception as e:
+                    failures = self._failures[i] = self._failures.get(i, 0) + 1
+                    delay = min(self.interval * 2 ** failures, MAX_BACKOFF)
+                    self._retry_at[i] = time.monotonic() + delay
+                    log.warning("compaction of %s failed (%r), retrying in %gs", store.symbol, e, delay)
+                else:
+                    self._failures.pop(i, None)
+                    self._retry_at.pop(i, None)
+
+    def stop(self):
+        self._halt.set()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact delta files into month bases")
+    parser.add_argument("--root", default="../alpaca/data")
+    parser.add_argument("--symbol", action="append", required=True)
+    parser.add_argument("--min-files", type=int, default=2)
+    parser.add_argument("--watch", type=float, default=None, help="keep running, compacting every N seconds")
+    args = parser.parse_args()
+
+    stores = [get_store(args.root, sym) for sym in args.symbol]
+    for store in stores:
+        compact_store(store, args.min_files)
+
+    if args.watch:
+        compactor = Compactor(stores, args.watch, args.min_files)
+        compactor.start()
+        try:
+            compactor.join()
+        except KeyboardInterrupt:
+            compactor.stop()
@@ -0,0 +1,336 @@
+"""
+Concurrent, resumable minute-bar backfill.
+
+    python -m app.ingest.download --symbol SPY --symbol QQQ --start 2020-01-01 --end 2025-12-30
+    python -m app.ingest.download --source fake --symbol SPY --start 2024-01-01 --end 2024-03-01 --root /tmp/data
+    python -m app.ingest.download --kind trades --chunk-days 1 --symbol SPY --start 2024-01-02 --end 2024-01-06
+
+(symbol, 30-day chunk) pairs are fetched by a bounded worker pool. Every
+request goes through one shared rate limiter, and HTTP 429s back off
+exponentially. Finished chunks are recorded in a checkpoint file, so an
+interrupted run picks up where it stopped.
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Protocol
+
+import numpy as np
+import polars as pl
+
+from app.ingest.writer import DATA_ROOT, save_partition, save_trades
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float | None = None):
+        super().__init__(f"rate limited (retry after {retry_after}s)")
+        self.retry_after = retry_after
+
+
+class BarSource(Protocol):
+    def fetch_bars(self, symbol: str, start: datetime, end: datetime) -> pl.DataFrame: ...
+
+    def fetch_trades(self, symbol: str, start: datetime, end: datetime) -> pl.DataFrame: ...
+
+
+class AlpacaSource:
+    """Minute bars and trades from Alpaca's historical data API."""
+
+    def __init__(self, client=None, key: str | None = None, secret: str | None = None):
+        if client is None:
+            from alpaca.data import StockHistoricalDataClient
+            client = StockHistoricalDataClient(key, secret)
+        self.client = client
+
+    def fetch_bars(self, symbol: str, start: datetime, end: datetime) -> pl.DataFrame:
+        from alpaca.data.requests import StockBarsRequest
+        from alpaca.data.timeframe import TimeFrame
+
+        request = StockBarsRequest(
+            symbol_or_symbols=[symbol],
+            start=start,
+            end=end,
+            timeframe=TimeFrame.Minute,
+        )
+        return self._get(self.client.get_stock_bars, request)
+
+    def fetch_trades(self, symbol: str, start: datetime, end: datetime) -> pl.DataFrame:
+        from alpaca.data.requests import StockTradesRequest
+
+        request = StockTradesRequest(symbol_or_symbols=[symbol], start=start, end=end)
+        return self._get(self.client.get_stock_trades, request)
+
+    @staticmethod
+    def _get(call, request) -> pl.DataFrame:
+        from alpaca.common.exceptions import APIError
+
+        try:
+            result = call(request)
+        except APIError as e:
+            if getattr(e, "status_code", None) == 429:
+                raise RateLimited() from e
+            raise
+
+        df = result.df
+        if df.empty:
+            return pl.DataFrame()
+        return pl.from_pandas(df.reset_index())   # makes symbol + timestamp columns
+
+
+class FakeSource:
+    """
+    Deterministic synthetic minute bars (09:00-23:59 UTC on weekdays), and
+    trades inside them, for tests and benchmarks. `latency` simulates the HTTP round trip and every
+    `throttle_every`-th call raises RateLimited.
+    """
+
+    def __init__(self, latency: float = 0.0, throttle_every: int = 0):
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def fetch_bars(self, symbol: str, start: datetime, end: datetime) -> pl.DataFrame:
+        with self._lock:
+            self.calls += 1
+            throttled = self.throttle_every and self.calls % self.throttle_every == 0
+        if self.latency:
+            time.sleep(self.latency)
+        if throttled:
+            raise RateLimited(retry_after=0.01)
+
+        days = []
+        day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        while day < end:
+            if day.weekday() < 5:
+                days.append(self._day(symbol, day))
+            day += timedelta(days=1)
+
+        df = pl.concat(days) if days else pl.DataFrame()
+        if df.is_empty():
+            return df
+        return df.filter((pl.col("timestamp") >= start) & (pl.col("timestamp") < end))
+
+    def fetch_trades(self, symbol: str, start: datetime, end: datetime, per_minute: int = 20) -> pl.DataFrame:
+        bars = self.fetch_bars(symbol, start, end)
+        if bars.is_empty():
+            return bars
+
+        n = bars.height * per_minute
+        rng = np.random.default_rng(zlib.crc32(f"{symbol}{start.isoformat()}".encode()))
+        minute = bars["timestamp"].dt.epoch("ns").to_numpy().repeat(per_minute)
+        offset = np.sort(rng.integers(0, 60 * 10**9, (bars.height, per_minute)), axis=1).ravel()
+        low, high = bars["low"].to_numpy().repeat(per_minute), bars["high"].to_numpy().repeat(per_minute)
+        return pl.DataFrame({
+            "symbol": [symbol] * n,
+            "timestamp": pl.Series(minute + offset).cast(pl.Datetime("ns")).dt.replace_time_zone("UTC"),
+            "exchange": rng.choice(["V", "N", "P", "Q", "Z", "K"], n),
+            "price": np.round(low + (high - low) * rng.random(n), 2),
+            "size": rng.integers(1, 500, n).astype(float),
+            "id": np.arange(1, n + 1),
+            "conditions": rng.choice(["@", "@ I", "@ F T"], n),
+            "tape": ["B"] * n,
+        })
+
+    @staticmethod
+    def _day(symbol: str, day: datetime) -> pl.DataFrame:
+        n = 15 * 60
+        rng = np.random.default_rng(zlib.crc32(f"{symbol}{day.date()}".encode()))
+        close = 100 + (zlib.crc32(symbol.encode()) % 400) + rng.standard_normal(n).cumsum() * 0.05
+        spread = np.abs(rng.standard_normal(n)) * 0.05
+        volume = rng.integers(100, 50_000, n).astype(float)
+        open_ = np.concatenate([[close[0]], close[:-1]])
+        return pl.DataFrame({
+            "symbol": [symbol] * n,
+            "timestamp": pl.datetime_range(
+                day + timedelta(hours=9), day + timedelta(hours=23, minutes=59),
+                "1m", eager=True, time_unit="ns", time_zone="UTC",
+            ),
+            "open": open_,
+            "high": np.maximum(open_, close) + spread,
+            "low": np.minimum(open_, close) - spread,
+            "close": close,
+            "volume": volume,
+            "trade_count": (volume // 100).astype(float),
+            "vwap": (open_ + close) / 2,
+        })
+
+
+class RateLimiter:
+    """
+    Shared request pacing: at most `per_minute` requests, spaced evenly, and
+    a global cooldown when any worker gets throttled.
+    """
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self._next - now, 0.0)
+            self._next = max(self._next, now) + self.interval
+        if wait:
+            time.sleep(wait)
+
+    def cooldown(self, seconds: float):
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + seconds)
+
+
+class Checkpoint:
+    """Set of finished chunk ids, persisted as JSON after every update."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.done: set[str] = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.done = set(json.load(f)["done"])
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self.done
+
+    def add(self, chunk_id: str):
+        with self._lock:
+            self.done.add(chunk_id)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"done": sorted(self.done)}, f)
+            os.replace(tmp, self.path)
+
+
+@dataclass(frozen=True)
+class Chunk:
+    symbol: str
+    start: datetime
+    end: datetime
+
+    @property
+    def id(self) -> str:
+        return f"{self.symbol}/{self.start.isoformat()}/{self.end.isoformat()}"
+
+
+def make_chunks(symbols: list[str], start: datetime, end: datetime, size: timedelta) -> list[Chunk]:
+    out = []
+    for symbol in symbols:
+        cur = start
+        while cur < end:
+            nxt = min(cur + size, end)
+            out.append(Chunk(symbol, cur, nxt))
+            cur = nxt
+    return out
+
+
+def backfill(
+    source: BarSource,
+    symbols: list[str],
+    start: datetime,
+    end: datetime,
+    root: str = DATA_ROOT,
+    chunk: timedelta = timedelta(days=30),
+    workers: int = 4,
+    per_minute: float = 180,
+    checkpoint: str = ".backfill-checkpoint.json",
+    max_retries: int = 6,
+    kind: str = "bars",
+) -> dict:
+    """
+    Download and store every (symbol, chunk) not yet in the checkpoint.
+    Requests run concurrently; writes for one symbol are serialized because
+    they update the same manifest and rollup (or trade day) files.
+    `kind` is "bars" (minute partitions) or "trades" (day files).
+    """
+    if kind not in ("bars", "trades"):
+        raise ValueError(f"Invalid kind: {kind}")
+    fetch = source.fetch_bars if kind == "bars" else source.fetch_trades
+    save = save_partition if kind == "bars" else save_trades
+    prefix = "" if kind == "bars" else "trades:"
+
+    done = Checkpoint(checkpoint)
+    limiter = RateLimiter(per_minute)
+    symbol_locks = {s: threading.Lock() for s in symbols}
+    todo = [c for c in make_chunks(symbols, start, end, chunk) if prefix + c.id not in done]
+    stats = {"chunks": len(todo), "rows": 0, "retries": 0, "failed": []}
+    stats_lock = threading.Lock()
+
+    def run(c: Chunk):
+        for attempt in range(max_retries + 1):
+            limiter.acquire()
+            try:
+                df = fetch(c.symbol, c.start, c.end)
+                break
+            except RateLimited as e:
+                if attempt == max_retries:
+                    raise
+                delay = e.retry_after or min(2 ** attempt, 60) * (1 + random.random())
+                limiter.cooldown(delay)
+                with stats_lock:
+                    stats["retries"] += 1
+
+        if not df.is_empty():
+            with symbol_locks[c.symbol]:
+                save(df, c.symbol, root)
+        done.add(prefix + c.id)
+        return df.height
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run, c): c for c in todo}
+        for fut in as_completed(futures):
+            c = futures[fut]
+            try:
+                rows = fut.result()
+            except Exception as e:
+                print(f"✗ {c.id}: {e}")
+                stats["failed"].append(c.id)
+                continue
+            stats["rows"] += rows
+            print(f"✓ {c.id}: {rows} rows")
+
+    return stats
+
+
+def _date(s: str) -> datetime:
+    return datetime.fromisoformat(s).replace(tzinfo=timezone.utc)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill minute bars into the local partition store")
+    parser.add_argument("--symbol", action="append", required=True)
+    parser.add_argument("--start", type=_date, required=True)
+    parser.add_argument("--end", type=_date, required=True)
+    parser.add_argument("--root", default=DATA_ROOT)
+    parser.add_argument("--source", choices=["alpaca", "fake"], default="alpaca")
+    parser.add_argument("--kind", choices=["bars", "trades"], default="bars")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunk-days", type=int, default=30)
+    parser.add_argument("--per-minute", type=float, default=180, help="request budget (Alpaca free tier is 200/min)")
+    parser.add_argument("--checkpoint", default=".backfill-checkpoint.json")
+    args = parser.parse_args()
+
+    if args.source == "fake":
+        src = FakeSource()
+    else:
+        src = AlpacaSource(key=os.getenv("APCA_API_KEY_ID"), secret=os.getenv("APCA_API_SECRET_KEY"))
+
+    t = time.perf_counter()
+    result = backfill(
+        src, args.symbol, args.start, args.end, args.root,
+        chunk=timedelta(days=args.chunk_days),
+        workers=args.workers,
+        per_minute=args.per_minute,
+        checkpoint=args.checkpoint,
+        kind=args.kind,
+    )
+    print(f"\n✅ Done in {time.perf_counter() - t:.1f}s: {result['rows']} {args.kind} rows, "
+          f"{result['retries']} retries, {len(result['failed'])} failed chunks")
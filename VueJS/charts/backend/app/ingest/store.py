@@ -0,0 +1,184 @@
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import polars as pl
+
+from app.data.index import index_key, write_partition
+from app.data.partitions import load_manifest, manifest_key, month_file_key, month_id
+from app.data.planner import dedupe
+
+
+class PartitionStore:
+    """
+    Append-only minute partitions of one symbol under `root`.
+
+    Every ingest batch becomes a new immutable delta file, and
+    `symbol=X/_manifest.json` lists the live files of each month. The manifest
+    is replaced atomically, so a reader that loaded it sees one consistent
+    file set. Every update of it (append, compaction, purge) holds an
+    exclusive flock on `_manifest.json.lock`, so writers in other processes
+    (the compactor CLI, notebooks, the download CLI) can't interleave. Compaction merges a month into a new base file. The files it
+    replaces are only deleted `grace` seconds later, after readers holding
+    the old snapshot are done.
+    """
+
+    def __init__(self, root: str, symbol: str, grace: float = 300.0):
+        self.root = root
+        self.symbol = symbol
+        self.grace = grace
+        self.path = os.path.join(root, manifest_key(symbol))
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        # this process's writers, then every other process's
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + ".lock", "a") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    # --------------------------------------------------------------- manifest
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return self._read()
+
+    def _read(self) -> dict:
+        manifest = load_manifest(self.path)
+        if manifest is None:
+            # first use: adopt the existing month=MM.parquet files as bases
+            manifest = {"version": 0, "months": {}, "retired": []}
+            pattern = os.path.join(self.root, f"symbol={self.symbol}", "year=*", "month=*.parquet")
+            for path in sorted(glob.glob(pattern)):
+                key = os.path.relpath(path, self.root).replace(os.sep, "/")
+                year = int(key.split("/year=")[1][:4])
+                month = int(key.split("/month=")[1][:2])
+                manifest["months"][month_id(year, month)] = [key]
+        return manifest
+
+    def _write(self, manifest: dict):
+        manifest["version"] += 1
+        # caller holds _locked()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    # ------------------------------------------------------------------ write
+
+    def _write_file(self, df: pl.DataFrame, year: int, month: int, kind: str) -> str:
+        key = month_file_key(self.symbol, year, month, f"{kind}-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet")
+        write_partition(df, self.root, key)
+        return key
+
+    def append(self, df: pl.DataFrame) -> list[str]:
+        """Write `df` as one delta file per month it touches and publish them."""
+        if df.is_empty():
+            return []
+
+        parts = df.with_columns(
+            pl.col("timestamp").dt.year().alias("_year"),
+            pl.col("timestamp").dt.month().alias("_month"),
+        ).partition_by(["_year", "_month"], as_dict=True)
+
+        written = {}
+        for (year, month), part in parts.items():
+            written[month_id(year, month)] = self._write_file(part.drop("_year", "_month"), year, month, "delta")
+
+        with self._locked():
+            manifest = self._read()
+            for mid, key in written.items():
+                manifest["months"].setdefault(mid, []).append(key)
+            self._write(manifest)
+        return list(written.values())
+
+    # ------------------------------------------------------------------- read
+
+    def files(self, mid: str) -> list[str]:
+        return self.snapshot()["months"].get(mid, [])
+
+    def read_month(self, mid: str) -> pl.DataFrame | None:
+        paths = [os.path.join(self.root, k) for k in self.files(mid)]
+        paths = [p for p in paths if os.path.exists(p)]
+        if not paths:
+            return None
+        return dedupe(pl.concat([pl.read_parquet(p) for p in paths], how="vertical_relaxed")).sort("timestamp")
+
+    # ------------------------------------------------------------- compaction
+
+    def pending(self, min_files: int = 2) -> list[str]:
+        # months with at least `min_files` live files, or whose only file is a delta
+        out = []
+        for mid, files in self.snapshot()["months"].items():
+            if len(files) >= min_files or (files and "/delta-" in files[0]):
+                out.append(mid)
+        return sorted(out)
+
+    def compact(self, mid: str) -> str | None:
+        """
+        Merge the month's current files into one sorted, deduplicated base.
+        Deltas appended while this runs stay live after the new base.
+        """
+        with self._lock:
+            files = list(self._read()["months"].get(mid, []))
+        if not files:
+            return None
+
+        paths = [os.path.join(self.root, k) for k in files]
+        merged = dedupe(pl.concat([pl.read_parquet(p) for p in paths if os.path.exists(p)], how="vertical_relaxed"))
+        year, month = int(mid[:4]), int(mid[5:7])
+        base = self._write_file(merged, year, month, "base")
+
+        with self._locked():
+            manifest = self._read()
+            live = manifest["months"].get(mid, [])
+            manifest["months"][mid] = [base] + [k for k in live if k not in files]
+            now = time.time()
+            manifest["retired"].extend({"key": k, "at": now} for k in files)
+            self._write(manifest)
+        return base
+
+    def purge(self) -> int:
+        """Delete retired files older than the grace period."""
+        with self._locked():
+            manifest = self._read()
+            cutoff = time.time() - self.grace
+            keep, removed = [], 0
+            for r in manifest["retired"]:
+                if r["at"] > cutoff:
+                    keep.append(r)
+                    continue
+                for key in (r["key"], index_key(r["key"])):
+                    try:
+                        os.remove(os.path.join(self.root, key))
+                    except FileNotFoundError:
+                        pass
+                removed += 1
+            if removed:
+                manifest["retired"] = keep
+                self._write(manifest)
+        return removed
+
+
+_stores: dict[tuple[str, str], PartitionStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(root: str, symbol: str) -> PartitionStore:
+    # one instance per (root, symbol) so writers in this process share its lock
+    key = (os.path.abspath(root), symbol)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = PartitionStore(root, symbol)
+        return _stores[key]
@@ -0,0 +1,150 @@
+"""
+Mirror the local partition tree (../alpaca/data) into the bucket.
+
+    python -m app.ingest.sync --root ../alpaca/data
+    python -m app.ingest.sync --root ../alpaca/data --delete
+
+Local files are hashed the way S3/MinIO computes ETags (plain MD5, or the
+MD5-of-part-MD5s "-N" form for multipart uploads with the same part size),
+so only new or changed files are uploaded. Data files go first and
+manifests last, so the bucket never lists files it doesn't have yet.
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+
+from app.config import load_settings
+from app.data.index import INDEX_SUFFIX, MULTIPART_CHUNK, MULTIPART_THRESHOLD, file_etag
+from app.data.store import ObjectStore
+
+
+HASH_CACHE = ".sync-hashes.json"
+
+
+def local_files(root: str) -> dict[str, str]:
+    """key -> path for every parquet/index sidecar/manifest file under root."""
+    out = {}
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            if name.endswith((".parquet", INDEX_SUFFIX)) or name == "_manifest.json":
+                path = os.path.join(dirpath, name)
+                out[os.path.relpath(path, root).replace(os.sep, "/")] = path
+    return out
+
+
+class HashCache:
+    """ETags of local files, reused while size and mtime are unchanged."""
+
+    def __init__(self, root: str, threshold: int, part_size: int):
+        self.path = os.path.join(root, HASH_CACHE)
+        self.threshold = threshold
+        self.part_size = part_size
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                saved = json.load(f)
+            if saved.get("part_size") == part_size and saved.get("threshold") == threshold:
+                self.entries = saved["files"]
+
+    def etag(self, key: str, path: str) -> str:
+        st = os.stat(path)
+        hit = self.entries.get(key)
+        if hit and hit["size"] == st.st_size and hit["mtime"] == st.st_mtime_ns:
+            return hit["etag"]
+        tag = file_etag(path, self.threshold, self.part_size)
+        self.entries[key] = {"size": st.st_size, "mtime": st.st_mtime_ns, "etag": tag}
+        return tag
+
+    def save(self, keys):
+        files = {k: v for k, v in self.entries.items() if k in keys}
+        if not files and not os.path.exists(self.path):
+            return
+        with open(self.path + ".tmp", "w") as f:
+            json.dump({"threshold": self.threshold, "part_size": self.part_size, "files": files}, f)
+        os.replace(self.path + ".tmp", self.path)
+
+
+def remote_objects(s3, bucket: str, prefix: str = "") -> dict[str, str]:
+    """key -> ETag for every object, across all listing pages."""
+    out = {}
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            out[obj["Key"]] = obj["ETag"].strip('"')
+    return out
+
+
+def delete_keys(s3, bucket: str, keys: list[str]) -> int:
+    # delete_objects takes at most 1000 keys per call
+    for i in range(0, len(keys), 1000):
+        batch = keys[i:i + 1000]
+        s3.delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": k} for k in batch], "Quiet": True})
+    return len(keys)
+
+
+def delete_prefix(s3, bucket: str, prefix: str = "") -> int:
+    return delete_keys(s3, bucket, list(remote_objects(s3, bucket, prefix)))
+
+
+def ensure_bucket(s3, bucket: str):
+    try:
+        s3.head_bucket(Bucket=bucket)
+    except ClientError:
+        s3.create_bucket(Bucket=bucket)
+
+
+def sync(
+    s3,
+    bucket: str,
+    root: str,
+    delete: bool = False,
+    workers: int = 16,
+    threshold: int = MULTIPART_THRESHOLD,
+    part_size: int = MULTIPART_CHUNK,
+) -> dict:
+    if not os.path.isdir(root):
+        raise FileNotFoundError(f"Sync root {root!r} is not a directory")
+    ensure_bucket(s3, bucket)
+    config = TransferConfig(multipart_threshold=threshold, multipart_chunksize=part_size, max_concurrency=4)
+
+    local = local_files(root)
+    remote = remote_objects(s3, bucket)
+    hashes = HashCache(root, threshold, part_size)
+
+    changed = [k for k, path in local.items() if remote.get(k) != hashes.etag(k, path)]
+    data = [k for k in changed if not k.endswith("_manifest.json")]
+    manifests = [k for k in changed if k.endswith("_manifest.json")]
+
+    def upload(key):
+        s3.upload_file(local[key], bucket, key, Config=config)
+        print("Uploaded:", key)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(upload, data))
+        list(pool.map(upload, manifests))
+    hashes.save(local)
+
+    deleted = 0
+    if delete:
+        deleted = delete_keys(s3, bucket, sorted(set(remote) - set(local)))
+
+    return {"local": len(local), "uploaded": len(changed), "deleted": deleted}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upload changed partitions to the bucket")
+    parser.add_argument("--root", default="../alpaca/data")
+    parser.add_argument("--bucket", default=None, help="defaults to S3_BUCKET (app/.env)")
+    parser.add_argument("--delete", action="store_true", help="remove objects that no longer exist locally")
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+
+    # endpoint and credentials come from app/.env, like the API server
+    settings = load_settings()
+    settings = replace(settings, s3_max_connections=max(settings.s3_max_connections, args.workers * 4))
+    store = ObjectStore(settings)
+    print(sync(store.client, args.bucket or store.bucket, args.root, delete=args.delete, workers=args.workers))
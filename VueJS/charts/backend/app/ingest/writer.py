@@ -0,0 +1,47 @@
+import os
+
+import polars as pl
+
+from app.data.index import TRADE_ROW_GROUP, write_partition
+from app.data.partitions import trade_key
+from app.data.rollup import update_rollups
+from app.data.trades import to_trade_frame
+from app.ingest.store import get_store
+
+
+DATA_ROOT = "./data"
+
+
+def save_partition(df: pl.DataFrame, symbol: str, root: str = DATA_ROOT):
+    """
+    Append new minute bars as delta files (see PartitionStore), then update
+    only the rollup buckets those bars fall in. Compaction into month files
+    happens separately (app.ingest.compact).
+    """
+    if df.is_empty():
+        return
+
+    keys = get_store(root, symbol).append(df)
+    print(f"Saved {len(df)} rows → {len(keys)} delta files")
+
+    touched = update_rollups(root, symbol, df["timestamp"])
+    print("Rollup buckets updated:", touched)
+
+
+def save_trades(df: pl.DataFrame, symbol: str, root: str = DATA_ROOT, row_group_size: int = TRADE_ROW_GROUP):
+    """
+    Merge trades into their day files (trades/symbol=X/date=YYYY-MM-DD.parquet),
+    sorted by timestamp and deduplicated on (timestamp, id), so re-fetching
+    a day is harmless. Each file gets its index sidecar (app.data.index).
+    """
+    if df.is_empty():
+        return
+
+    trades = to_trade_frame(df).with_columns(pl.col("timestamp").dt.date().alias("_day"))
+    for (day,), part in trades.partition_by("_day", as_dict=True, include_key=False).items():
+        path = os.path.join(root, trade_key(symbol, day))
+        if os.path.exists(path):
+            part = pl.concat([pl.read_parquet(path), part], how="vertical_relaxed")
+        part = part.unique(subset=["timestamp", "id"], keep="last")
+        write_partition(part, root, trade_key(symbol, day), max_rows=row_group_size)
+        print(f"Saved {part.height} trades → {path}")
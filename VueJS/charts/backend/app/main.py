@@ -1,9 +1,26 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from app.routes import market
+from app.config import load_settings
+from app.data import aio
+from app.data.store import close_store, open_store
+from app.routes import market, ticks
+from app.streaming.live import LIVE
 from app.ws import websocket 
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # one pooled S3 client + partition cache for every request
+    open_store(load_settings())
+    yield
+    await LIVE.close()
+    aio.shutdown()
+    close_store()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(market.router, prefix="/market", tags=["market"])
+app.include_router(ticks.router, prefix="/ticks", tags=["ticks"])
 app.include_router(websocket.router, prefix="/websocket", tags=["websocket"])
-
@@ -1,29 +1,110 @@
-from fastapi import FastAPI
-from app.schemas.tick import MarketResponse, MarketQuery, MarketRow
-from app.data.loader import load_ticks
-from app.data.resample import resample_bars
+from fastapi import FastAPI, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from app.schemas.tick import BatchQuery, MarketResponse, MarketQuery, MarketRow
+from app.data.cursor import decode_cursor, next_cursor, page_end
+from app.data.indicators import columns
+from app.data.loader import load_bars_multi, load_market
+from app.data.responses import CachedResponse, etag_matches, get_responses, query_key
+from app.data.serialize import (
+    BATCH_ROWS, MEDIA_TYPES, arrow_ipc, columns_json, columns_json_multi, iter_arrow_ipc, iter_columns_json,
+    iter_packed, negotiate, packed,
+)
 from fastapi import APIRouter
+import polars as pl
 
 router = APIRouter()
 
+
+def response_format(fmt: str | None, accept: str | None, default: str = "rows", allowed=tuple(MEDIA_TYPES)) -> str:
+    # 400 for a bad `format`, 406 when the Accept header asks for one this endpoint can't send
+    try:
+        out = negotiate(fmt, accept, default)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if out not in allowed:
+        raise HTTPException(400 if fmt else 406, f"Format not supported here: {out} (use {' | '.join(allowed)})")
+    return out
+
+
+def cached_response(entry: CachedResponse, if_none_match: str | None) -> Response:
+    headers = {**entry.headers, "ETag": entry.etag}
+    if etag_matches(entry.etag, if_none_match):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type=entry.media_type, headers=headers)
+
+
 @router.post("/market/data", response_model=MarketResponse)
-def get_market_data(q: MarketQuery):
-    # 1. Load ticks from S3 (MinIO)
-    df = load_ticks(
+def get_market_data(
+    q: MarketQuery,
+    format: str | None = Query(None),
+    accept: str | None = Header(None),
+    if_none_match: str | None = Header(None),
+):
+    fmt = response_format(format or q.format, accept)
+
+    # Repeat queries: encoded bodies of every format are cached per normalized query
+    responses = get_responses()
+    key = query_key(q.model_dump(exclude={"format"}), fmt)
+    hit = responses.get(key)
+    if hit is not None:
+        return cached_response(hit, if_none_match)
+
+    # unknown indicators / parameters are the client's error, found before any data is read
+    try:
+        columns(q.indicators or [])
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    # 0. Paging: continue right before the oldest row of the previous page
+    end_ts = q.end_time
+    if q.cursor:
+        try:
+            end_ts = page_end(end_ts, decode_cursor(q.cursor, q.symbol, q.mode, q.bar_size, q.session))
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+
+    # 1. Load bars from the stored rollups or trades, or ticks from S3 (MinIO)
+    # 2. Add the requested indicators (computed on the server, warmed up on earlier bars)
+    df, time_col, ind_cols = load_market(
         symbol=q.symbol,
         start_ts=q.start_time,
-        end_ts=q.end_time,
+        end_ts=end_ts,
+        mode=q.mode,
+        bar_size=q.bar_size,
+        limit=q.limit,
+        descending=True,
+        specs=q.indicators,
+        session=q.session,
     )
-    # 2. Resample if needed
-    if q.mode == "bars":
-        if not q.bar_size:
-            raise ValueError("bar_size required for bars mode")
-        df = resample_bars(df, q.bar_size)
-        time_col = "bar"
-    else:
-        time_col = "timestamp"
-
-    # 3. Convert to response rows
+    cursor = next_cursor(q.symbol, q.mode, q.bar_size, q.session, df[time_col], q.limit)
+
+    # 3a. Columnar / binary: serialize straight from the frame, no per-row objects,
+    #     in BATCH_ROWS chunks for long responses (streamed: not cached, no ETag)
+    if fmt == "columns":
+        meta = {
+            "symbol": q.symbol,
+            "model": q.mode,
+            "bar_size": q.bar_size,
+            "start_time": q.start_time,
+            "end_time": q.end_time,
+            "next_cursor": cursor,
+        }
+        if df.height > BATCH_ROWS:
+            return StreamingResponse(iter_columns_json(meta, df, time_col, ind_cols), media_type=MEDIA_TYPES[fmt])
+        body = columns_json(meta, df, time_col, ind_cols)
+        return cached_response(responses.put(key, body, MEDIA_TYPES[fmt], q.end_time), if_none_match)
+
+    if fmt in ("arrow", "packed"):
+        headers = {"X-Symbol": q.symbol, "X-Count": str(df.height)}
+        if cursor:
+            headers["X-Next-Cursor"] = cursor
+        if df.height > BATCH_ROWS:
+            body = iter_arrow_ipc(df, time_col, ind_cols) if fmt == "arrow" else iter_packed(df, time_col)
+            return StreamingResponse(body, media_type=MEDIA_TYPES[fmt], headers=headers)
+        body = arrow_ipc(df, time_col, ind_cols) if fmt == "arrow" else packed(df, time_col)
+        return cached_response(responses.put(key, body, MEDIA_TYPES[fmt], q.end_time, headers), if_none_match)
+
+    # 3b. Convert to response rows
     rows = [
         MarketRow(
             timestamp=row[time_col],
@@ -38,8 +119,8 @@ def get_market_data(q: MarketQuery):
         for row in df.iter_rows(named=True)
     ]
 
-    # 4. Return schema-safe response
-    return MarketResponse(
+    # 4. Schema-safe response, encoded once so it can be cached and tagged like the others
+    body = MarketResponse(
         symbol=q.symbol,
         model=q.mode,
         bar_size=q.bar_size,
@@ -47,4 +128,36 @@ def get_market_data(q: MarketQuery):
         end_time=q.end_time,
         rows=rows,
         count=len(rows),
+        indicators={c: df[c].to_list() for c in ind_cols} or None,
+        next_cursor=cursor,
+    ).model_dump_json().encode()
+    return cached_response(responses.put(key, body, MEDIA_TYPES[fmt], q.end_time), if_none_match)
+
+
+@router.post("/market/data/batch")
+def get_market_data_batch(
+    q: BatchQuery,
+    format: str | None = Query(None),
+    accept: str | None = Header(None),
+):
+    # one window, many symbols: a single scan + grouped resample, one columnar payload
+    fmt = response_format(format or q.format, accept, default="columns", allowed=("columns", "arrow"))
+
+    symbols = list(dict.fromkeys(q.symbols))
+    df = load_bars_multi(symbols, q.start_time, q.end_time, q.bar_size, limit=q.limit, session=q.session)
+
+    if fmt == "columns":
+        meta = {
+            "bar_size": q.bar_size,
+            "start_time": q.start_time,
+            "end_time": q.end_time,
+        }
+        return Response(columns_json_multi(meta, df, "bar", symbols), media_type=MEDIA_TYPES[fmt])
+
+    # long format: one table with a dictionary-encoded symbol column
+    df = df.with_columns(pl.col("symbol").cast(pl.Categorical))
+    return Response(
+        arrow_ipc(df, "bar", ["symbol"]),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"X-Symbols": ",".join(symbols), "X-Count": str(df.height)},
     )
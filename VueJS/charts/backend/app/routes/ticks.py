@@ -0,0 +1,23 @@
+from fastapi import APIRouter, HTTPException, Query, Response
+import orjson
+
+from app.streaming.live import LIVE
+
+router = APIRouter()
+
+
+# live trades, stream with /websocket/ws/ticks/live
+@router.get("/live/stats")
+async def live_stats():
+    return LIVE.stats()
+
+
+@router.get("/live/{symbol}")
+async def live_snapshot(symbol: str, n: int = Query(1000, ge=0, le=LIVE.capacity)):
+    # latest n trades + the current candles; empty while no WebSocket keeps the feed running
+    try:
+        snapshot = LIVE.snapshot(symbol, n)
+    except ValueError as e:
+        raise HTTPException(404, str(e))
+    body = orjson.dumps(snapshot, option=orjson.OPT_SERIALIZE_NUMPY)
+    return Response(body, media_type="application/json")
@@ -1,7 +1,12 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 from datetime import datetime, timezone
 from typing import List, Optional, Any
 
+from app.data.bars import check_bar_size
+from app.data.calendar import SESSIONS
+
+MODES = ("bars", "trades", "ticks")
+
 # symbol	timestamp	open	high	low	close	volume	trade_count	vwap
 class MarketRow(BaseModel):
     timestamp: datetime
@@ -21,6 +26,8 @@ class MarketResponse(BaseModel):
     end_time: datetime
     rows: List[MarketRow]
     count: int
+    indicators: Optional[dict[str, List[Optional[float]]]] = None   # column per indicator output, aligned with rows
+    next_cursor: Optional[str] = None   # pass back as `cursor` for the page before this one
     
 class IndicatorSpec(BaseModel):
     name: str
@@ -30,7 +37,39 @@ class MarketQuery(BaseModel):
     symbol: str = "SPY"
     start_time: datetime = datetime(2023, 1, 2, 0, 0, tzinfo=timezone.utc)
     end_time: datetime = datetime(2023, 1, 5, 0, 0, tzinfo=timezone.utc)
-    mode: str = "bars"      # ticks | bars 
-    bar_size: Optional[str] = "5m"
+    mode: str = "bars"      # ticks | bars | trades (bars built from trade ticks)
+    bar_size: Optional[str] = "5m"    # 30m, 4h, 1d, 2w, 3mo, or volume:50000 | dollar:2e7 | tick:1000 (app.data.bars)
+    session: Optional[str] = None   # rth | extended (bars/trades modes); default: regular hours for 1d+, all hours intraday
     indicators: Optional[List[IndicatorSpec]] = None
-    limit: Optional[int] = 100_000
+    limit: Optional[int] = Field(100_000, gt=0)     # newest rows; None: the whole window
+    cursor: Optional[str] = None    # next_cursor of the previous page: continue with older rows
+    format: Optional[str] = None    # rows | columns | arrow | packed, else from Accept
+
+    @model_validator(mode="after")
+    def check_bars(self):
+        # bad modes, sizes and sessions are a 422, not a failed load
+        if self.mode not in MODES:
+            raise ValueError(f"Invalid mode: {self.mode}")
+        if self.mode != "ticks":
+            if not self.bar_size:
+                raise ValueError(f"bar_size required for {self.mode} mode")
+            check_bar_size(self.bar_size, self.mode)
+        if self.session not in (None, *SESSIONS):
+            raise ValueError(f"Invalid session: {self.session}")
+        return self
+
+class BatchQuery(BaseModel):
+    symbols: List[str] = Field(["SPY"], min_length=1, max_length=500)
+    start_time: datetime = datetime(2023, 1, 2, 0, 0, tzinfo=timezone.utc)
+    end_time: datetime = datetime(2023, 1, 5, 0, 0, tzinfo=timezone.utc)
+    bar_size: str = "5m"            # as in MarketQuery
+    session: Optional[str] = None   # rth | extended, as in MarketQuery
+    limit: Optional[int] = Field(None, gt=0)     # newest bars per symbol
+    format: Optional[str] = None    # columns | arrow, else from Accept
+
+    @model_validator(mode="after")
+    def check_bars(self):
+        check_bar_size(self.bar_size)
+        if self.session not in (None, *SESSIONS):
+            raise ValueError(f"Invalid session: {self.session}")
+        return self
@@ -0,0 +1,98 @@
+"""
+Live trade sources for app.streaming.live. A feed runs until cancelled and
+hands batches of trades to `push(ts_ns, price, size)` as numpy arrays.
+"""
+import asyncio
+import time
+import zlib
+from typing import Callable, Protocol
+
+import numpy as np
+
+
+Push = Callable[[np.ndarray, np.ndarray, np.ndarray], None]
+
+
+class TradeFeed(Protocol):
+    async def run(self, symbol: str, push: Push) -> None: ...
+
+
+class SyntheticFeed:
+    """
+    Random-walk trades for local testing: Poisson arrivals at `rate` trades
+    per second, delivered every `interval` seconds.
+    """
+
+    def __init__(self, rate: float = 200.0, interval: float = 0.05, price: float | None = None):
+        self.rate = rate
+        self.interval = interval
+        self.price = price
+
+    async def run(self, symbol: str, push: Push) -> None:
+        rng = np.random.default_rng(zlib.crc32(symbol.encode()) ^ time.time_ns())
+        price = self.price or 100.0 + zlib.crc32(symbol.encode()) % 400
+        prev = time.time_ns()
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.time_ns()
+            n = rng.poisson(self.rate * (now - prev) / 1e9)
+            if n:
+                ts = np.sort(rng.integers(prev, now, n))
+                prices = price + np.cumsum(rng.standard_normal(n)) * price * 2e-5
+                price = float(prices[-1])
+                push(ts, np.round(prices, 2), rng.integers(1, 500, n).astype(np.float64))
+            prev = now
+
+
+class AlpacaFeed:
+    """
+    Trades from Alpaca's real-time stream (IEX on the free plan, which
+    allows one connection). Every running symbol shares one stream: run()
+    subscribes its symbol on it, each trade goes to the push of its
+    `t.symbol`, and the stream closes when the last symbol stops.
+    """
+
+    def __init__(self, key: str | None, secret: str | None, feed: str = "iex"):
+        self.key = key
+        self.secret = secret
+        self.feed = feed
+        self._stream = None
+        self._closed: asyncio.Future | None = None     # done when the stream's thread exits
+        self._pushes: dict[str, Push] = {}
+
+    def _connect(self):
+        from alpaca.data.enums import DataFeed
+        from alpaca.data.live import StockDataStream
+
+        if self._stream is None:
+            self._stream = StockDataStream(self.key, self.secret, feed=DataFeed(self.feed))
+            self._closed = asyncio.ensure_future(asyncio.to_thread(self._stream.run))
+        return self._stream, self._closed
+
+    async def run(self, symbol: str, push: Push) -> None:
+        loop = asyncio.get_running_loop()
+        stream, closed = self._connect()
+        self._pushes[symbol] = lambda *batch: loop.call_soon_threadsafe(push, *batch)
+        stream.subscribe_trades(self._on_trade, symbol)
+        try:
+            # shielded: one symbol stopping must not cancel the others' connection
+            await asyncio.shield(closed)
+            raise ConnectionError("Alpaca stream closed")
+        finally:
+            del self._pushes[symbol]
+            if self._stream is stream:
+                if self._pushes and not closed.done():
+                    stream.unsubscribe_trades(symbol)
+                else:
+                    self._stream = None
+                    stream.stop()
+
+    async def _on_trade(self, t):
+        # called on the stream's own thread/loop
+        push = self._pushes.get(t.symbol)
+        if push is not None:
+            push(
+                np.array([int(t.timestamp.timestamp() * 1e9)], dtype=np.int64),
+                np.array([t.price]),
+                np.array([float(t.size)]),
+            )
@@ -0,0 +1,155 @@
+"""
+Shared replays: one load and one clock per (symbol, mode, bar_size, start,
+end, speed), fanned out to every WebSocket watching it.
+
+Each frame is serialized once per format and put on every subscriber's
+bounded queue. A late joiner first gets a snapshot of the bars already
+played, then the live frames. A subscriber whose queue fills up is dropped
+instead of holding the broadcast back for everyone else.
+
+Queue items are (kind, position, payload):
+
+    ("snapshot", pos, df)      bars [0, pos) already played (empty = just loaded)
+    ("frame", pos, body)       serialized bars up to `pos`
+    ("end", pos, state)        replay finished
+    ("error", None, detail)    load failed
+    ("lagged" | "detached" | "closed", None, None)
+"""
+import asyncio
+
+import polars as pl
+
+from app.data.serialize import columns_json, packed
+from app.streaming.replay import Replay
+
+
+def encode(df: pl.DataFrame, time_col: str, fmt: str, kind: str = "bars", extra: list[str] = ()) -> str | bytes:
+    # one message: packed bars, or columns JSON (with indicator columns) tagged with `kind`
+    if fmt == "packed":
+        return packed(df, time_col)
+    return columns_json({"type": kind}, df, time_col, extra).decode()
+
+
+class Subscriber:
+    def __init__(self, broadcast: "Broadcast", fmt: str, maxsize: int):
+        self.broadcast = broadcast
+        self.fmt = fmt
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.pos = 0            # bars delivered to the client
+
+    def put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.broadcast.unsubscribe(self)
+            self._replace(("lagged", None, None))
+
+    def _replace(self, item):
+        # drop whatever is pending and leave only `item`
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(item)
+
+    def detach(self) -> Replay:
+        """
+        Leave the broadcast and continue privately from the last bar
+        delivered, e.g. because the client wants to pause or seek.
+        """
+        bc = self.broadcast
+        if bc.replay is None:
+            raise ValueError("stream is still loading")
+        bc.unsubscribe(self)
+        self._replace(("detached", None, None))
+        replay = Replay(bc.df, bc.time_col, speed=bc.replay.speed)
+        if self.pos >= bc.replay.pos:
+            replay.jump(self.pos, bc.replay.now())
+        else:
+            replay.jump(self.pos, int(bc.replay.ts[max(self.pos - 1, 0)]))
+        return replay
+
+    def close(self):
+        self.broadcast.unsubscribe(self)
+        self._replace(("closed", None, None))
+
+
+class Broadcast:
+    def __init__(self, hub: "ReplayHub", key: tuple, load, time_col: str, speed: float, maxsize: int, extra: list[str]):
+        self.hub = hub
+        self.key = key
+        self.time_col = time_col
+        self.extra = extra
+        self.maxsize = maxsize
+        self.subscribers: set[Subscriber] = set()
+        self.df: pl.DataFrame | None = None
+        self.replay: Replay | None = None
+        self.task = asyncio.ensure_future(self._run(load, speed))
+
+    async def _run(self, load, speed: float):
+        try:
+            self.df = await load
+            self.replay = Replay(self.df, self.time_col, speed=speed)
+            for sub in list(self.subscribers):
+                sub.put(("snapshot", 0, self.df.clear()))
+
+            async for frame in self.replay.frames():
+                bodies = {}
+                for sub in list(self.subscribers):
+                    if sub.fmt not in bodies:
+                        bodies[sub.fmt] = encode(frame, self.time_col, sub.fmt, extra=self.extra)
+                    sub.put(("frame", self.replay.pos, bodies[sub.fmt]))
+
+            for sub in list(self.subscribers):
+                sub.put(("end", self.replay.pos, self.replay.state()))
+        except Exception as e:
+            for sub in list(self.subscribers):
+                sub.put(("error", None, str(e)))
+        finally:
+            self.hub._discard(self)
+
+    def subscribe(self, fmt: str) -> Subscriber:
+        sub = Subscriber(self, fmt, self.maxsize)
+        self.subscribers.add(sub)
+        if self.replay is not None:
+            pos = self.replay.pos
+            sub.put(("snapshot", pos, self.df.slice(0, pos)))
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self.subscribers.discard(sub)
+        if not self.subscribers:
+            # nobody left: stop pacing (or cancel the load); new viewers start over
+            self.hub._discard(self)
+            if self.replay is not None:
+                self.replay.stop()
+            else:
+                self.task.cancel()
+
+
+class ReplayHub:
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize      # frames buffered per subscriber (~50 s at the default tick)
+        self._streams: dict[tuple, Broadcast] = {}
+
+    def subscribe(
+        self, key: tuple, load, time_col: str, speed: float, fmt: str, extra: list[str] = ()
+    ) -> Subscriber:
+        """
+        Join the broadcast for `key`, starting it if needed. `load` is a
+        zero-argument callable returning an awaitable DataFrame; it is only
+        called when a new broadcast starts. `extra` are indicator columns
+        sent along with the bars.
+        """
+        bc = self._streams.get(key)
+        if bc is None:
+            bc = self._streams[key] = Broadcast(self, key, load(), time_col, speed, self.maxsize, list(extra))
+        return bc.subscribe(fmt)
+
+    def _discard(self, bc: Broadcast):
+        if self._streams.get(bc.key) is bc:
+            del self._streams[bc.key]
+
+    def stats(self) -> dict:
+        return {"streams": len(self._streams), "subscribers": sum(len(b.subscribers) for b in self._streams.values())}
+
+
+HUB = ReplayHub()
@@ -0,0 +1,365 @@
+"""
+Live trades: feed -> per-symbol ring buffer -> incremental candles -> deltas.
+
+Each symbol has one feed task pushing trade batches into a preallocated
+ring buffer and updating the current candle of every live bar size. It
+runs while the symbol has WebSocket subscribers, plus a grace period. A
+WebSocket subscriber holds a cursor (ring sequence number + bar version)
+and is sent only what changed since its last message: the new trades and
+the candles they touched. A slow subscriber just gets a bigger delta; if
+it falls a whole buffer behind, the delta reports the trades it missed.
+
+Latency is measured per trade from ingest (push) to the send of the
+message carrying it.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.config import load_settings
+from app.data.resample import duration_ns
+from app.streaming.feeds import AlpacaFeed, SyntheticFeed, TradeFeed
+
+log = logging.getLogger(__name__)
+
+
+TRADE_DTYPE = np.dtype([
+    ("ts", "<i8"),          # exchange time, epoch ns
+    ("price", "<f8"),
+    ("size", "<f8"),
+    ("ingest", "<i8"),      # time.monotonic_ns() at push
+])
+
+class TradeRing:
+    """
+    The latest `capacity` trades, in a preallocated circular buffer.
+    `seq` counts every trade ever pushed; readers keep the seq they have
+    seen and ask for what came after it.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.buf = np.zeros(capacity, dtype=TRADE_DTYPE)
+        self.seq = 0
+
+    def push(self, trades: np.ndarray):
+        # a batch longer than the buffer still counts whole; only its last `capacity` trades are kept
+        total = len(trades)
+        trades = trades[-self.capacity:]
+        n = len(trades)
+        start = (self.seq + total - n) % self.capacity
+        first = min(n, self.capacity - start)
+        self.buf[start:start + first] = trades[:first]
+        self.buf[:n - first] = trades[first:]
+        self.seq += total
+
+    def since(self, seq: int) -> tuple[np.ndarray, int]:
+        """(copy of the trades after `seq`, number of trades already overwritten)."""
+        lo = max(seq, self.seq - self.capacity)
+        a, b = lo % self.capacity, self.seq % self.capacity
+        if lo == self.seq:
+            out = self.buf[:0].copy()
+        elif a < b:
+            out = self.buf[a:b].copy()
+        else:
+            out = np.concatenate([self.buf[a:], self.buf[:b]])
+        return out, lo - seq
+
+
+@dataclass
+class Candle:
+    start: int          # bucket start, epoch ns
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float = 0.0
+    count: int = 0
+    pv: float = 0.0     # sum(price * size), for vwap
+
+    def to_dict(self, bar_size: str, final: bool) -> dict:
+        return {
+            "size": bar_size,
+            "t": self.start // 1_000_000,
+            "o": self.open,
+            "h": self.high,
+            "l": self.low,
+            "c": self.close,
+            "v": self.volume,
+            "n": self.count,
+            "vwap": self.pv / self.volume if self.volume else self.close,
+            "final": final,
+        }
+
+
+def candle_bar(candle: dict) -> dict:
+    # Candle.to_dict() -> the bar fields the indicator engine reads
+    return {
+        "time": candle["t"],
+        "open": candle["o"],
+        "high": candle["h"],
+        "low": candle["l"],
+        "close": candle["c"],
+        "volume": candle["v"],
+        "vwap": candle["vwap"],
+    }
+
+
+class BarBuilder:
+    """
+    Current candle per bar size, updated with each batch of trades (sorted
+    by time). Trades older than the current candle are counted in `late`
+    and left out of the candles.
+    """
+
+    def __init__(self, bar_sizes: tuple[str, ...] = ("1m", "5m")):
+        self.steps = {s: duration_ns(s) for s in bar_sizes}
+        self.current: dict[str, Candle | None] = {s: None for s in bar_sizes}
+        self.late = 0
+
+    def update(self, ts: np.ndarray, price: np.ndarray, size: np.ndarray) -> list[dict]:
+        """Fold trades in; returns the candles that were closed or changed."""
+        out = []
+        for bar_size, step in self.steps.items():
+            cur = self.current[bar_size]
+            buckets = ts - ts % step
+            keep = buckets >= cur.start if cur is not None else slice(None)
+            if cur is not None and not keep.all():
+                self.late += int((~keep).sum())
+                buckets, p, s = buckets[keep], price[keep], size[keep]
+            else:
+                p, s = price, size
+            if not len(buckets):
+                continue
+
+            # one segment per bucket in the batch (usually one)
+            cuts = np.flatnonzero(np.diff(buckets)) + 1
+            starts = np.concatenate([[0], cuts])
+            ends = np.concatenate([cuts, [len(buckets)]])
+            highs = np.maximum.reduceat(p, starts)
+            lows = np.minimum.reduceat(p, starts)
+            vols = np.add.reduceat(s, starts)
+            pvs = np.add.reduceat(p * s, starts)
+
+            for i, (a, b) in enumerate(zip(starts, ends)):
+                if cur is None or buckets[a] > cur.start:
+                    if cur is not None:
+                        out.append(cur.to_dict(bar_size, final=True))
+                    cur = Candle(int(buckets[a]), float(p[a]), float(p[a]), float(p[a]), float(p[a]))
+                cur.high = max(cur.high, float(highs[i]))
+                cur.low = min(cur.low, float(lows[i]))
+                cur.close = float(p[b - 1])
+                cur.volume += float(vols[i])
+                cur.count += int(b - a)
+                cur.pv += float(pvs[i])
+            self.current[bar_size] = cur
+            out.append(cur.to_dict(bar_size, final=False))
+        return out
+
+
+class LatencyStats:
+    """Rolling window of ingest-to-send latencies (ns)."""
+
+    def __init__(self, window: int = 10_000):
+        self.samples = np.zeros(window, dtype=np.int64)
+        self.n = 0
+
+    def record(self, lat_ns: np.ndarray):
+        lat_ns = lat_ns[-len(self.samples):]
+        idx = (self.n + np.arange(len(lat_ns))) % len(self.samples)
+        self.samples[idx] = lat_ns
+        self.n += len(lat_ns)
+
+    def summary(self) -> dict:
+        s = self.samples[:min(self.n, len(self.samples))]
+        if not len(s):
+            return {"count": 0}
+        p50, p99 = np.percentile(s, [50, 99]) / 1e6
+        return {"count": self.n, "p50_ms": round(p50, 3), "p99_ms": round(p99, 3), "max_ms": round(s.max() / 1e6, 3)}
+
+
+@dataclass
+class Cursor:
+    seq: int            # ring position sent so far
+    version: int        # bar updates sent so far
+
+
+class LiveSymbol:
+    def __init__(self, symbol: str, feed: TradeFeed, capacity: int, bar_sizes: tuple[str, ...]):
+        self.symbol = symbol
+        self.ring = TradeRing(capacity)
+        self.bars = BarBuilder(bar_sizes)
+        self.latency = LatencyStats()
+        self.version = 0
+        self.events: deque[tuple[int, dict]] = deque(maxlen=1024)    # (version, candle)
+        self._changed = asyncio.Event()
+        self.task = asyncio.ensure_future(self._run(feed))
+
+    async def _run(self, feed: TradeFeed):
+        failures = 0
+        while True:
+            try:
+                await feed.run(self.symbol, self.push)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failures += 1
+                delay = min(2 ** failures, 30)
+                log.warning("live feed %s failed (%s), retrying in %ds", self.symbol, e, delay)
+                await asyncio.sleep(delay)
+
+    def push(self, ts: np.ndarray, price: np.ndarray, size: np.ndarray):
+        trades = np.empty(len(ts), dtype=TRADE_DTYPE)
+        trades["ts"], trades["price"], trades["size"] = ts, price, size
+        trades["ingest"] = time.monotonic_ns()
+        trades.sort(order="ts", kind="stable")
+
+        self.ring.push(trades)
+        self.version += 1
+        for candle in self.bars.update(trades["ts"], trades["price"], trades["size"]):
+            self.events.append((self.version, candle))
+
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait(self, cursor: Cursor):
+        while cursor.version == self.version:
+            await self._changed.wait()
+
+    def cursor(self) -> Cursor:
+        return Cursor(self.ring.seq, self.version)
+
+    def snapshot(self, n: int = 1000) -> dict:
+        trades, _ = self.ring.since(self.ring.seq - n)
+        return {
+            "type": "snapshot",
+            "symbol": self.symbol,
+            "trades": _trade_columns(trades),
+            "bars": [c.to_dict(s, final=False) for s, c in self.bars.current.items() if c is not None],
+        }
+
+    def delta(self, cursor: Cursor) -> tuple[dict, np.ndarray]:
+        """Changes since `cursor` (advanced in place) and the ingest times of the trades in it."""
+        trades, missed = self.ring.since(cursor.seq)
+
+        if self.events and self.events[0][0] > cursor.version + 1:
+            # fell behind the event log: resend the current candles instead
+            bars = [c.to_dict(s, final=False) for s, c in self.bars.current.items() if c is not None]
+        else:
+            latest = {}
+            for version, candle in self.events:
+                if version > cursor.version:
+                    latest[(candle["size"], candle["t"])] = candle
+            bars = list(latest.values())
+
+        cursor.seq, cursor.version = self.ring.seq, self.version
+        msg = {"type": "delta", "symbol": self.symbol, "trades": _trade_columns(trades), "bars": bars}
+        if missed:
+            msg["missed"] = missed
+        return msg, trades["ingest"]
+
+    def stats(self) -> dict:
+        return {
+            "trades": self.ring.seq,
+            "buffered": min(self.ring.seq, self.ring.capacity),
+            "late": self.bars.late,
+            "latency": self.latency.summary(),
+        }
+
+
+def _trade_columns(trades: np.ndarray) -> dict:
+    # epoch ms as float (sub-ms precision survives a JS number)
+    return {
+        "t": trades["ts"] / 1e6,
+        "p": np.ascontiguousarray(trades["price"]),
+        "s": np.ascontiguousarray(trades["size"]),
+    }
+
+
+class LiveHub:
+    """
+    Live symbols by name, limited to the configured universe. A symbol's
+    feed starts with its first subscriber and stops `idle` seconds after
+    the last one leaves, freeing its ring buffer. Stats and REST snapshots
+    only read the running symbols.
+    """
+
+    def __init__(
+        self,
+        feed: TradeFeed | None = None,
+        capacity: int | None = None,
+        bar_sizes=("1m", "5m"),
+        symbols: tuple[str, ...] | None = None,
+        idle: float | None = None,
+    ):
+        settings = load_settings()
+        self.feed = feed or _default_feed(settings.live_feed)
+        self.capacity = capacity or settings.live_buffer
+        self.bar_sizes = tuple(bar_sizes)
+        self.symbols = frozenset(symbols if symbols is not None else settings.live_symbols)
+        self.idle = settings.live_idle if idle is None else idle
+        self._symbols: dict[str, LiveSymbol] = {}
+        self._viewers: dict[str, int] = {}
+        self._stops: dict[str, asyncio.TimerHandle] = {}
+
+    def subscribe(self, symbol: str) -> LiveSymbol:
+        """The running symbol, started if needed; pair with unsubscribe()."""
+        if symbol not in self.symbols:
+            raise ValueError(f"Unknown live symbol: {symbol}")
+        stop = self._stops.pop(symbol, None)
+        if stop is not None:
+            stop.cancel()
+        if symbol not in self._symbols:
+            self._symbols[symbol] = LiveSymbol(symbol, self.feed, self.capacity, self.bar_sizes)
+        self._viewers[symbol] = self._viewers.get(symbol, 0) + 1
+        return self._symbols[symbol]
+
+    def unsubscribe(self, symbol: str):
+        self._viewers[symbol] -= 1
+        if self._viewers[symbol] == 0:
+            del self._viewers[symbol]
+            loop = asyncio.get_running_loop()
+            self._stops[symbol] = loop.call_later(self.idle, self._stop, symbol)
+
+    def _stop(self, symbol: str):
+        # idle timer: nobody resubscribed in time
+        del self._stops[symbol]
+        self._symbols.pop(symbol).task.cancel()
+
+    def snapshot(self, symbol: str, n: int = 1000) -> dict:
+        """Snapshot of a running symbol; an empty one if its feed isn't running."""
+        if symbol not in self.symbols:
+            raise ValueError(f"Unknown live symbol: {symbol}")
+        live = self._symbols.get(symbol)
+        if live is None:
+            return {"type": "snapshot", "symbol": symbol, "trades": _trade_columns(np.empty(0, TRADE_DTYPE)), "bars": []}
+        return live.snapshot(n)
+
+    async def close(self):
+        for stop in self._stops.values():
+            stop.cancel()
+        self._stops.clear()
+        tasks = [s.task for s in self._symbols.values()]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._symbols.clear()
+        self._viewers.clear()
+
+    def stats(self) -> dict:
+        return {s: {**live.stats(), "viewers": self._viewers.get(s, 0)} for s, live in self._symbols.items()}
+
+
+def _default_feed(name: str) -> TradeFeed:
+    if name == "alpaca":
+        return AlpacaFeed(os.getenv("APCA_API_KEY_ID"), os.getenv("APCA_API_SECRET_KEY"))
+    return SyntheticFeed()
+
+
+LIVE = LiveHub()
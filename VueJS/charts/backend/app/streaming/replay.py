@@ -0,0 +1,149 @@
+"""
+Replay of historical bars in market time, for the market WebSocket.
+
+Instead of one sleep and one message per bar, a wall-clock tick (`tick`
+seconds) emits every bar whose market time has come as one frame. Frames
+are cut from the clock rather than queued: a frame is only produced after
+the previous one was sent, so when the socket drains slowly the next frame
+simply covers more bars. Past `max_batch` bars the clock is pulled back to
+the last bar sent, so a consumer that can't keep up slows the replay down
+instead of piling up data in memory.
+
+Control messages (JSON) from the client:
+
+    {"action": "pause"} / {"action": "resume"}
+    {"action": "speed", "value": 60}
+    {"action": "seek", "time": "2024-03-01T14:30:00Z"}   (or epoch ms)
+"""
+import asyncio
+import time
+from datetime import datetime
+
+import numpy as np
+import polars as pl
+
+
+class Replay:
+    def __init__(
+        self,
+        df: pl.DataFrame,
+        time_col: str,
+        speed: float = 1.0,
+        tick: float = 0.05,
+        max_batch: int = 5000,
+    ):
+        if speed <= 0:
+            raise ValueError("speed must be positive")
+        self.df = df
+        self.time_col = time_col
+        self.ts = df[time_col].dt.epoch("ns").to_numpy()     # ascending
+        self.speed = speed
+        self.tick = tick
+        self.max_batch = max_batch
+        self.paused = False
+        self.stopped = False
+        self.pos = 0            # next bar to send
+        self._wake = asyncio.Event()
+        self._anchor(int(self.ts[0]) if len(self.ts) else 0)
+
+    # ------------------------------------------------------------------ clock
+
+    def _anchor(self, market_ns: int):
+        self._market0 = market_ns
+        self._wall0 = time.monotonic()
+
+    def now(self) -> int:
+        """Market time (epoch ns) the replay has reached."""
+        if self.paused:
+            return self._market0
+        return self._market0 + int((time.monotonic() - self._wall0) * self.speed * 1e9)
+
+    # --------------------------------------------------------------- controls
+
+    def control(self, msg: dict) -> dict:
+        action = msg.get("action")
+        if action == "pause":
+            if not self.paused:
+                self._anchor(self.now())
+                self.paused = True
+        elif action == "resume":
+            if self.paused:
+                self.paused = False
+                self._anchor(self._market0)
+        elif action == "speed":
+            speed = float(msg["value"])
+            if speed <= 0:
+                raise ValueError("speed must be positive")
+            self._anchor(self.now())
+            self.speed = speed
+        elif action == "seek":
+            target = _parse_time(msg["time"])
+            self.jump(int(np.searchsorted(self.ts, target, "left")), target)
+        else:
+            raise ValueError(f"Unknown action: {action}")
+        self._wake.set()
+        return self.state()
+
+    def jump(self, pos: int, market_ns: int):
+        # continue from bar `pos` with the clock at `market_ns`
+        self.pos = pos
+        self._anchor(market_ns)
+        self._wake.set()
+
+    def state(self) -> dict:
+        return {
+            "paused": self.paused,
+            "speed": self.speed,
+            "time": self.now() // 1_000_000,
+            "position": self.pos,
+            "total": len(self.ts),
+        }
+
+    def stop(self):
+        self.stopped = True
+        self._wake.set()
+
+    # ----------------------------------------------------------------- frames
+
+    async def frames(self):
+        """Yield slices of `df`, in order, as their market time comes."""
+        n = len(self.ts)
+        while not self.stopped and self.pos < n:
+            if self.paused:
+                await self._sleep(None)
+                continue
+
+            now = self.now()
+            end = int(np.searchsorted(self.ts, now, "right"))
+            if end <= self.pos:
+                # nothing due yet: sleep until the next bar (or a control message)
+                await self._sleep((self.ts[self.pos] - now) / self.speed / 1e9)
+                continue
+
+            if end - self.pos > self.max_batch:
+                end = self.pos + self.max_batch
+                self._anchor(int(self.ts[end - 1]))
+
+            frame = self.df.slice(self.pos, end - self.pos)
+            self.pos = end
+            sent = time.monotonic()
+            yield frame
+            # the time the consumer spent sending counts toward the tick
+            await self._sleep(self.tick - (time.monotonic() - sent))
+
+    async def _sleep(self, timeout: float | None):
+        if timeout is not None and timeout <= 0:
+            return
+        self._wake.clear()
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+def _parse_time(value) -> int:
+    # epoch milliseconds or an ISO-8601 string -> epoch ns
+    if isinstance(value, (int, float)):
+        return int(value) * 1_000_000
+    ts = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return pl.Series([ts]).dt.epoch("ns")[0]
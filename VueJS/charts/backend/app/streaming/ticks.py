@@ -1,17 +1,10 @@
-import asyncio
 import polars as pl 
 
-async def stream_ticks(df: pl.DataFrame, speed: float = 1.0):
-    rows = df.iter_rows(named=True)
+from app.streaming.replay import Replay
 
-    prev_ts = None
 
-    for row in rows: 
-        ts = row["timestamp"]
-        if prev_ts is not None:
-            delta = (ts - prev_ts).total_seconds()
-            await asyncio.sleep(max(delta / speed, 0))
-    
-        prev_ts = ts 
-        yield row 
-    
\ No newline at end of file
+async def stream_ticks(df: pl.DataFrame, speed: float = 1.0, time_col: str = "timestamp"):
+    # row at a time on top of the batched replay
+    async for frame in Replay(df, time_col, speed=speed).frames():
+        for row in frame.iter_rows(named=True):
+            yield row
@@ -1,11 +1,70 @@
-from fastapi import APIRouter, WebSocket, Query
+import asyncio
+
+import orjson
+import time
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
 from datetime import datetime
-from app.data.loader import load_ticks
-from app.data.resample import resample_bars
-from app.streaming.ticks import stream_ticks
+from app.data import aio
+from app.data.bars import check_bar_size
+from app.data.calendar import SESSIONS
+from app.data.loader import aload_market
+from app.data.indicators import IndicatorSet, columns
+from app.schemas.tick import MODES, IndicatorSpec
+from pydantic import TypeAdapter, ValidationError
+from app.streaming.hub import HUB, encode
+from app.streaming.live import LIVE, candle_bar
+from app.streaming.replay import Replay
 
 router = APIRouter()
 
+SPECS = TypeAdapter(list[IndicatorSpec])
+
+
+def parse_indicators(raw: str | None) -> list[IndicatorSpec]:
+    # ?indicators=[{"name": "sma", "params": {"period": 20}}, ...]
+    if not raw:
+        return []
+    specs = SPECS.validate_json(raw)
+    columns(specs)      # raises ValueError for unknown names / params
+    return specs
+
+
+async def send(ws: WebSocket, lock: asyncio.Lock, body: str | bytes):
+    async with lock:
+        if isinstance(body, bytes):
+            await ws.send_bytes(body)
+        else:
+            await ws.send_text(body)
+
+
+async def until_disconnect(ws: WebSocket):
+    # for streams where the client sends nothing but a close
+    while (await ws.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+async def read_controls(ws: WebSocket, control, lock: asyncio.Lock, on_close):
+    # pause / resume / seek / speed from the client, acknowledged with the new state
+    try:
+        while True:
+            try:
+                reply = {"type": "state", **control(await ws.receive_json())}
+            except (ValueError, KeyError, TypeError) as e:
+                reply = {"type": "error", "detail": str(e)}
+            async with lock:
+                await ws.send_json(reply)
+    except WebSocketDisconnect:
+        on_close()
+
+
+async def play(ws: WebSocket, lock: asyncio.Lock, replay: Replay, time_col: str, fmt: str, extra: list[str]) -> bool:
+    # private replay: one message per frame, False if it was stopped (client left)
+    async for frame in replay.frames():
+        await send(ws, lock, encode(frame, time_col, fmt, extra=extra))
+    return not replay.stopped
+
+
 @router.websocket("/ws/market/data")
 async def stream_market_data(
     ws: WebSocket,
@@ -13,35 +72,142 @@ async def stream_market_data(
     start_time: datetime = Query(...),
     end_time: datetime = Query(...),
     mode: str = Query("ticks"),
-    bar_size: str | None = Query(None),
-    speed: float = Query(1.0)
+    bar_size: str | None = Query(None),    # 30m, 4h, 1d, 2w, volume:50000, dollar:2e7, tick:1000, ...
+    session: str | None = Query(None),  # rth | extended (bars/trades modes); default: regular hours for 1d+
+    speed: float = Query(1.0),
+    format: str = Query("json"),        # json (columns per frame) | packed (64-byte little-endian bars)
+    indicators: str | None = Query(None),   # JSON list of IndicatorSpec, json format only
+):
+    await ws.accept()
+    try:
+        specs = parse_indicators(indicators)
+        if bar_size:
+            check_bar_size(bar_size, mode)
+    except (ValueError, ValidationError):
+        specs = None
+    if (
+        speed <= 0
+        or mode not in MODES
+        or format not in ("json", "packed")
+        or specs is None
+        or (mode != "ticks" and not bar_size)
+        or session not in (None, *SESSIONS)
+    ):
+        await ws.close(code=1003)
+        return
+    extra = columns(specs)
+    time_col = "timestamp" if mode == "ticks" else "bar"
+
+    # bars from the stored rollups or trades, ticks from the minute partitions.
+    # Loading runs off the event loop, so other sessions keep streaming meanwhile
+    async def load():
+        df, _, _ = await aload_market(
+            symbol, start_time, end_time, mode=mode, bar_size=bar_size, specs=specs, session=session,
+        )
+        return df
+
+    # everyone replaying the same window at the same speed shares one load and clock;
+    # a client that sends a control message continues on a private replay
+    key = (symbol, mode, bar_size, session, start_time, end_time, speed, tuple(extra))
+    sub = HUB.subscribe(key, load, time_col, speed, format, extra)
+    private: Replay | None = None
+
+    def control(msg: dict) -> dict:
+        nonlocal private
+        if private is None:
+            private = sub.detach()
+        return private.control(msg)
+
+    def closed():
+        sub.close()
+        if private is not None:
+            private.stop()
+
+    lock = asyncio.Lock()
+    controls = asyncio.ensure_future(read_controls(ws, control, lock, closed))
+    try:
+        while True:
+            kind, pos, payload = await sub.queue.get()
+            if kind == "snapshot":
+                if payload.height:
+                    body = await asyncio.get_running_loop().run_in_executor(
+                        aio.get_pool(), encode, payload, time_col, format, "snapshot", extra
+                    )
+                    await send(ws, lock, body)
+            elif kind == "frame":
+                await send(ws, lock, payload)
+            elif kind == "end":
+                async with lock:
+                    await ws.send_json({"type": "end", **payload})
+                await ws.close()
+                return
+            elif kind == "error":
+                await ws.close(code=1011, reason=payload[:120])
+                return
+            elif kind == "lagged":
+                await ws.close(code=1013, reason="client too slow")
+                return
+            else:       # detached or closed
+                break
+            sub.pos = pos
+
+        if private is not None and await play(ws, lock, private, time_col, format, extra):
+            async with lock:
+                await ws.send_json({"type": "end", **private.state()})
+            await ws.close()
+    except WebSocketDisconnect:
+        closed()
+    finally:
+        controls.cancel()
+
+
+@router.websocket("/ws/ticks/live")
+async def stream_live_ticks(
+    ws: WebSocket,
+    symbol: str = Query(...),
+    snapshot: int = Query(1000, ge=0, le=LIVE.capacity),     # trades sent on connect (at most the ring)
+    indicators: str | None = Query(None),   # JSON list of IndicatorSpec, added to each candle as "ind"
 ):
     await ws.accept()
-    df = load_ticks(symbol, start_time, end_time)
-    
-    # resample if needed 
-    if mode == "bars":
-        if not bar_size:
-            await ws.close(code=1003)
-            return
-        df = resample_bars(df, bar_size)
-        time_col = "bar"
-    else:
-        time_col = "timestamp"
-    
     try:
-        async for row in stream_ticks(df, speed=speed):
-            await ws.send_json({
-                "timestamp": row[time_col].isoformat(),
-                "open": row["open"],
-                "high": row["high"],
-                "low": row["low"],
-                "close": row["close"],
-                "volume": row["volume"],
-                "trade_count": row["trade_count"],
-                "vwap": row["vwap"],
-            })
-    except Exception as e:
-        raise e
+        specs = parse_indicators(indicators)
+    except (ValueError, ValidationError):
+        await ws.close(code=1003)
+        return
+    try:
+        live = LIVE.subscribe(symbol)
+    except ValueError as e:
+        await ws.close(code=1008, reason=str(e)[:120])
+        return
+    cursor = live.cursor()
+    per_size: dict[str, IndicatorSet] = {}
+
+    def with_indicators(msg: dict) -> dict:
+        # O(1) per candle update; open candles are previewed, closed ones advance the state
+        if specs:
+            msg["bars"] = [
+                {**c, "ind": per_size.setdefault(c["size"], IndicatorSet(specs)).update(candle_bar(c), c["final"])}
+                for c in msg["bars"]
+            ]
+        return msg
+
+    async def pump():
+        msg = with_indicators(live.snapshot(snapshot))
+        await ws.send_text(orjson.dumps(msg, option=orjson.OPT_SERIALIZE_NUMPY).decode())
+        while True:
+            await live.wait(cursor)
+            msg, ingest = live.delta(cursor)
+            msg = with_indicators(msg)
+            await ws.send_text(orjson.dumps(msg, option=orjson.OPT_SERIALIZE_NUMPY).decode())
+            live.latency.record(time.monotonic_ns() - ingest)
+
+    tasks = {asyncio.ensure_future(pump()), asyncio.ensure_future(until_disconnect(ws))}
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for t in done:
+            if not t.cancelled() and not isinstance(t.exception(), WebSocketDisconnect):
+                t.result()
     finally:
-        await ws.close()
\ No newline at end of file
+        for t in tasks:
+            t.cancel()
+        LIVE.unsubscribe(symbol)
@@ -0,0 +1,74 @@
+"""
+Row (per-bar Pydantic) vs columnar (orjson over numpy) response encoding.
+
+    python -m bench.serialize
+"""
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import polars as pl
+
+from app.data.serialize import columns_json
+from app.schemas.tick import MarketResponse, MarketRow
+
+
+def synthetic_bars(n: int) -> pl.DataFrame:
+    rng = np.random.default_rng(0)
+    close = 400 + rng.standard_normal(n).cumsum() * 0.05
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    return pl.DataFrame({
+        "timestamp": pl.datetime_range(start, start + timedelta(minutes=n - 1), "1m", eager=True, time_unit="ns"),
+        "open": close,
+        "high": close + 0.05,
+        "low": close - 0.05,
+        "close": close,
+        "volume": rng.integers(100, 100_000, n).astype(float),
+        "trade_count": rng.integers(1, 1000, n).astype(float),
+        "vwap": close,
+    })
+
+
+def encode_rows(df: pl.DataFrame, meta: dict) -> bytes:
+    rows = [
+        MarketRow(
+            timestamp=row["timestamp"],
+            open=row["open"],
+            high=row["high"],
+            low=row["low"],
+            close=row["close"],
+            volume=row["volume"],
+            trade_count=row["trade_count"],
+            vwap=row["vwap"],
+        )
+        for row in df.iter_rows(named=True)
+    ]
+    resp = MarketResponse(**meta, rows=rows, count=len(rows))
+    # FastAPI re-validates against response_model before dumping
+    return MarketResponse.model_validate(resp.model_dump()).model_dump_json().encode()
+
+
+def timed(fn, *args):
+    t = time.perf_counter()
+    out = fn(*args)
+    return time.perf_counter() - t, len(out)
+
+
+def main():
+    meta = {
+        "symbol": "SPY",
+        "model": "ticks",
+        "bar_size": None,
+        "start_time": datetime(2020, 1, 1, tzinfo=timezone.utc),
+        "end_time": datetime(2022, 1, 1, tzinfo=timezone.utc),
+    }
+    print(f"{'rows':>9} {'row path':>10} {'columns':>10} {'speedup':>8} {'row MB':>8} {'col MB':>8}")
+    for n in (10_000, 100_000, 1_000_000):
+        df = synthetic_bars(n)
+        t_rows, b_rows = timed(encode_rows, df, meta)
+        t_cols, b_cols = timed(columns_json, meta, df, "timestamp")
+        print(f"{n:>9} {t_rows:>9.3f}s {t_cols:>9.3f}s {t_rows / t_cols:>7.0f}x {b_rows / 1e6:>8.1f} {b_cols / 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
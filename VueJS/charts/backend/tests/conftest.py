@@ -0,0 +1,42 @@
+import os
+import shutil
+
+import pytest
+
+from app.data import hot, store
+from app.data.cache import PartitionCache
+from app.data.index import file_etag
+
+
+class LocalStore:
+    """ObjectStore over a local directory."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def head(self, key):
+        path = os.path.join(self.root, key)
+        if not os.path.exists(path):
+            return None
+        st = os.stat(path)
+        return f"{st.st_mtime_ns:x}-{st.st_size:x}", st.st_size
+
+    def read_range(self, key, start, end, etag=None):
+        path = os.path.join(self.root, key)
+        if not os.path.exists(path) or (etag and file_etag(path) != etag):
+            return None
+        with open(path, "rb") as f:
+            f.seek(start)
+            return f.read(end - start), os.path.getsize(path)
+
+    def download(self, key, path):
+        shutil.copyfile(os.path.join(self.root, key), path)
+
+
+@pytest.fixture
+def serve(tmp_path, monkeypatch):
+    """serve(root): read partitions from the local directory `root`, through a fresh cache and hot tier."""
+    def install(root: str):
+        monkeypatch.setattr(store, "_cache", PartitionCache(LocalStore(root), str(tmp_path / "cache"), 1 << 30))
+        monkeypatch.setattr(hot, "_hot", hot.HotStore(str(tmp_path / "hot")))
+    return install
@@ -0,0 +1,102 @@
+"""
+Backfill end to end with the fake source: everything lands once, a rerun
+resumes from the checkpoint, and throttled requests are retried.
+"""
+import time
+from datetime import datetime, timedelta, timezone
+
+import polars as pl
+import pytest
+
+from app.data import loader
+from app.data.resample import resample_bars
+from app.ingest.download import FakeSource, RateLimiter, backfill
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+START, END = utc(2024, 1, 1), utc(2024, 2, 15)
+SYMBOLS = ["SPY", "QQQ"]
+
+
+def run(tmp_path, source, **kwargs):
+    kwargs = {"chunk": timedelta(days=7), "workers": 4, "per_minute": 60_000, **kwargs}
+    return backfill(source, SYMBOLS, START, END, str(tmp_path / "data"), checkpoint=str(tmp_path / "checkpoint.json"), **kwargs)
+
+
+def assert_stored(tmp_path, serve):
+    serve(str(tmp_path / "data"))
+    for symbol in SYMBOLS:
+        want = FakeSource().fetch_bars(symbol, START, END)
+        got = loader.load_bars(symbol, START, END, "1m")
+        assert got["bar"].to_list() == want["timestamp"].to_list()
+        assert got["close"].to_list() == want["close"].to_list()
+        daily = loader.load_bars(symbol, START, END, "1d")
+        assert daily["close"].to_list() == resample_bars(want, "1d")["close"].to_list()
+
+
+class FlakySource(FakeSource):
+    """Fails the chunks starting on the given days; counts every fetch."""
+
+    def __init__(self, failing=()):
+        super().__init__()
+        self.failing = set(failing)
+        self.fetched = []
+
+    def fetch_bars(self, symbol, start, end):
+        self.fetched.append((symbol, start))
+        if start in self.failing:
+            raise ConnectionError("connection reset")
+        return super().fetch_bars(symbol, start, end)
+
+
+def test_backfill_stores_every_chunk(tmp_path, serve):
+    stats = run(tmp_path, FakeSource())
+
+    assert stats["chunks"] == 2 * 7 and stats["failed"] == [] and stats["retries"] == 0
+    assert stats["rows"] == sum(FakeSource().fetch_bars(s, START, END).height for s in SYMBOLS)
+    assert_stored(tmp_path, serve)
+
+
+def test_rerun_resumes_from_the_checkpoint(tmp_path, serve):
+    broken = utc(2024, 1, 15)
+    first = run(tmp_path, FlakySource(failing=[broken]))
+    assert sorted(first["failed"]) == [f"{s}/{broken.isoformat()}/{(broken + timedelta(days=7)).isoformat()}" for s in sorted(SYMBOLS)]
+
+    source = FlakySource()
+    second = run(tmp_path, source)
+    assert sorted(source.fetched) == [(s, broken) for s in sorted(SYMBOLS)]
+    assert second["failed"] == [] and second["chunks"] == 2
+    assert first["rows"] + second["rows"] == sum(FakeSource().fetch_bars(s, START, END).height for s in SYMBOLS)
+    assert_stored(tmp_path, serve)
+
+    assert run(tmp_path, FlakySource())["chunks"] == 0
+
+
+def test_throttled_requests_are_retried(tmp_path, serve):
+    source = FakeSource(throttle_every=3)
+    stats = run(tmp_path, source)
+
+    assert stats["failed"] == [] and stats["retries"] > 0
+    assert source.calls == stats["chunks"] + stats["retries"]
+    assert_stored(tmp_path, serve)
+
+
+def test_throttling_past_max_retries_fails_the_chunk(tmp_path):
+    stats = run(tmp_path, FakeSource(throttle_every=1), max_retries=2, workers=1)
+    assert len(stats["failed"]) == stats["chunks"] and stats["rows"] == 0
+
+
+def test_rate_limiter_spaces_requests_and_cools_down():
+    limiter = RateLimiter(per_minute=1200)             # one every 50 ms
+    t = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+    assert time.monotonic() - t == pytest.approx(0.2, abs=0.05)
+
+    limiter.cooldown(0.3)
+    t = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - t == pytest.approx(0.3, abs=0.05)
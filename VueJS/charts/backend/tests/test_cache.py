@@ -0,0 +1,68 @@
+"""
+Partition cache: leased files outlive eviction and upstream changes until
+their last reader is done, and are deleted then.
+"""
+import os
+
+import pytest
+
+from app.data.cache import PartitionCache
+from conftest import LocalStore
+
+
+@pytest.fixture
+def bucket(tmp_path):
+    root = tmp_path / "bucket"
+    root.mkdir()
+    for name in ("a", "b", "c"):
+        (root / name).write_bytes(name.encode() * 100)
+    return root
+
+
+def cache_files(cache: PartitionCache) -> set[str]:
+    return {n for n in os.listdir(cache.root) if n.endswith(".parquet")}
+
+
+def test_object_deleted_upstream_while_leased(bucket, tmp_path):
+    cache = PartitionCache(LocalStore(str(bucket)), str(tmp_path / "cache"), 1 << 20, ttl=0)
+    with cache.fetch(["a"]) as (path,):
+        os.remove(bucket / "a")
+        with cache.fetch(["a"]) as gone:
+            assert gone == []
+        assert os.path.exists(path) and cache.stats()["files"] == 0
+    assert not os.path.exists(path) and cache_files(cache) == set()
+
+
+def test_object_rewritten_upstream_while_leased(bucket, tmp_path):
+    cache = PartitionCache(LocalStore(str(bucket)), str(tmp_path / "cache"), 1 << 20, ttl=0)
+    with cache.fetch(["a"]) as (old,):
+        (bucket / "a").write_bytes(b"new" * 50)
+        os.utime(bucket / "a", ns=(1, 1))
+        with cache.fetch(["a"]) as (new,):
+            assert new != old and open(new, "rb").read() == b"new" * 50
+            assert open(old, "rb").read() == b"a" * 100      # the first reader still sees its copy
+    assert cache_files(cache) == {os.path.basename(new)}
+
+
+def test_eviction_waits_for_the_lease(bucket, tmp_path):
+    cache = PartitionCache(LocalStore(str(bucket)), str(tmp_path / "cache"), 250)
+    with cache.fetch(["a"]) as (a,):
+        with cache.fetch(["b", "c"]):
+            pass
+        assert os.path.exists(a) and cache.stats()["bytes"] <= 250 + 100
+    assert cache.stats()["bytes"] <= 250
+    assert len(cache_files(cache)) == cache.stats()["files"] == 2
+
+
+def test_redownload_under_the_same_name_is_kept(bucket, tmp_path):
+    cache = PartitionCache(LocalStore(str(bucket)), str(tmp_path / "cache"), 1 << 20, ttl=0)
+    with cache.fetch(["a"]) as (path,):
+        stat = os.stat(bucket / "a")
+        os.rename(bucket / "a", bucket / "a.away")
+        with cache.fetch(["a"]):
+            pass                                    # dropped while leased
+        os.rename(bucket / "a.away", bucket / "a")
+        os.utime(bucket / "a", ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        with cache.fetch(["a"]) as (again,):
+            assert again == path                    # same key and etag: same file name
+    assert os.path.exists(path) and cache.has("a")
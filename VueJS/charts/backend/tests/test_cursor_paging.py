@@ -0,0 +1,95 @@
+"""
+Paging back with cursors must give the same bars as one request for the
+whole window, whatever the bar size: the next page ends where the oldest
+bar of the previous one starts.
+"""
+import math
+from datetime import datetime, timezone
+
+import polars as pl
+import pytest
+
+from app.data import loader, rollup
+from app.data.cursor import decode_cursor, next_cursor, page_end
+from app.data.index import write_partition
+from app.data.partitions import partition_key
+from app.ingest.download import FakeSource
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+START, END = utc(2024, 1, 2), utc(2024, 1, 31)
+
+
+@pytest.fixture(scope="module")
+def bucket(tmp_path_factory):
+    root = str(tmp_path_factory.mktemp("bucket"))
+    minutes = FakeSource().fetch_bars("SPY", utc(2024, 1, 1), utc(2024, 2, 1))
+    # late post-market: 19:00-20:00 New York is past midnight UTC in winter
+    late = minutes.filter(pl.col("timestamp").dt.hour() >= 22).with_columns(pl.col("timestamp").dt.offset_by("2h"))
+    minutes = pl.concat([minutes, late]).sort("timestamp")
+    write_partition(minutes, root, partition_key("SPY", 2024, 1))
+    rollup.run(root, "SPY")
+    return root
+
+
+@pytest.fixture(autouse=True)
+def local_cache(bucket, serve):
+    serve(bucket)
+
+
+def paged(mode, bar_size, session, limit, specs=None):
+    pages, end = [], END
+    while True:
+        df, time_col, _ = loader.load_market("SPY", START, end, mode, bar_size, limit, specs=specs, session=session)
+        pages.insert(0, df)
+        token = next_cursor("SPY", mode, bar_size, session, df[time_col], limit)
+        if token is None:
+            return pl.concat(pages)
+        end = page_end(END, decode_cursor(token, "SPY", mode, bar_size, session))
+
+
+@pytest.mark.parametrize("bar_size,session,limit", [
+    ("1d", "extended", 4),
+    ("1d", None, 4),
+    ("1w", "extended", 2),
+    ("30m", "extended", 50),
+    ("30m", None, 50),
+    ("volume:2000000", None, 40),
+    ("tick:20000", "extended", 40),
+])
+def test_pages_match_single_request(bar_size, session, limit):
+    whole, _, _ = loader.load_market("SPY", START, END, "bars", bar_size, session=session)
+    pages = paged("bars", bar_size, session, limit)
+
+    assert whole.height > 2 * limit
+    assert pages["bar"].to_list() == whole["bar"].to_list()
+    for col in ("open", "high", "low", "close", "volume", "vwap"):
+        assert all(math.isclose(a, b, rel_tol=1e-9) for a, b in zip(pages[col], whole[col])), col
+
+
+@pytest.mark.parametrize("bar_size,session", [("5m", None), ("30m", "extended"), ("1h", "rth")])
+def test_indicators_of_a_page_match_the_whole_window(bar_size, session):
+    # session VWAPs warm up from the start of the first bar's day, SMAs from period - 1 bars
+    specs = [("vwap_bands", {"k": 2.0}), ("sma", {"period": 20, "source": "close"})]
+    whole, _, cols = loader.load_market("SPY", START, END, "bars", bar_size, specs=specs, session=session)
+
+    limited, _, _ = loader.load_market("SPY", START, END, "bars", bar_size, 10, specs=specs, session=session)
+    pages = paged("bars", bar_size, session, 50, specs)
+
+    for got in (limited, pages):
+        want = whole.tail(got.height)
+        for col in cols:
+            assert all(a == b or math.isclose(a, b, rel_tol=1e-9) for a, b in zip(got[col], want[col])), col
+
+
+def test_daily_cursor_is_the_session_open():
+    day = datetime(2024, 1, 8).date()
+    for session, opens in ((None, utc(2024, 1, 8, 14, 30)), ("rth", utc(2024, 1, 8, 14, 30)), ("extended", utc(2024, 1, 8, 9))):
+        token = next_cursor("SPY", "bars", "1d", session, pl.Series([day]), 1)
+        assert decode_cursor(token, "SPY", "bars", "1d", session) == opens
+    # a month bucket starting on a holiday opens on the next trading day
+    token = next_cursor("SPY", "bars", "1mo", None, pl.Series([datetime(2024, 1, 1).date()]), 1)
+    assert decode_cursor(token, "SPY", "bars", "1mo", None) == utc(2024, 1, 2, 14, 30)
@@ -0,0 +1,134 @@
+"""
+Hot tier: reads through the memory-mapped files give the same rows and
+bars as the parquet partitions, and fall back to them when a file is
+missing, replaced or ends before the window.
+"""
+import math
+import os
+from datetime import datetime, timezone
+
+import polars as pl
+import pytest
+
+from app.data import hot, loader, rollup
+from app.data.index import write_partition
+from app.data.partitions import partition_key
+from app.ingest.download import FakeSource
+
+SYMBOLS = ["SPY", "QQQ"]
+START, UNTIL = datetime(2024, 1, 1, tzinfo=timezone.utc), datetime(2024, 2, 15, tzinfo=timezone.utc)
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.fixture(scope="module")
+def bucket(tmp_path_factory):
+    root = str(tmp_path_factory.mktemp("bucket"))
+    for symbol in SYMBOLS:
+        minutes = FakeSource().fetch_bars(symbol, START, utc(2024, 4, 1))
+        keyed = minutes.with_columns(pl.col("timestamp").dt.month().alias("_m"))
+        for (month,), part in keyed.partition_by(["_m"], as_dict=True).items():
+            write_partition(part.drop("_m"), root, partition_key(symbol, 2024, month))
+        rollup.run(root, symbol)
+    return root
+
+
+@pytest.fixture
+def hot_dir(bucket, serve):
+    serve(bucket)
+    return hot.get_hot().root
+
+
+def assert_same(got: pl.DataFrame, want: pl.DataFrame):
+    assert got.columns == want.columns
+    assert got.height == want.height
+    for col in got.columns:
+        if got[col].dtype.is_float():
+            assert all(math.isclose(a, b, rel_tol=1e-12) for a, b in zip(got[col], want[col])), col
+        else:
+            assert got[col].to_list() == want[col].to_list(), col
+
+
+WINDOWS = [
+    (utc(2024, 1, 3, 15), utc(2024, 2, 7, 18)),          # all before `until`
+    (utc(2024, 1, 29, 14, 7), utc(2024, 3, 4, 15, 33)),  # across it
+    (utc(2024, 2, 20), utc(2024, 3, 20)),                # after it
+]
+
+
+def cold_and_hot(hot_dir, read):
+    cold = read()
+    written = hot.build(hot_dir, "SPY", UNTIL, START)
+    assert set(written) == set(hot.TIERS)
+    assert hot.get_hot().get("SPY", "1m") is not None
+    return cold, read()
+
+
+@pytest.mark.parametrize("start,end", WINDOWS)
+def test_bars_match_the_partitions(hot_dir, start, end):
+    sizes = [("1m", None), ("5m", None), ("1h", "extended"), ("4h", "rth"), ("1d", None), ("1w", "extended"), ("volume:3000000", None)]
+
+    def read():
+        return [loader.load_bars("SPY", start, end, b, session=s) for b, s in sizes] + [
+            loader.load_bars("SPY", start, end, "15m", limit=40),
+            loader.load_bars_multi(SYMBOLS, start, end, "1h"),
+            loader.load_bars_multi(SYMBOLS, start, end, "1d", session="extended"),
+        ]
+
+    cold, warm = cold_and_hot(hot_dir, read)
+    for got, want in zip(warm, cold):
+        assert want.height
+        assert_same(got, want)
+
+
+@pytest.mark.parametrize("start,end", WINDOWS)
+@pytest.mark.parametrize("limit,descending", [(None, False), (500, False), (500, True), (100_000, True)])
+def test_ticks_match_the_partitions(hot_dir, start, end, limit, descending):
+    cold, warm = cold_and_hot(hot_dir, lambda: loader.load_ticks("SPY", start, end, limit=limit, descending=descending))
+    assert_same(warm, cold)
+
+
+def test_slice_is_zero_copy_window(hot_dir):
+    hot.build(hot_dir, "SPY", UNTIL, START)
+    f = hot.get_hot().get("SPY", "1m")
+    assert f.symbol == "SPY" and f.until == UNTIL
+    assert f.ts[-1] < int(UNTIL.timestamp()) * 10**9
+
+    start, end = utc(2024, 1, 10, 14), utc(2024, 1, 10, 15)
+    df = f.slice(start, end)
+    assert df["timestamp"].min() == start and df["timestamp"].max() == end and df.height == 61
+    assert f.slice(start, end, limit=5)["timestamp"].to_list() == df["timestamp"].head(5).to_list()
+    assert f.slice(start, end, limit=5, descending=True)["timestamp"].to_list() == df["timestamp"].tail(5).reverse().to_list()
+
+
+def test_missing_file_falls_back_to_the_partitions(hot_dir):
+    start, end = utc(2024, 1, 3), utc(2024, 1, 20)
+    hot.build(hot_dir, "SPY", UNTIL, START)
+    store = hot.get_hot()
+    assert store.get("SPY", "1m") is not None and store.stats()["files"] == 1
+
+    os.remove(os.path.join(hot_dir, hot.hot_key("SPY", "1m")))
+    assert store.get("SPY", "1m") is None and store.stats()["files"] == 0
+    got = loader.load_ticks("SPY", start, end, limit=None, descending=False)
+    assert got["timestamp"].to_list() == FakeSource().fetch_bars("SPY", start, end)["timestamp"].to_list()
+
+
+def test_replaced_file_is_reopened(hot_dir):
+    hot.build(hot_dir, "SPY", utc(2024, 1, 15), START)
+    first = hot.get_hot().get("SPY", "1m")
+    assert hot.get_hot().get("SPY", "1m") is first
+
+    hot.build(hot_dir, "SPY", UNTIL, START)
+    second = hot.get_hot().get("SPY", "1m")
+    assert second is not first and second.until == UNTIL
+
+
+def test_window_after_until_reads_the_partitions(hot_dir, monkeypatch):
+    hot.build(hot_dir, "SPY", UNTIL, START)
+    sliced = []
+    monkeypatch.setattr(hot.HotFile, "slice", lambda self, *a, **k: sliced.append(a) or pl.DataFrame())
+
+    df = loader.load_bars("SPY", utc(2024, 3, 1), utc(2024, 3, 8), "30m")
+    assert df.height and not sliced
@@ -0,0 +1,115 @@
+"""
+Append-only minute partitions: appends, compaction and purge, and manifest
+updates from several writers at once.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import polars as pl
+
+from app.ingest.download import FakeSource
+from app.ingest.store import PartitionStore
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def minutes(start: datetime, hours: int = 1) -> pl.DataFrame:
+    return FakeSource().fetch_bars("SPY", start, start + timedelta(hours=hours))
+
+
+def test_append_publishes_one_delta_per_month(tmp_path):
+    store = PartitionStore(str(tmp_path), "SPY")
+    df = pl.concat([minutes(utc(2024, 1, 31, 14)), minutes(utc(2024, 2, 1, 14))])
+
+    keys = store.append(df)
+
+    assert len(keys) == 2 and all("/delta-" in k for k in keys)
+    assert store.files("2024-01") == [keys[0]] and store.files("2024-02") == [keys[1]]
+    assert store.read_month("2024-01").height + store.read_month("2024-02").height == df.height
+    assert store.snapshot()["version"] == 1
+
+
+def test_compact_merges_and_later_rows_win(tmp_path):
+    store = PartitionStore(str(tmp_path), "SPY", grace=0)
+    first = minutes(utc(2024, 1, 2, 14))
+    store.append(first)
+    store.append(first.with_columns(pl.col("close") + 1))           # same minutes, newer values
+    store.append(minutes(utc(2024, 1, 3, 14)))
+
+    assert store.pending() == ["2024-01"]
+    base = store.compact("2024-01")
+
+    assert store.files("2024-01") == [base]
+    merged = store.read_month("2024-01")
+    assert merged.height == 2 * first.height
+    assert merged.filter(pl.col("timestamp") < utc(2024, 1, 3))["close"].to_list() == (first["close"] + 1).to_list()
+    assert store.pending() == []
+
+
+def test_purge_removes_retired_files_after_grace(tmp_path):
+    store = PartitionStore(str(tmp_path), "SPY", grace=3600)
+    old = store.append(minutes(utc(2024, 1, 2, 14))) + store.append(minutes(utc(2024, 1, 3, 14)))
+    store.compact("2024-01")
+
+    assert store.purge() == 0                       # still inside the grace period
+    assert all(os.path.exists(tmp_path / k) for k in old)
+
+    store.grace = 0
+    assert store.purge() == 2
+    assert not any(os.path.exists(tmp_path / k) or os.path.exists(tmp_path / f"{k}.idx") for k in old)
+    assert store.snapshot()["retired"] == []
+    assert store.read_month("2024-01").height == 2 * 60
+
+
+def test_append_during_compaction_publish_is_kept(tmp_path):
+    # two instances share no in-process lock, like the compactor CLI and a writer process
+    compactor = PartitionStore(str(tmp_path), "SPY")
+    writer = PartitionStore(str(tmp_path), "SPY")
+    writer.append(minutes(utc(2024, 1, 2, 14)))
+    writer.append(minutes(utc(2024, 1, 3, 14)))
+
+    late = minutes(utc(2024, 1, 4, 14))
+    appended = []
+    racer = threading.Thread(target=lambda: appended.extend(writer.append(late)))
+    publish = compactor._write
+
+    def racing_write(manifest):
+        # the writer tries to publish between the compactor's final read and its write
+        racer.start()
+        time.sleep(0.2)
+        publish(manifest)
+
+    compactor._write = racing_write
+    base = compactor.compact("2024-01")
+    racer.join()
+
+    assert writer.files("2024-01") == [base, *appended]
+    assert writer.read_month("2024-01").height == 3 * 60
+
+
+def _append_days(root: str, day: int, n: int):
+    store = PartitionStore(root, "SPY")
+    for i in range(n):
+        store.append(minutes(utc(2024, 1, day, 9 + i)))
+
+
+def test_concurrent_processes_lose_no_deltas(tmp_path):
+    root = str(tmp_path)
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_append_days, args=(root, day, 8)) for day in (2, 3)]
+    for p in procs:
+        p.start()
+    store = PartitionStore(root, "SPY")
+    while any(p.is_alive() for p in procs):
+        if store.files("2024-01"):
+            store.compact("2024-01")
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+
+    assert store.read_month("2024-01").height == 2 * 8 * 60
@@ -0,0 +1,133 @@
+"""
+Live trades: the ring buffer, the candles built from it and the deltas
+sent to subscribers.
+"""
+import asyncio
+
+import numpy as np
+
+from app.streaming.live import TRADE_DTYPE, BarBuilder, Cursor, LiveSymbol, TradeRing
+
+
+def trades(first: int, n: int) -> np.ndarray:
+    out = np.zeros(n, dtype=TRADE_DTYPE)
+    out["ts"] = np.arange(first, first + n)
+    return out
+
+
+def test_ring_counts_a_batch_longer_than_the_buffer():
+    ring = TradeRing(4)
+    ring.push(trades(0, 1))
+    ring.push(trades(1, 6))
+
+    assert ring.seq == 7
+    out, missed = ring.since(0)
+    assert out["ts"].tolist() == [3, 4, 5, 6] and missed == 3
+    out, missed = ring.since(5)
+    assert out["ts"].tolist() == [5, 6] and missed == 0
+
+    ring.push(trades(7, 1))
+    assert ring.since(7)[0]["ts"].tolist() == [7]
+    assert ring.since(4)[0]["ts"].tolist() == [4, 5, 6, 7]
+
+
+MINUTE = 60 * 10**9
+T0 = 1_706_000_000 * 10**9 - 1_706_000_000 * 10**9 % (5 * MINUTE)     # a 5m bucket start
+
+
+def test_bar_builder_closes_and_updates_candles():
+    bars = BarBuilder(("1m", "5m"))
+    ts = np.array([T0, T0 + 10**9, T0 + MINUTE + 5])
+    out = bars.update(ts, np.array([10.0, 12.0, 11.0]), np.array([1.0, 3.0, 2.0]))
+
+    closed = [c for c in out if c["final"]]
+    assert [(c["size"], c["t"]) for c in closed] == [("1m", T0 // 10**6)]
+    assert closed[0] | {"vwap": 0} == {
+        "size": "1m", "t": T0 // 10**6, "o": 10.0, "h": 12.0, "l": 10.0, "c": 12.0,
+        "v": 4.0, "n": 2, "vwap": 0, "final": True,
+    }
+    assert closed[0]["vwap"] == (10.0 + 36.0) / 4
+    five = bars.current["5m"]
+    assert (five.open, five.high, five.low, five.close, five.volume, five.count) == (10.0, 12.0, 10.0, 11.0, 6.0, 3)
+
+    # a trade before the open 1m candle is late: counted, not folded in
+    out = bars.update(np.array([T0 + 30 * 10**9]), np.array([99.0]), np.array([1.0]))
+    assert bars.late == 1
+    assert [c["size"] for c in out] == ["5m"] and out[0]["h"] == 99.0
+    assert bars.current["1m"].high == 11.0
+
+
+class ManualFeed:
+    """Feed whose trades the test pushes by hand."""
+
+    def __init__(self):
+        self.push = {}
+
+    async def run(self, symbol, push):
+        self.push[symbol] = push
+        await asyncio.Event().wait()
+
+
+def push(live, ts, price=10.0, size=1.0):
+    ts = np.asarray(ts, dtype=np.int64)
+    live.push(ts, np.full(len(ts), price), np.full(len(ts), size))
+
+
+def test_delta_sends_only_what_changed():
+    async def main():
+        live = LiveSymbol("SPY", ManualFeed(), capacity=8, bar_sizes=("1m",))
+        push(live, [T0, T0 + 1])
+        cursor = live.cursor()
+        assert cursor == Cursor(2, 1)
+
+        push(live, [T0 + 2, T0 + MINUTE])
+        msg, ingest = live.delta(cursor)
+        assert msg["trades"]["t"].tolist() == [(T0 + 2) / 1e6, (T0 + MINUTE) / 1e6]
+        assert [(c["t"], c["final"]) for c in msg["bars"]] == [(T0 // 10**6, True), ((T0 + MINUTE) // 10**6, False)]
+        assert len(ingest) == 2 and "missed" not in msg
+        assert cursor == live.cursor()
+
+        msg, _ = live.delta(cursor)
+        assert len(msg["trades"]["t"]) == 0 and msg["bars"] == []
+
+        # a subscriber that falls a whole buffer behind is told how many trades it missed
+        push(live, T0 + MINUTE + np.arange(1, 11))
+        msg, _ = live.delta(cursor)
+        assert len(msg["trades"]["t"]) == 8 and msg["missed"] == 2
+
+        snap = live.snapshot(3)
+        assert snap["type"] == "snapshot" and snap["trades"]["t"].tolist() == [(T0 + MINUTE + i) / 1e6 for i in (8, 9, 10)]
+        assert [c["t"] for c in snap["bars"]] == [(T0 + MINUTE) // 10**6]
+        live.task.cancel()
+
+    asyncio.run(main())
+
+
+def test_delta_resends_current_candles_after_the_event_log_wrapped():
+    async def main():
+        live = LiveSymbol("SPY", ManualFeed(), capacity=4, bar_sizes=("1m",))
+        push(live, [T0])
+        cursor = live.cursor()
+        for i in range(1, live.events.maxlen + 2):
+            push(live, [T0 + i * MINUTE])
+        msg, _ = live.delta(cursor)
+        assert msg["bars"] == [live.bars.current["1m"].to_dict("1m", final=False)]
+        live.task.cancel()
+
+    asyncio.run(main())
+
+
+def test_wait_returns_on_the_next_push():
+    async def main():
+        feed = ManualFeed()
+        live = LiveSymbol("SPY", feed, capacity=4, bar_sizes=("1m",))
+        await asyncio.sleep(0)
+        cursor = live.cursor()
+        waiter = asyncio.ensure_future(live.wait(cursor))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        feed.push["SPY"](np.array([T0]), np.array([10.0]), np.array([1.0]))
+        await asyncio.wait_for(waiter, 1)
+        live.task.cancel()
+
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+"""
+POST /market/data: cached, ETagged bodies in every format, 304s for
+If-None-Match, and cache lifetimes by month.
+"""
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.data import responses, rollup
+from app.data.index import write_partition
+from app.data.partitions import partition_key
+from app.data.responses import ResponseCache
+from app.ingest.download import FakeSource
+from app.routes import market
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.fixture(scope="module")
+def bucket(tmp_path_factory):
+    root = str(tmp_path_factory.mktemp("bucket"))
+    write_partition(FakeSource().fetch_bars("SPY", utc(2024, 1, 1), utc(2024, 2, 1)), root, partition_key("SPY", 2024, 1))
+    rollup.run(root, "SPY")
+    return root
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResponseCache(1 << 26, ttl=30)
+    monkeypatch.setattr(responses, "_responses", cache)
+    return cache
+
+
+@pytest.fixture
+def client(bucket, serve, cache):
+    serve(bucket)
+    app = FastAPI()
+    app.include_router(market.router, prefix="/market")
+    return TestClient(app)
+
+
+QUERY = {"symbol": "SPY", "start_time": "2024-01-02T00:00:00Z", "end_time": "2024-01-10T00:00:00Z", "bar_size": "30m"}
+
+
+@pytest.mark.parametrize("fmt", ["rows", "columns", "arrow", "packed"])
+def test_repeat_query_is_served_from_cache_with_304(client, cache, fmt):
+    first = client.post(f"/market/market/data?format={fmt}", json=QUERY)
+    assert first.status_code == 200 and first.headers["ETag"]
+    assert cache.stats()["entries"] == 1
+
+    again = client.post(f"/market/market/data?format={fmt}", json=QUERY)
+    assert again.content == first.content and again.headers["ETag"] == first.headers["ETag"]
+    assert cache.stats()["hits"] == 1
+
+    etag = first.headers["ETag"]
+    for header in (etag, f'"other", W/{etag}', "*"):
+        r = client.post(f"/market/market/data?format={fmt}", json=QUERY, headers={"If-None-Match": header})
+        assert r.status_code == 304 and r.content == b"" and r.headers["ETag"] == etag
+    r = client.post(f"/market/market/data?format={fmt}", json=QUERY, headers={"If-None-Match": '"other"'})
+    assert r.status_code == 200 and r.content == first.content
+
+
+def test_rows_format_body(client):
+    body = client.post("/market/market/data?format=rows", json={**QUERY, "limit": 3}).json()
+    assert body["count"] == 3 and len(body["rows"]) == 3
+    assert body["rows"][-1]["timestamp"].startswith("2024-01-09T23:30:00")
+    assert body["next_cursor"]
+
+
+def test_different_queries_and_formats_are_different_entries(client, cache):
+    client.post("/market/market/data?format=rows", json=QUERY)
+    client.post("/market/market/data?format=columns", json=QUERY)
+    client.post("/market/market/data?format=rows", json={**QUERY, "bar_size": "1h"})
+    assert cache.stats()["entries"] == 3 and cache.stats()["hits"] == 0
+
+
+def test_streamed_responses_are_not_cached_or_tagged(client, cache, monkeypatch):
+    whole = client.post("/market/market/data?format=columns", json=QUERY)
+    cache.clear()
+    monkeypatch.setattr(market, "BATCH_ROWS", 10)
+
+    streamed = client.post("/market/market/data?format=columns", json=QUERY)
+    assert streamed.status_code == 200 and "ETag" not in streamed.headers
+    assert streamed.json() == whole.json()
+    assert cache.stats()["entries"] == 0
+
+
+def test_lifetime_by_current_month():
+    cache = ResponseCache(1 << 20, ttl=30)
+    now = datetime.now(timezone.utc)
+    month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    assert cache.lifetime(month - timedelta(microseconds=1)) is None            # finished history
+    assert cache.lifetime(month) == 30
+    assert cache.lifetime(now + timedelta(days=40)) == 30
+    assert cache.lifetime((month - timedelta(hours=1)).replace(tzinfo=None)) is None   # naive = UTC
+
+
+def test_current_month_entries_expire():
+    cache = ResponseCache(1 << 20, ttl=0.05)
+    now = datetime.now(timezone.utc)
+    cache.put("old", b"a", "application/json", now.replace(day=1) - timedelta(days=1))
+    cache.put("new", b"b", "application/json", now)
+    time.sleep(0.1)
+
+    assert cache.get("old") is not None
+    assert cache.get("new") is None
+    assert cache.stats()["entries"] == 1
@@ -0,0 +1,241 @@
+"""
+Replay pacing and controls, and the shared replay hub: one load and clock
+per key, fanned out, torn down when the last subscriber leaves.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import polars as pl
+import pytest
+
+from app.streaming.hub import ReplayHub
+from app.streaming.replay import Replay
+
+T0 = datetime(2024, 1, 2, 14, 30, tzinfo=timezone.utc)
+MINUTE_MS = 60_000
+
+
+def bars(n: int) -> pl.DataFrame:
+    close = [float(i) for i in range(n)]
+    return pl.DataFrame({
+        "bar": pl.datetime_range(T0, T0 + timedelta(minutes=n - 1), "1m", eager=True, time_unit="ns", time_zone="UTC"),
+        "open": close, "high": close, "low": close, "close": close,
+        "volume": [1.0] * n, "trade_count": [1] * n, "vwap": close,
+    })
+
+
+async def collect(replay: Replay) -> list[pl.DataFrame]:
+    return [frame async for frame in replay.frames()]
+
+
+def test_bars_come_in_market_time():
+    async def main():
+        replay = Replay(bars(10), "bar", speed=600, tick=0.01)       # a minute every 0.1 s
+        t = time.monotonic()
+        frames = await collect(replay)
+        return frames, time.monotonic() - t
+
+    frames, elapsed = asyncio.run(main())
+    assert pl.concat(frames)["close"].to_list() == list(range(10))
+    assert elapsed == pytest.approx(0.9, abs=0.15)
+    assert len(frames) == 10
+
+
+def test_bars_due_in_one_tick_share_a_frame():
+    async def main():
+        fast = await collect(Replay(bars(30), "bar", speed=1e9, tick=0.01))
+        capped = await collect(Replay(bars(30), "bar", speed=1e9, tick=0.01, max_batch=7))
+        return fast, capped
+
+    fast, capped = asyncio.run(main())
+    assert [f.height for f in fast] == [30]
+    assert [f.height for f in capped] == [7, 7, 7, 7, 2]
+
+
+def test_pause_resume_speed_and_seek():
+    async def main():
+        replay = Replay(bars(60), "bar", speed=60, tick=0.01)       # a minute per second
+        got = []
+
+        async def consume():
+            async for frame in replay.frames():
+                got.extend(frame["close"].to_list())
+
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.05)
+        assert got == [0]
+
+        state = replay.control({"action": "pause"})
+        assert state["paused"] and state["position"] == 1
+        frozen = replay.now()
+        replay.control({"action": "speed", "value": 6000})          # no effect while paused
+        await asyncio.sleep(0.1)
+        assert got == [0] and replay.now() == frozen
+
+        replay.control({"action": "seek", "time": int(T0.timestamp() * 1000) + 40 * MINUTE_MS})
+        assert replay.state()["position"] == 40 and got == [0]
+
+        replay.control({"action": "resume"})
+        await asyncio.wait_for(task, 1)
+        return got
+
+    got = asyncio.run(main())
+    assert got == [0, *range(40, 60)]
+
+
+@pytest.mark.parametrize("msg", [{"action": "rewind"}, {"action": "speed", "value": 0}, {"action": "seek"}])
+def test_bad_controls_raise(msg):
+    async def main():
+        replay = Replay(bars(3), "bar")
+        with pytest.raises((ValueError, KeyError)):
+            replay.control(msg)
+
+    asyncio.run(main())
+
+
+def test_seek_accepts_iso_time():
+    async def main():
+        replay = Replay(bars(10), "bar")
+        return replay.control({"action": "seek", "time": "2024-01-02T14:35:00Z"})
+
+    assert asyncio.run(main())["position"] == 5
+
+
+async def drain(sub) -> list:
+    items = []
+    while True:
+        item = await asyncio.wait_for(sub.queue.get(), 2)
+        items.append(item)
+        if item[0] != "frame" and item[0] != "snapshot":
+            return items
+
+
+def test_subscribers_share_one_load_and_the_same_frames():
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return bars(20)
+
+    async def main():
+        hub = ReplayHub()
+        key = ("SPY", "bars", "1m")
+        a = hub.subscribe(key, load, "bar", 6000, "json")
+        b = hub.subscribe(key, load, "bar", 6000, "json")
+        assert hub.stats() == {"streams": 1, "subscribers": 2}
+        got_a, got_b = await asyncio.gather(drain(a), drain(b))
+        return hub, got_a, got_b
+
+    hub, got_a, got_b = asyncio.run(main())
+    assert len(loads) == 1
+    assert [k for k, _, _ in got_a] == [k for k, _, _ in got_b]
+    assert got_a[0][0] == "snapshot" and got_a[-1][0] == "end" and got_a[-1][1] == 20
+    frames_a = [body for kind, _, body in got_a if kind == "frame"]
+    frames_b = [body for kind, _, body in got_b if kind == "frame"]
+    assert frames_a and all(x is y for x, y in zip(frames_a, frames_b))      # serialized once
+    assert hub.stats() == {"streams": 0, "subscribers": 0}
+
+
+def test_late_joiner_gets_the_bars_already_played():
+    async def load():
+        return bars(60)
+
+    async def main():
+        hub = ReplayHub()
+        first = hub.subscribe("k", load, "bar", 600, "json")        # a bar every 0.1 s
+        await asyncio.sleep(0.35)
+        late = hub.subscribe("k", load, "bar", 600, "json")
+        kind, pos, snapshot = await late.queue.get()
+        first.close()
+        late.close()
+        return kind, pos, snapshot
+
+    kind, pos, snapshot = asyncio.run(main())
+    assert kind == "snapshot" and 3 <= pos <= 5
+    assert snapshot["close"].to_list() == list(range(pos))
+
+
+def test_last_subscriber_leaving_stops_the_broadcast():
+    async def load():
+        return bars(60)
+
+    async def never():
+        await asyncio.Event().wait()
+
+    async def main():
+        hub = ReplayHub()
+        a = hub.subscribe("k", load, "bar", 1, "json")
+        b = hub.subscribe("k", load, "bar", 1, "json")
+        await asyncio.sleep(0.05)
+        bc = a.broadcast
+        a.close()
+        assert hub.stats() == {"streams": 1, "subscribers": 1} and not bc.replay.stopped
+        b.close()
+        assert hub.stats()["streams"] == 0 and bc.replay.stopped
+        await asyncio.wait_for(bc.task, 1)
+        assert b.queue.get_nowait()[0] == "closed"
+
+        # leaving while still loading cancels the load
+        c = hub.subscribe("slow", never, "bar", 1, "json")
+        await asyncio.sleep(0.01)
+        c.close()
+        await asyncio.sleep(0.01)
+        assert c.broadcast.task.cancelled() and hub.stats()["streams"] == 0
+
+        # a new viewer after teardown starts over
+        d = hub.subscribe("k", load, "bar", 1, "json")
+        assert d.broadcast is not bc
+        d.close()
+
+    asyncio.run(main())
+
+
+def test_slow_subscriber_is_dropped_not_waited_for():
+    async def load():
+        return bars(50)
+
+    async def main():
+        hub = ReplayHub(maxsize=3)
+        slow = hub.subscribe("k", load, "bar", 6000, "json")       # ten frames of five bars
+        fast = hub.subscribe("k", load, "bar", 6000, "json")
+        fast_items = []
+
+        async def read_fast():
+            while True:
+                item = await fast.queue.get()
+                fast_items.append(item)
+                if item[0] == "end":
+                    return
+                await asyncio.sleep(0)
+
+        await asyncio.wait_for(read_fast(), 2)
+        return slow, fast_items
+
+    slow, fast_items = asyncio.run(main())
+    assert fast_items[-1][0] == "end"
+    assert slow.queue.get_nowait()[0] == "lagged"
+
+
+def test_detached_subscriber_continues_privately():
+    async def load():
+        return bars(30)
+
+    async def main():
+        hub = ReplayHub()
+        sub = hub.subscribe("k", load, "bar", 600, "json")
+        other = hub.subscribe("k", load, "bar", 600, "json")
+        await asyncio.sleep(0.25)
+        while not sub.queue.empty():
+            kind, pos, _ = sub.queue.get_nowait()
+            if kind == "frame":
+                sub.pos = pos
+        replay = sub.detach()
+        replay.control({"action": "speed", "value": 1e9})
+        rest = await collect(replay)
+        other.close()
+        return sub, replay, rest
+
+    sub, replay, rest = asyncio.run(main())
+    assert sub.queue.get_nowait()[0] == "detached"
+    assert pl.concat(rest)["close"].to_list() == list(range(sub.pos, 30))
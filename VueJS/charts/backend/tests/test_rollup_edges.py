@@ -0,0 +1,76 @@
+"""
+Rollup reads must give the same bars as resampling the window's minutes,
+also when the window starts or ends inside a rollup bucket.
+"""
+import math
+from datetime import datetime, timedelta, timezone
+
+import polars as pl
+import pytest
+
+from app.data import loader, rollup
+from app.data.index import write_partition
+from app.data.partitions import partition_key
+from app.data.resample import resample_bars
+from app.ingest.download import FakeSource
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.fixture(scope="module")
+def bucket(tmp_path_factory):
+    root = str(tmp_path_factory.mktemp("bucket"))
+    minutes = FakeSource().fetch_bars("SPY", utc(2024, 1, 1), utc(2024, 4, 1))
+    keyed = minutes.with_columns(pl.col("timestamp").dt.year().alias("_y"), pl.col("timestamp").dt.month().alias("_m"))
+    for (year, month), part in keyed.partition_by(["_y", "_m"], as_dict=True).items():
+        write_partition(part.drop("_y", "_m"), root, partition_key("SPY", year, month))
+    rollup.run(root, "SPY")
+    # QQQ has minute partitions only, no rollups
+    qqq = FakeSource().fetch_bars("QQQ", utc(2024, 1, 1), utc(2024, 2, 1))
+    write_partition(qqq, root, partition_key("QQQ", 2024, 1))
+    return root, minutes
+
+
+@pytest.fixture(autouse=True)
+def local_cache(bucket, serve):
+    serve(bucket[0])
+
+
+WINDOWS = [
+    (utc(2024, 1, 2), utc(2024, 3, 5, 15)),             # ends mid-session
+    (utc(2024, 1, 3, 17, 7), utc(2024, 3, 5)),          # starts mid-session, ends at midnight
+    (utc(2024, 1, 10, 14, 22), utc(2024, 1, 10, 19, 2)),
+]
+
+
+def assert_same(got: pl.DataFrame, want: pl.DataFrame):
+    assert got["bar"].to_list() == want["bar"].to_list()
+    for col in ("open", "high", "low", "close", "volume", "vwap"):
+        for a, b in zip(got[col], want[col]):
+            assert math.isclose(a, b, rel_tol=1e-9), col
+
+
+@pytest.mark.parametrize("start,end", WINDOWS)
+@pytest.mark.parametrize("bar_size", ["5m", "15m", "30m", "1h", "4h", "1d", "1w", "1mo"])
+@pytest.mark.parametrize("session", [None, "rth", "extended"])
+def test_rollups_match_minutes(bucket, start, end, bar_size, session):
+    minutes = bucket[1].filter(pl.col("timestamp").is_between(start, end))
+    want = resample_bars(minutes, bar_size, session=session)
+
+    assert_same(loader.load_bars("SPY", start, end, bar_size, session=session), want)
+    assert_same(loader.load_bars_multi(["SPY"], start, end, bar_size, session=session), want)
+    if want.height > 3:
+        assert_same(loader.load_bars("SPY", start, end, bar_size, limit=3, session=session), want.tail(3))
+
+
+@pytest.mark.parametrize("bar_size,session", [("1h", None), ("1d", "extended"), ("1w", None)])
+def test_multi_falls_back_to_minutes_for_symbols_without_rollups(bucket, bar_size, session):
+    start, end = utc(2024, 1, 3, 17, 7), utc(2024, 1, 26, 15)
+    got = loader.load_bars_multi(["SPY", "QQQ", "IWM"], start, end, bar_size, session=session)
+
+    assert got["symbol"].unique().sort().to_list() == ["QQQ", "SPY"]
+    for symbol in ("SPY", "QQQ"):
+        minutes = FakeSource().fetch_bars(symbol, start, end + timedelta(microseconds=1))
+        assert_same(got.filter(pl.col("symbol") == symbol), resample_bars(minutes, bar_size, session=session))
@@ -0,0 +1,66 @@
+"""
+WebSocket endpoints: parameter checks and a shared replay end to end.
+"""
+from datetime import datetime, timezone
+
+import orjson
+import polars as pl
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.data.index import write_partition
+from app.data.partitions import partition_key
+from app.ingest.download import FakeSource
+from app.ws import websocket
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.fixture(scope="module")
+def bucket(tmp_path_factory):
+    root = str(tmp_path_factory.mktemp("bucket"))
+    write_partition(FakeSource().fetch_bars("SPY", utc(2024, 1, 2), utc(2024, 1, 4)), root, partition_key("SPY", 2024, 1))
+    return root
+
+
+@pytest.fixture
+def client(bucket, serve):
+    serve(bucket)
+    app = FastAPI()
+    app.include_router(websocket.router, prefix="/websocket")
+    return TestClient(app)
+
+
+URL = "/websocket/ws/market/data?symbol=SPY&start_time=2024-01-02T14:00:00Z&end_time=2024-01-02T16:00:00Z"
+
+
+@pytest.mark.parametrize("params", [
+    "&mode=candles&bar_size=5m",
+    "&mode=bars",
+    "&mode=bars&bar_size=7x",
+    "&mode=bars&bar_size=10s",
+    "&mode=bars&bar_size=5m&session=overnight",
+    "&mode=ticks&speed=0",
+    "&mode=ticks&format=csv",
+    '&mode=bars&bar_size=5m&indicators=[{"name":"nope"}]',
+])
+def test_bad_parameters_close_with_1003(client, params):
+    with client.websocket_connect(URL + params) as ws:
+        with pytest.raises(WebSocketDisconnect) as e:
+            ws.receive_text()
+    assert e.value.code == 1003
+
+
+def test_replay_sends_every_bar_then_ends(client):
+    with client.websocket_connect(URL + "&mode=bars&bar_size=5m&speed=1e9") as ws:
+        bars, msg = [], orjson.loads(ws.receive_text())
+        while msg.get("type") != "end":
+            bars += msg["columns"]["timestamp"]
+            msg = orjson.loads(ws.receive_text())
+
+    want = pl.datetime_range(utc(2024, 1, 2, 14), utc(2024, 1, 2, 16), "5m", eager=True, time_zone="UTC")
+    assert bars == [int(t.timestamp() * 1000) for t in want]